@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 
 from src.tts.tts_generator import AudioOutputFormat
@@ -8,7 +10,16 @@ class TranslationRequest(BaseModel):
     target_language: str
     output_format: str  # 'web' or 'pdf' or 'json'
     layout: str         # 'continuous' or 'side-by-side'
-    number_of_questions: int = 2  # Default to 2 questions
+    number_of_questions: int = 2  # Default to 2 questions, 0 - no questions
+    defer_questions: bool = False  # if True, questions are not generated with the translation, see /api/make_questions
+    lemmatization: bool = False  # if True, source text is lemmatized concurrently with the translation
+    filter_out_stop_words: bool = False
+    stream: bool = False  # if True, paragraphs are streamed as NDJSON as soon as they are translated
+
+
+class QuestionsRequest(BaseModel):
+    bilingual_text_hash: int
+    number_of_questions: int = 2
 
 
 class AudioRequest(BaseModel):
@@ -19,4 +30,8 @@ class AudioRequest(BaseModel):
 class LemmatizeRequest(BaseModel):
     text: str
     language: str
-    filter_out_stop_words: bool = False
\ No newline at end of file
+    filter_out_stop_words: bool = False
+    stream: bool = False  # if True, progress and partial frequency tables are streamed as NDJSON
+
+class LemmatizeBatchRequest(BaseModel):
+    items: List[LemmatizeRequest]
@@ -0,0 +1,410 @@
+"""
+Session store backends, SESSION_STORE_BACKEND: where bilingual texts, their lemmas and metadata of audio are kept.
+    files  - files under SESSION_DATA_FILE_PATH/<hash>/, with owner and languages in meta.json next to the text;
+             several workers or hosts need a shared filesystem. Texts of a user are found by reading all meta files
+    sqlite - SQLite database in WAL mode at SESSION_STORE_SQLITE_PATH, with owner, languages, times and sizes
+             of texts indexed by hash and by user. Worker processes read it at the same time and write one after
+             another; for several hosts the file must be on storage with working file locks.
+Audio and PDF files stay under SESSION_DATA_FILE_PATH/<hash>/ with either backend, as they are served as static files.
+Texts and lemmas are kept as JSON bytes compressed by SESSION_STORE_COMPRESSION, validation and caching
+are left to callers (see api.utils). Missing texts raise FileNotFoundError with either backend.
+"""
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src import config as cfg
+from src.data_classes.bilingual_text import BilingualText
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is used without it
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {'zstd': '.zst', 'gzip': '.gz', 'none': ''}
+# bilingual_text.json, lemmas_index.json, compressed or not; other files are made from them
+TEXT_FILE_SUFFIXES = tuple(f".json{suffix}" for suffix in COMPRESSION_SUFFIXES.values())
+
+
+def _compression() -> str:
+    compression = cfg.SESSION_STORE_COMPRESSION
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown session store compression: {compression}")
+    if compression == 'zstd' and zstandard is None:
+        logging.warning("zstandard is not installed, session store files are compressed by gzip")
+        return 'gzip'
+    return compression
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """Data compressed by the configured compression, and its name."""
+    compression = _compression()
+    if compression == 'zstd':
+        return compression, zstandard.ZstdCompressor(level=cfg.SESSION_STORE_COMPRESSION_LEVEL).compress(data)
+    if compression == 'gzip':
+        return compression, gzip.compress(data, compresslevel=cfg.SESSION_STORE_COMPRESSION_LEVEL, mtime=0)
+    return compression, data
+
+
+def decompress(compression: str, data: bytes) -> bytes:
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to read data compressed by zstd")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data) if compression == 'gzip' else data
+
+
+def write_session_file(path: str, data: bytes) -> str:
+    """Writes data to path with the suffix of the configured compression, like .gz, returns the path written."""
+    compression, data = compress(data)
+    path += COMPRESSION_SUFFIXES[compression]
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)  # readers never see partially written files
+    return path
+
+
+def read_session_file(path: str) -> bytes:
+    """Data written by write_session_file with any compression, or not compressed. FileNotFoundError if none."""
+    configured = _compression()
+    for compression in sorted(COMPRESSION_SUFFIXES, key=lambda c: c != configured):  # the configured one first
+        try:
+            with open(path + COMPRESSION_SUFFIXES[compression], "rb") as f:
+                return decompress(compression, f.read())
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(path)
+
+
+class SessionTextInfo(BaseModel):
+    """Metadata of a stored text, fields the backend does not keep are None."""
+    bilingual_text_hash: int
+    user_name: Optional[str] = None
+    source_language: Optional[str] = None
+    target_language: Optional[str] = None
+    created_at: Optional[float] = None
+    accessed_at: float
+    bytes: int
+    artifacts: List[str] = []
+
+
+class SessionStore(ABC):
+
+    def __init__(self, directory: str = cfg.SESSION_DATA_FILE_PATH):
+        self.directory = directory  # of audio, PDF and other files made from texts
+
+    def artifacts_dir(self, bt_hash: int) -> str:
+        """Directory of files made from the text, created if missing."""
+        path = os.path.join(self.directory, str(bt_hash))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @abstractmethod
+    def save_text(self, bt: BilingualText, user_name: str = None) -> int:
+        """Saves the text under its hash and returns the hash."""
+
+    @abstractmethod
+    def read_text(self, bt_hash: int) -> bytes:
+        """Canonical JSON of the text."""
+
+    @abstractmethod
+    def save_lemmas(self, bt_hash: int, data: bytes):
+        pass
+
+    @abstractmethod
+    def read_lemmas(self, bt_hash: int) -> bytes:
+        pass
+
+    def add_artifact(self, bt_hash: int, name: str):
+        """Registers a file made from the text in its artifacts_dir, like audio."""
+
+    @abstractmethod
+    def touch(self, bt_hash: int) -> bool:
+        """Marks the text as accessed now, False if it is not in the store (e.g. was collected)."""
+
+    @abstractmethod
+    def info(self, bt_hash: int) -> SessionTextInfo:
+        pass
+
+    @abstractmethod
+    def texts_of_user(self, user_name: str, limit: int = 100) -> List[SessionTextInfo]:
+        """Texts saved by the user, the latest first."""
+
+    @abstractmethod
+    def usage(self) -> Dict[int, Tuple[float, int]]:
+        """Last access and size of texts and lemmas of every stored text, by hash."""
+
+    def remove(self, bt_hash: int):
+        """Removes the text, its lemmas and the files made from it."""
+        shutil.rmtree(os.path.join(self.directory, str(bt_hash)), ignore_errors=True)
+
+    def remove_artifacts(self, bt_hash: int) -> int:
+        """Removes files made from the text, keeping the text itself. Returns the number of bytes freed."""
+        freed = 0
+        path = os.path.join(self.directory, str(bt_hash))
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if not entry.is_file() or entry.name.endswith(TEXT_FILE_SUFFIXES):
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            freed += size
+        return freed
+
+
+class FileSessionStore(SessionStore):
+    """
+    Texts and lemmas are files next to the files made from them, last access is the mtime of the directory.
+    Owner, languages and creation time of the text are in meta.json, which is kept and removed along with the text.
+    """
+
+    def save_text(self, bt: BilingualText, user_name: str = None) -> int:
+        bt_hash = hash(bt)
+        path = self.artifacts_dir(bt_hash)
+        write_session_file(os.path.join(path, "bilingual_text.json"), bt.canonical_json())
+        meta = {"user_name": user_name, "source_language": bt.source_language,
+                "target_language": bt.target_language, "created_at": time.time()}
+        try:  # the same hash is the same text, the first one who saved it stays its owner
+            with open(os.path.join(path, "meta.json"), "x", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except FileExistsError:
+            pass
+        return bt_hash
+
+    def read_text(self, bt_hash: int) -> bytes:
+        return read_session_file(os.path.join(self.directory, str(bt_hash), "bilingual_text.json"))
+
+    def save_lemmas(self, bt_hash: int, data: bytes):
+        write_session_file(os.path.join(self.artifacts_dir(bt_hash), "lemmas_index.json"), data)
+
+    def read_lemmas(self, bt_hash: int) -> bytes:
+        return read_session_file(os.path.join(self.directory, str(bt_hash), "lemmas_index.json"))
+
+    def touch(self, bt_hash: int) -> bool:
+        try:
+            os.utime(os.path.join(self.directory, str(bt_hash)))
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _meta(path: str) -> dict:
+        """Metadata saved with the text, empty for texts saved before it was kept or if it is broken."""
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def info(self, bt_hash: int) -> SessionTextInfo:
+        path = os.path.join(self.directory, str(bt_hash))
+        files = [(entry.name, entry.stat().st_size) for entry in os.scandir(path) if entry.is_file()]
+        if not any(name.startswith("bilingual_text.json") for name, _ in files):
+            raise FileNotFoundError(f"Bilingual text with hash {bt_hash} not found.")
+        return SessionTextInfo(bilingual_text_hash=bt_hash, accessed_at=os.stat(path).st_mtime,
+                               bytes=sum(size for name, size in files if name.endswith(TEXT_FILE_SUFFIXES)),
+                               artifacts=sorted(name for name, _ in files if not name.endswith(TEXT_FILE_SUFFIXES)),
+                               **self._meta(path))
+
+    def texts_of_user(self, user_name: str, limit: int = 100) -> List[SessionTextInfo]:
+        infos = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return infos
+        for entry in entries:
+            if not entry.name.isdigit() or not entry.is_dir() or self._meta(entry.path).get("user_name") != user_name:
+                continue
+            try:
+                infos.append(self.info(int(entry.name)))
+            except FileNotFoundError:  # removed meanwhile, or only files made from the text are left
+                continue
+        return sorted(infos, key=lambda info: info.created_at, reverse=True)[:limit]
+
+    def usage(self) -> Dict[int, Tuple[float, int]]:
+        usage = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return usage
+        for entry in entries:
+            if not entry.name.isdigit() or not entry.is_dir():  # not a text
+                continue
+            try:
+                text_bytes = sum(file_entry.stat().st_size for file_entry in os.scandir(entry.path)
+                                 if file_entry.is_file() and file_entry.name.endswith(TEXT_FILE_SUFFIXES))
+                usage[int(entry.name)] = entry.stat().st_mtime, text_bytes
+            except FileNotFoundError:  # removed meanwhile
+                continue
+        return usage
+
+    def remove_artifacts(self, bt_hash: int) -> int:
+        path = os.path.join(self.directory, str(bt_hash))
+        try:
+            last_access = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return 0
+        freed = super().remove_artifacts(bt_hash)
+        try:  # removing files changes mtime of the directory, which is the last access
+            os.utime(path, (last_access, last_access))
+        except FileNotFoundError:
+            pass
+        return freed
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    hash INTEGER PRIMARY KEY,
+    user_name TEXT,
+    source_language TEXT,
+    target_language TEXT,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    compression TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS texts_by_user ON texts (user_name, created_at);
+CREATE INDEX IF NOT EXISTS texts_by_access ON texts (accessed_at);
+CREATE TABLE IF NOT EXISTS lemmas (
+    hash INTEGER PRIMARY KEY REFERENCES texts (hash) ON DELETE CASCADE,
+    compression TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    hash INTEGER NOT NULL REFERENCES texts (hash) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (hash, name)
+);
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """One connection per thread, in autocommit mode, every statement is a transaction of its own."""
+
+    def __init__(self, path: str = cfg.SESSION_STORE_SQLITE_PATH, directory: str = cfg.SESSION_DATA_FILE_PATH,
+                 busy_timeout: float = cfg.SESSION_STORE_SQLITE_BUSY_TIMEOUT_SECONDS):
+        super().__init__(directory)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            # readers do not block the writer and each other, commits do not wait for fsync of the database
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    def save_text(self, bt: BilingualText, user_name: str = None) -> int:
+        bt_hash = hash(bt)
+        compression, data = compress(bt.canonical_json())
+        now = time.time()
+        # the same hash is the same text, saving it again only renews the access
+        self._connection().execute(
+            "INSERT INTO texts (hash, user_name, source_language, target_language, created_at, accessed_at, "
+            "compression, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (hash) DO UPDATE SET accessed_at = excluded.accessed_at",
+            (bt_hash, user_name, bt.source_language, bt.target_language, now, now, compression, data))
+        return bt_hash
+
+    def read_text(self, bt_hash: int) -> bytes:
+        row = self._connection().execute("SELECT compression, data FROM texts WHERE hash = ?", (bt_hash,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Bilingual text with hash {bt_hash} not found.")
+        return decompress(*row)
+
+    def save_lemmas(self, bt_hash: int, data: bytes):
+        try:
+            self._connection().execute("INSERT OR REPLACE INTO lemmas (hash, compression, data) VALUES (?, ?, ?)",
+                                       (bt_hash, *compress(data)))
+        except sqlite3.IntegrityError:
+            raise FileNotFoundError(f"Bilingual text with hash {bt_hash} not found.") from None
+
+    def read_lemmas(self, bt_hash: int) -> bytes:
+        row = self._connection().execute("SELECT compression, data FROM lemmas WHERE hash = ?", (bt_hash,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Lemmas of bilingual text with hash {bt_hash} not found.")
+        return decompress(*row)
+
+    def add_artifact(self, bt_hash: int, name: str):
+        try:
+            size = os.path.getsize(os.path.join(self.directory, str(bt_hash), name))
+        except FileNotFoundError:  # removed meanwhile
+            return
+        self._connection().execute("INSERT OR REPLACE INTO artifacts (hash, name, bytes, created_at) "
+                                   "SELECT hash, ?, ?, ? FROM texts WHERE hash = ?", (name, size, time.time(), bt_hash))
+
+    def touch(self, bt_hash: int) -> bool:
+        cursor = self._connection().execute("UPDATE texts SET accessed_at = ? WHERE hash = ?", (time.time(), bt_hash))
+        return cursor.rowcount > 0
+
+    def _infos(self, where: str, params: tuple) -> List[SessionTextInfo]:
+        rows = self._connection().execute(
+            "SELECT t.hash, t.user_name, t.source_language, t.target_language, t.created_at, t.accessed_at, "
+            "length(t.data) + COALESCE((SELECT length(l.data) FROM lemmas l WHERE l.hash = t.hash), 0), "
+            "(SELECT group_concat(a.name, char(10)) FROM artifacts a WHERE a.hash = t.hash) "
+            f"FROM texts t WHERE {where}", params).fetchall()
+        return [SessionTextInfo(bilingual_text_hash=row[0], user_name=row[1], source_language=row[2],
+                                target_language=row[3], created_at=row[4], accessed_at=row[5], bytes=row[6],
+                                artifacts=sorted(row[7].split("\n")) if row[7] else [])
+                for row in rows]
+
+    def info(self, bt_hash: int) -> SessionTextInfo:
+        infos = self._infos("t.hash = ?", (bt_hash,))
+        if not infos:
+            raise FileNotFoundError(f"Bilingual text with hash {bt_hash} not found.")
+        return infos[0]
+
+    def texts_of_user(self, user_name: str, limit: int = 100) -> List[SessionTextInfo]:
+        return self._infos("t.user_name = ? ORDER BY t.created_at DESC LIMIT ?", (user_name, limit))
+
+    def usage(self) -> Dict[int, Tuple[float, int]]:
+        rows = self._connection().execute(
+            "SELECT t.hash, t.accessed_at, length(t.data) + COALESCE(length(l.data), 0) "
+            "FROM texts t LEFT JOIN lemmas l ON l.hash = t.hash").fetchall()
+        return {bt_hash: (accessed_at, size) for bt_hash, accessed_at, size in rows}
+
+    def remove(self, bt_hash: int):
+        self._connection().execute("DELETE FROM texts WHERE hash = ?", (bt_hash,))
+        super().remove(bt_hash)
+
+    def remove_artifacts(self, bt_hash: int) -> int:
+        self._connection().execute("DELETE FROM artifacts WHERE hash = ?", (bt_hash,))
+        return super().remove_artifacts(bt_hash)
+
+
+def create_session_store(backend: str = None) -> SessionStore:
+    backend = backend or cfg.SESSION_STORE_BACKEND
+    if backend == 'files':
+        return FileSessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
+
+
+session_store = create_session_store()
@@ -0,0 +1,92 @@
+"""
+In-memory cache of validated objects of the session store, in front of the files.
+SSML, audio and PDF of a text are usually requested one after another, each of them used to read
+and validate bilingual_text.json again. The cache is bounded by the number of objects and by their
+(serialized) size, evicts least recently used ones, and entries expire after ttl_seconds.
+Cached objects are shared between requests, callers must not change them (use model_copy).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from src import config as cfg
+
+T = TypeVar('T')
+
+
+class SessionObjectCache(Generic[T]):
+
+    def __init__(self, name: str, max_items: int, max_bytes: int, ttl_seconds: float):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Hashable, Tuple[T, int, float]]" = OrderedDict()  # value, size, expires at
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[T]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, _, expires_at = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: T, size: int):
+        """size - of the object in bytes, e.g. of its JSON, objects larger than max_bytes are not cached"""
+        if size > self.max_bytes or self.max_items <= 0:
+            return
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = (value, size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while len(self._items) > self.max_items or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._items)))
+                self.evictions += 1
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._items.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else None,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "items": len(self._items),
+                "bytes": self._bytes,
+            }
+
+
+bilingual_text_cache: SessionObjectCache = SessionObjectCache(
+    'bilingual_texts', max_items=cfg.SESSION_CACHE_MAX_ITEMS,
+    max_bytes=cfg.SESSION_CACHE_MAX_BYTES, ttl_seconds=cfg.SESSION_CACHE_TTL_SECONDS)
@@ -0,0 +1,164 @@
+"""
+Garbage collection of the session store: bilingual texts, their lemmas and audio and PDF made from them.
+Texts and lemmas are kept by a session store backend (see session_backends), which also tracks their last access,
+files made from them are under SESSION_DATA_FILE_PATH/<hash>/ with any backend.
+Texts not accessed for ttl_seconds are removed. If the store is still larger than max_bytes, files are removed
+from least recently accessed texts until it takes 90% of the quota: audio and PDF first, as they can be made
+again from the text without LLM calls, then whole texts. Collection runs in a background thread.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src import config as cfg
+from src.api.session_backends import SessionStore, TEXT_FILE_SUFFIXES, session_store
+from src.api.session_cache import bilingual_text_cache
+
+
+class _StoredText:
+
+    def __init__(self, bt_hash: int, last_access: float, text_bytes: int):
+        self.hash = bt_hash
+        self.last_access = last_access
+        self.text_bytes = text_bytes
+        self.derived: List[tuple] = []  # (path, size) of audio, PDF and other files made from the text
+
+    @property
+    def derived_bytes(self) -> int:
+        return sum(size for _, size in self.derived)
+
+    @property
+    def bytes(self) -> int:
+        return self.text_bytes + self.derived_bytes
+
+
+class SessionStoreManager:
+
+    def __init__(self, store: SessionStore, ttl_seconds: float, max_bytes: int, interval_seconds: float):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()  # one collection at a time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.removed_texts = 0
+        self.removed_files = 0
+        self.removed_bytes = 0
+        self.last_run: Optional[float] = None
+
+    def _scan(self) -> List[_StoredText]:
+        """
+        Texts of the store, least recently accessed first. Directories of files without a text in the store
+        are included too, accessed when they were changed. Other directories are skipped.
+        """
+        texts = {bt_hash: _StoredText(bt_hash, last_access, text_bytes)
+                 for bt_hash, (last_access, text_bytes) in self.store.usage().items()}
+        try:
+            entries = list(os.scandir(self.store.directory))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not entry.name.isdigit() or not entry.is_dir():
+                continue
+            try:
+                text = texts.get(int(entry.name)) or _StoredText(int(entry.name), entry.stat().st_mtime, 0)
+                text.derived = [(file_entry.path, file_entry.stat().st_size) for file_entry in os.scandir(entry.path)
+                                if file_entry.is_file() and not file_entry.name.endswith(TEXT_FILE_SUFFIXES)]
+            except FileNotFoundError:  # removed meanwhile
+                continue
+            texts[text.hash] = text
+        return sorted(texts.values(), key=lambda t: t.last_access)
+
+    def _remove_text(self, text: _StoredText):
+        bilingual_text_cache.discard(text.hash)
+        self.store.remove(text.hash)
+        self.removed_texts += 1
+        self.removed_files += len(text.derived)
+        self.removed_bytes += text.bytes
+
+    def _remove_derived(self, text: _StoredText) -> int:
+        freed = self.store.remove_artifacts(text.hash)
+        self.removed_files += len(text.derived)
+        self.removed_bytes += freed
+        text.derived = []
+        return freed
+
+    def collect(self) -> Dict[str, int]:
+        """Removes expired texts, then enforces the quota. Returns what was removed by this run."""
+        with self._lock:
+            removed_before = self.removed_texts, self.removed_files, self.removed_bytes
+            now = time.time()
+            texts = []
+            for text in self._scan():
+                if now - text.last_access > self.ttl_seconds:
+                    self._remove_text(text)
+                else:
+                    texts.append(text)
+            total = sum(text.bytes for text in texts)
+            if total > self.max_bytes:
+                target = self.max_bytes * 0.9
+                for text in texts:
+                    if total <= target:
+                        break
+                    total -= self._remove_derived(text)
+                while texts and total > target:
+                    text = texts.pop(0)
+                    total -= text.bytes
+                    self._remove_text(text)
+            self.runs += 1
+            self.last_run = now
+            removed = {"texts": self.removed_texts - removed_before[0],
+                       "files": self.removed_files - removed_before[1],
+                       "bytes": self.removed_bytes - removed_before[2]}
+        if removed["bytes"]:
+            logging.info(f"Session store collection removed {removed}, {total} bytes left")
+        return removed
+
+    def _run(self):
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                logging.error(f"Session store collection failed: {e}")
+            if self._stop.wait(self.interval_seconds):
+                return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-store-gc", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        texts = self._scan()
+        now = time.time()
+        return {
+            "texts": len(texts),
+            "bytes": sum(text.bytes for text in texts),
+            "text_bytes": sum(text.text_bytes for text in texts),
+            "derived_bytes": sum(text.derived_bytes for text in texts),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "oldest_access_seconds_ago": round(now - texts[0].last_access) if texts else None,
+            "runs": self.runs,
+            "last_run_seconds_ago": round(now - self.last_run) if self.last_run else None,
+            "removed_texts": self.removed_texts,
+            "removed_files": self.removed_files,
+            "removed_bytes": self.removed_bytes,
+        }
+
+
+session_store_manager = SessionStoreManager(session_store,
+                                            ttl_seconds=cfg.SESSION_STORE_TTL_SECONDS,
+                                            max_bytes=cfg.SESSION_STORE_MAX_BYTES,
+                                            interval_seconds=cfg.SESSION_STORE_GC_INTERVAL_SECONDS)
@@ -1,35 +1,194 @@
 
+import asyncio
 import json
 import logging
 import os
+import threading
+from collections import deque
+from typing import Optional, Tuple
 
 from fastapi.responses import JSONResponse
 
 
-from src.data_classes.bilingual_text import BilingualText
-from src.api.data_classes import TranslationRequest
-from src.text_processing.llm_communicator import create_bilingual_text
+from src.data_classes.bilingual_text import BilingualText, BilingualParagraph
+from src.data_classes.lemma_index import LemmasIndex, LemmasIndexBuilder
+from src.pdf_gen.pdf_generator import generate_bilingual_pdf
+from src.api.data_classes import TranslationRequest, LemmatizeRequest, QuestionsRequest
+from src.api.session_cache import bilingual_text_cache
+from src.api.session_backends import session_store
+from src.text_processing.language_detection import detect_language_or_none
+from src.text_processing.llm_communicator import create_bilingual_text_async, stream_bilingual_text, generate_questions
+from src.text_processing.nlp import lemmatize, lemmatize_many, paragraph_spans, primary_language
+from src.text_processing.nlp_pool import nlp_pool
+from src.text_processing.result_cache import lemma_cache, stanza_version
 import src.config as cfg
 from src.auth.authentication import UserRole
 
 
 # utilities
-def save_to_session_store(bt: BilingualText) -> int:
-    bt_hash = hash(bt)
-    output_dir = os.path.join(cfg.SESSION_DATA_FILE_PATH, str(bt_hash))
-    os.makedirs(output_dir, exist_ok=True)
-    # Write the JSON to a file in the output directory
-    output_path = os.path.join(output_dir, "bilingual_text.json")
-    with open(output_path, "w", encoding="utf-8") as out_f:
-        out_f.write(bt.to_json())
+def save_to_session_store(bt: BilingualText, user_name: str = None) -> int:
+    bt_hash = session_store.save_text(bt, user_name)
+    # SSML, audio and PDF of the text are usually requested right after it is saved
+    bilingual_text_cache.put(bt_hash, bt, len(bt.canonical_json()))
     return bt_hash
 
 
-def read_from_session_store(bilingual_text_hash: int, output_dir: str) -> BilingualText:
-    bt_file_path = os.path.join(output_dir, "bilingual_text.json")
-    if not os.path.exists(bt_file_path):
+def read_from_session_store(bilingual_text_hash: int) -> BilingualText:
+    """Stored bilingual text, from the in-memory cache if it was saved or read recently. Do not change it."""
+    if not session_store.touch(bilingual_text_hash):  # the cache may have a text collected meanwhile
+        bilingual_text_cache.discard(bilingual_text_hash)
         raise FileNotFoundError(f"Bilingual text with hash {bilingual_text_hash} not found.")
-    return BilingualText.from_json_file(bt_file_path)
+    bt = bilingual_text_cache.get(bilingual_text_hash)
+    if bt is not None:
+        return bt
+    try:
+        bt_json = session_store.read_text(bilingual_text_hash)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Bilingual text with hash {bilingual_text_hash} not found.") from None
+    bt = BilingualText.model_validate_json(bt_json)
+    bilingual_text_cache.put(bilingual_text_hash, bt, len(bt_json))
+    return bt
+
+
+def bilingual_text_json(bt: BilingualText, **extra) -> bytes:
+    """JSON of the text with extra top level keys, like data_hash, made of its canonical JSON, not dumped again"""
+    body = bt.canonical_json()
+    if extra:
+        body = body[:-1] + b',' + json.dumps(extra, ensure_ascii=False)[1:].encode('utf-8')
+    return body
+
+
+def read_pdf_from_session_store(bilingual_text_hash: int) -> bytes:
+    """PDF of a stored bilingual text, generated on the first request and stored with its other files, like audio"""
+    pdf_path = os.path.join(session_store.directory, str(bilingual_text_hash), "bilingual_text.pdf")
+    if session_store.touch(bilingual_text_hash) and os.path.exists(pdf_path):
+        with open(pdf_path, "rb") as f:
+            return f.read()
+    pdf = generate_bilingual_pdf(read_from_session_store(bilingual_text_hash))
+    pdf_path = os.path.join(session_store.artifacts_dir(bilingual_text_hash), "bilingual_text.pdf")
+    # concurrent requests for the same text may write it at the same time, readers never see a partial file
+    tmp_path = f"{pdf_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, pdf_path)
+    session_store.add_artifact(bilingual_text_hash, "bilingual_text.pdf")
+    return pdf
+
+
+def save_lemmas_to_session_store(bilingual_text_hash: int, lsi: LemmasIndex):
+    """Lemmas index of the source text is stored along with the bilingual text"""
+    session_store.save_lemmas(bilingual_text_hash, lsi.model_dump_json().encode('utf-8'))
+
+
+def read_lemmas_from_session_store(bilingual_text_hash: int) -> LemmasIndex:
+    try:
+        if not session_store.touch(bilingual_text_hash):
+            raise FileNotFoundError(bilingual_text_hash)
+        return LemmasIndex.model_validate_json(session_store.read_lemmas(bilingual_text_hash))
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Lemmas of bilingual text with hash {bilingual_text_hash} not found.") from None
+
+
+def frequency_list_for_fe(lsi: LemmasIndex) -> list[dict]:
+    frequency_list = sorted(lsi.lemmas, key=lambda lemma: lemma.number_of_occurrences, reverse=True)
+    # Only include lemma, number_of_words, and number_of_occurencs in the response
+    return [
+        {
+            "lemma": lemma.lemma,
+            "number_of_words": lemma.number_of_words,
+            "number_of_occurrences": lemma.number_of_occurrences
+        }
+        for lemma in frequency_list
+    ]
+
+
+def _lemma_cache_key(text: str, lang: str, filter_out_stop_words: bool) -> str:
+    lang = lang.split('-')[0] if lang else None
+    return lemma_cache.make_key(text, lang, filter_out_stop_words, stanza_version(), cfg.LEMMATIZE_FAST)
+
+
+def get_lemmas_index(text: str, lang: str = None, filter_out_stop_words: bool = False) -> LemmasIndex:
+    """Lemmatizes text in NLP pool, results are cached by hash of the text and lemmatization parameters."""
+    key = _lemma_cache_key(text, lang, filter_out_stop_words)
+    cached = lemma_cache.get(key)
+    if cached is not None:
+        return LemmasIndex.model_validate_json(cached)
+    lsi = nlp_pool.run(lemmatize, text, lang=lang, filter_out_stop_words=filter_out_stop_words)
+    lemma_cache.put(key, lsi.model_dump_json())
+    return lsi
+
+
+async def get_lemmas_index_async(text: str, lang: str = None, filter_out_stop_words: bool = False) -> LemmasIndex:
+    """Same as get_lemmas_index, but does not block the event loop while waiting for NLP pool."""
+    key = _lemma_cache_key(text, lang, filter_out_stop_words)
+    cached = await lemma_cache.get_async(key)
+    if cached is not None:
+        return LemmasIndex.model_validate_json(cached)
+    lsi = await nlp_pool.run_async(lemmatize, text, lang=lang, filter_out_stop_words=filter_out_stop_words)
+    await lemma_cache.put_async(key, lsi.model_dump_json())
+    return lsi
+
+
+async def get_lemmas_indexes_async(items: list[LemmatizeRequest]) -> list[LemmasIndex]:
+    """Cached lemmatization of several texts, only texts missing in cache go to NLP pool, in one batch."""
+    keys = [_lemma_cache_key(item.text, item.language, item.filter_out_stop_words) for item in items]
+    results = [LemmasIndex.model_validate_json(cached) if cached is not None else None
+               for cached in await lemma_cache.get_many_async(keys)]
+    missing = [i for i, lsi in enumerate(results) if lsi is None]
+    if missing:
+        computed = await nlp_pool.run_async(
+            lemmatize_many,
+            texts=[items[i].text for i in missing],
+            langs=[items[i].language for i in missing],
+            filter_out_stop_words=[items[i].filter_out_stop_words for i in missing]
+        )
+        for i, lsi in zip(missing, computed):
+            results[i] = lsi
+        await lemma_cache.put_many_async((keys[i], results[i].model_dump_json()) for i in missing)
+    return results
+
+
+async def stream_lemmatization(text: str, lang: str = None, filter_out_stop_words: bool = False):
+    """
+    Lemmatizes text chunk by chunk (chunks are paragraphs, see paragraph_spans) and yields NDJSON lines:
+    progress after every chunk, partial frequency table after every LEMMATIZE_STREAM_TABLE_EVERY chunks
+    and the full frequency table at the end. Chunks are processed in NLP pool, one per worker at a time.
+    """
+    key = _lemma_cache_key(text, lang, filter_out_stop_words)
+    cached = await lemma_cache.get_async(key)
+    if cached is not None:
+        lsi = LemmasIndex.model_validate_json(cached)
+        yield json.dumps({"processed_chars": len(text), "total_chars": len(text), "done": True,
+                          "lemmas": frequency_list_for_fe(lsi)}) + "\n"
+        return
+
+    lang = primary_language(text, lang)  # detected once, the same language for all chunks
+    spans = await nlp_pool.run_async(paragraph_spans, text, cfg.LEMMATIZE_STREAM_CHUNK_LENGTH)
+    builder = LemmasIndexBuilder(text=text)
+    in_flight = deque()
+    next_span = 0
+    try:
+        for done_chunks in range(1, len(spans) + 1):
+            while next_span < len(spans) and len(in_flight) < max(1, nlp_pool.workers):
+                start, end = spans[next_span]
+                in_flight.append((start, end, asyncio.ensure_future(
+                    get_lemmas_index_async(text[start:end], lang, filter_out_stop_words))))
+                next_span += 1
+            start, end, task = in_flight.popleft()
+            builder.merge(await task, offset=start)
+            line = {"processed_chars": end, "total_chars": len(text),
+                    "chunks_done": done_chunks, "chunks_total": len(spans)}
+            if done_chunks % cfg.LEMMATIZE_STREAM_TABLE_EVERY == 0 and done_chunks < len(spans):
+                line["lemmas"] = builder.frequency_list()
+            yield json.dumps(line) + "\n"
+    finally:
+        # a chunk failed or the client went away, chunks in flight are not needed any more
+        for _, _, task in in_flight:
+            task.cancel()
+
+    yield json.dumps({"processed_chars": len(text), "total_chars": len(text), "done": True,
+                      "lemmas": builder.frequency_list()}) + "\n"
+    await lemma_cache.put_async(key, builder.build().model_dump_json())
 
 
 def validate_translation_request(req: TranslationRequest, user):
@@ -62,18 +221,103 @@ def get_test_blt() -> BilingualText:
     # Return the BilingualText instance
  
 
-def get_bilingual_text(req, is_test_mode=False, user=None):
+async def get_bilingual_text(req, is_test_mode=False, user=None, source_language: str = None):
     if is_test_mode:
             #  Use test instance of BilingualText from file
         return get_test_blt()
     else:
         # Pass user name if available
         user_name = user.username if user else None
-        return create_bilingual_text(
+        return await create_bilingual_text_async(
             req.source_text,
             req.target_language,
-            number_of_questions=req.number_of_questions,
-            user_name=user_name
+            number_of_questions=_questions_with_translation(req),
+            user_name=user_name,
+            source_language=source_language
         )
 
 
+def _questions_with_translation(req: TranslationRequest) -> int:
+    return 0 if req.defer_questions else req.number_of_questions
+
+
+async def add_questions(req: QuestionsRequest, user=None) -> BilingualText:
+    """
+    Generates questions to a bilingual text from the session store, for translations made with defer_questions.
+    The text with the questions is saved to the session store, under its own hash.
+    """
+    bt = await asyncio.to_thread(read_from_session_store, req.bilingual_text_hash)
+    source_text = "\n\n".join(" ".join(s.source_text.strip() for s in p.Sintagmas) for p in bt.paragraphs)
+    questions = await generate_questions(source_text, req.number_of_questions,
+                                         source_language=primary_language(source_text, bt.source_language),
+                                         user_name=user.username if user else None)
+    return bt.model_copy(update={"questions": questions or None})
+
+
+async def get_bilingual_text_and_lemmas(req: TranslationRequest, is_test_mode=False,
+                                        user=None) -> Tuple[BilingualText, Optional[LemmasIndex]]:
+    """
+    Translation by LLM and, if req.lemmatization, lemmatization of the source text in NLP pool run at the same time,
+    so the latency is close to the slowest of them rather than to their sum.
+    Lemmatization errors do not fail the translation, lemmas are None then and can be requested separately.
+    """
+    source_language = detect_language_or_none(req.source_text)  # detected once for both
+    translation = get_bilingual_text(req, is_test_mode, user, source_language)
+    if not req.lemmatization:
+        return await translation, None
+    bt, lsi = await asyncio.gather(
+        translation,
+        get_lemmas_index_async(req.source_text, source_language, req.filter_out_stop_words),
+        return_exceptions=True)
+    if isinstance(bt, BaseException):
+        raise bt
+    if isinstance(lsi, BaseException):
+        logging.warning(f"Lemmatization along with translation failed: {lsi}")
+        lsi = None
+    return bt, lsi
+
+
+async def stream_bilingual_text_ndjson(req: TranslationRequest, is_test_mode=False, user=None):
+    """
+    NDJSON lines: {"paragraph": ...} for every translated paragraph, in order, as soon as it is ready,
+    and the last line with "done", "data_hash", languages, questions and, if req.lemmatization, "lemmas".
+    The bilingual text is saved to the session store when the stream completes.
+    """
+    source_language = detect_language_or_none(req.source_text)
+    lemmas_task = asyncio.ensure_future(get_lemmas_index_async(
+        req.source_text, source_language, req.filter_out_stop_words)) if req.lemmatization else None
+    try:
+        if is_test_mode:
+            items = _stream_test_blt()
+        else:
+            items = stream_bilingual_text(req.source_text, req.target_language,
+                                          number_of_questions=_questions_with_translation(req),
+                                          user_name=user.username if user else None,
+                                          source_language=source_language)
+        async for item in items:
+            if isinstance(item, BilingualParagraph):
+                yield json.dumps({"paragraph": item.model_dump()}, ensure_ascii=False) + "\n"
+            else:
+                bt = item
+        bt_hash = await asyncio.to_thread(save_to_session_store, bt, user_name=user.username if user else None)
+        line = {"done": True, "data_hash": bt_hash, "source_language": bt.source_language,
+                "target_language": bt.target_language,
+                "questions": [q.model_dump() for q in bt.questions] if bt.questions else None}
+        if lemmas_task is not None:
+            try:
+                lsi = await lemmas_task
+                await asyncio.to_thread(save_lemmas_to_session_store, bt_hash, lsi)
+                line["lemmas"] = frequency_list_for_fe(lsi)
+            except Exception as e:
+                logging.warning(f"Lemmatization along with translation failed: {e}")
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        if lemmas_task is not None:
+            lemmas_task.cancel()
+
+
+async def _stream_test_blt():
+    bt = get_test_blt()
+    for paragraph in bt.paragraphs:
+        yield paragraph
+    yield bt
@@ -2,9 +2,12 @@
 Usage tracking module for LLM invocations.
 Tracks metrics such as text length, input tokens, and output tokens.
 """
+import asyncio
 import json
 import os
+import threading
 from datetime import datetime
+from enum import StrEnum
 from pathlib import Path
 from typing import Dict, Optional, Any, List
 
@@ -13,12 +16,21 @@ from pydantic import BaseModel, Field
 from src import config as cfg
 
 
+class UsageKind(StrEnum):
+    """What an LLM call was made for, token estimates of translations are fitted on translations only."""
+    TRANSLATION = "translation"
+    QUESTIONS = "questions"
+
+
 class UsageEntry(BaseModel):
     """Individual usage entry for LLM invocation."""
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
     input_tokens: int
     output_tokens: int
     text_length: int
+    source_language: Optional[str] = None
+    target_language: Optional[str] = None
+    kind: UsageKind = UsageKind.TRANSLATION
 
 
 class UserUsageStats(BaseModel):
@@ -27,6 +39,11 @@ class UserUsageStats(BaseModel):
     total_output_tokens: int = 0
     total_text_length: int = 0
     invocations_count: int = 0
+    # translation cache, counted in paragraphs, tokens are estimated from the calls that filled the cache
+    cache_hits: int = 0
+    cache_misses: int = 0
+    saved_input_tokens: int = 0
+    saved_output_tokens: int = 0
     history: List[UsageEntry] = []
 
 
@@ -36,6 +53,10 @@ class OverallUsageStats(BaseModel):
     total_output_tokens: int = 0
     total_text_length: int = 0
     invocations_count: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    saved_input_tokens: int = 0
+    saved_output_tokens: int = 0
 
 
 class UsageStats(BaseModel):
@@ -49,6 +70,7 @@ class UsageTracker:
 
     def __init__(self):
         self.usage_data_path = cfg.USAGE_DATA_PATH
+        self._lock = threading.Lock()  # batches of one text are translated in parallel threads
         self._ensure_usage_file_exists()
 
     def _ensure_usage_file_exists(self) -> None:
@@ -83,7 +105,10 @@ class UsageTracker:
         text_length: int,
         input_tokens: int,
         output_tokens: int,
-        user_name: Optional[str] = None
+        user_name: Optional[str] = None,
+        source_language: Optional[str] = None,
+        target_language: Optional[str] = None,
+        kind: UsageKind = UsageKind.TRANSLATION
     ) -> None:
         """
         Log usage statistics for an LLM invocation.
@@ -93,7 +118,17 @@ class UsageTracker:
             input_tokens: Number of input tokens used
             output_tokens: Number of output tokens used
             user_name: Optional username to track per-user statistics
+            source_language: Optional language of the text, used for token estimates
+            target_language: Optional language of the translation, used for token estimates
+            kind: What the call was made for
         """
+        with self._lock:
+            self._log_usage(text_length, input_tokens, output_tokens, user_name, source_language, target_language,
+                            kind)
+
+    def _log_usage(self, text_length: int, input_tokens: int, output_tokens: int, user_name: Optional[str],
+                   source_language: Optional[str], target_language: Optional[str],
+                   kind: UsageKind = UsageKind.TRANSLATION) -> None:
         usage_data = self._read_usage_data()
         
         # Update overall statistics
@@ -118,12 +153,65 @@ class UsageTracker:
             new_entry = UsageEntry(
                 input_tokens=input_tokens,
                 output_tokens=output_tokens,
-                text_length=text_length
+                text_length=text_length,
+                source_language=source_language,
+                target_language=target_language,
+                kind=kind
             )
             user_data.history.append(new_entry)
         
         self._write_usage_data(usage_data)
 
+    def log_cache_usage(
+        self,
+        hits: int,
+        misses: int,
+        saved_input_tokens: int = 0,
+        saved_output_tokens: int = 0,
+        user_name: Optional[str] = None
+    ) -> None:
+        """
+        Log translation cache hits and misses of a request.
+
+        Args:
+            hits: Number of paragraphs taken from the cache
+            misses: Number of paragraphs sent to LLM
+            saved_input_tokens: Estimated input tokens of the cached paragraphs
+            saved_output_tokens: Estimated output tokens of the cached paragraphs
+            user_name: Optional username to track per-user statistics
+        """
+        with self._lock:
+            usage_data = self._read_usage_data()
+            stats = [usage_data.overall]
+            if user_name:
+                stats.append(usage_data.users.setdefault(user_name, UserUsageStats()))
+            for st in stats:
+                st.cache_hits += hits
+                st.cache_misses += misses
+                st.saved_input_tokens += saved_input_tokens
+                st.saved_output_tokens += saved_output_tokens
+            self._write_usage_data(usage_data)
+
+    # the usage file is read and written on every call, async wrappers do it in a thread, not blocking the event loop
+    async def log_usage_async(self, text_length: int, input_tokens: int, output_tokens: int,
+                              user_name: Optional[str] = None, source_language: Optional[str] = None,
+                              target_language: Optional[str] = None,
+                              kind: UsageKind = UsageKind.TRANSLATION) -> None:
+        await asyncio.to_thread(self.log_usage, text_length, input_tokens, output_tokens, user_name,
+                                source_language, target_language, kind)
+
+    async def log_cache_usage_async(self, hits: int, misses: int, saved_input_tokens: int = 0,
+                                    saved_output_tokens: int = 0, user_name: Optional[str] = None) -> None:
+        await asyncio.to_thread(self.log_cache_usage, hits, misses, saved_input_tokens, saved_output_tokens, user_name)
+
+    async def get_overall_usage_stats_async(self) -> OverallUsageStats:
+        return await asyncio.to_thread(self.get_overall_usage_stats)
+
+    def get_history(self) -> List[UsageEntry]:
+        """Usage entries of all users"""
+        usage_data = self._read_usage_data()
+        return [entry for user_data in usage_data.users.values() for entry in user_data.history]
+
     def get_overall_usage_stats(self) -> OverallUsageStats:
         """
         Get overall usage statistics (excluding per-user data).
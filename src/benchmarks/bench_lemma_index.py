@@ -0,0 +1,79 @@
+"""
+Benchmark of lemmas indexing on book-length texts.
+    python -m src.benchmarks.bench_lemma_index            # indexing only, synthetic stream of words
+    python -m src.benchmarks.bench_lemma_index --stanza   # full lemmatize(), needs Turkish Stanza model
+Time per word should stay flat while the number of words grows, i.e. indexing scales linearly.
+"""
+import argparse
+import re
+import time
+
+from src.data_classes.lemma_index import LemmasIndex, LemmasIndexBuilder
+
+INPUT_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+SIZES = (12_500, 25_000, 50_000, 100_000)
+LEGACY_MAX_SIZE = 25_000  # old quadratic implementation gets too slow above that
+
+
+def _book(n_words: int) -> str:
+    """Repeat the test text until it has n_words, varying word forms to get a realistic vocabulary growth."""
+    with open(INPUT_TEXT_PATH, "r", encoding="utf-8") as f:
+        words = f.read().split()
+    book = []
+    i = 0
+    while len(book) < n_words:
+        word = words[i % len(words)]
+        book.append(word if i < len(words) or i % 7 else f"{word}{i // len(words)}")
+        i += 1
+    return " ".join(book)
+
+
+def _tokens(text: str):
+    for m in re.finditer(r"\w+", text):
+        word = m.group(0)
+        yield word.lower(), 'X', word, m.start()
+
+
+def bench_indexing():
+    print(f"{'words':>8} {'builder, s':>11} {'us/word':>8} {'legacy, s':>10} {'us/word':>8}")
+    for size in SIZES:
+        text = _book(size)
+        tokens = list(_tokens(text))
+
+        started = time.perf_counter()
+        builder = LemmasIndexBuilder(text=text)
+        for lemma, pos, word, position in tokens:
+            builder.add_lemma(lemma, pos, word, position)
+        builder.build()
+        builder_time = time.perf_counter() - started
+
+        legacy = ""
+        if size <= LEGACY_MAX_SIZE:
+            started = time.perf_counter()
+            lsi = LemmasIndex(text=text, lemmas=set())
+            for lemma, pos, word, position in tokens:
+                lsi.add_lemma(lemma=lemma, pos=pos, word=word, position_in_text=position)
+            legacy_time = time.perf_counter() - started
+            legacy = f"{legacy_time:>10.3f} {legacy_time / len(tokens) * 1e6:>8.1f}"
+        print(f"{len(tokens):>8} {builder_time:>11.3f} {builder_time / len(tokens) * 1e6:>8.1f} {legacy}")
+
+
+def bench_lemmatize():
+    from src.text_processing.nlp import lemmatize
+    lemmatize(_book(100), lang='tr')  # warm up, load the model
+    print(f"{'words':>8} {'lemmatize, s':>13} {'us/word':>8}")
+    for size in SIZES:
+        text = _book(size)
+        started = time.perf_counter()
+        lemmatize(text, lang='tr')
+        elapsed = time.perf_counter() - started
+        print(f"{size:>8} {elapsed:>13.3f} {elapsed / size * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stanza", action="store_true", help="run full lemmatization with Stanza")
+    args = parser.parse_args()
+    bench_indexing()
+    if args.stanza:
+        bench_lemmatize()
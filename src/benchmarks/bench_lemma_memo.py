@@ -0,0 +1,90 @@
+"""
+Benchmark of fast lemmatization with the word form -> lemma memo on a repeated corpus.
+    python -m src.benchmarks.bench_lemma_memo [--rounds 5]                        # needs Turkish Stanza model
+    python -m src.benchmarks.bench_lemma_memo --stub [--ms-per-word 0.5] [--tokenize-share 0.2]  # runs anywhere
+The corpus is the paragraphs of the test text, the memo starts empty in a temporary directory.
+Each round lemmatizes the corpus in full and in fast mode, and reports memo coverage (share of words resolved
+without the neural processors), speedup, and agreement of the (lemma, pos) sets of the two modes.
+With --stub Stanza is replaced by the rule-based sentence splitter and a regex tokenizer, lemmas are lower case
+forms. The full pipeline sleeps ms_per_word per word, the tokenizer alone (neural in Stanza too) tokenize_share
+of that. Coverage is that of the real corpus then, speedup is modelled by these costs and includes the memo lookups
+and writes, agreement is 100% by construction.
+"""
+import argparse
+import re
+import tempfile
+import time
+from types import SimpleNamespace
+
+from src import config as cfg
+from src.text_processing.sentence_splitter import sentence_spans
+
+INPUT_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+
+
+class _StubPipeline:
+
+    def __init__(self, processors: str, ms_per_word: float):
+        self.ms_per_word = ms_per_word
+
+    def __call__(self, text: str):
+        sentences = []
+        for start, end in sentence_spans(text):
+            words = [SimpleNamespace(text=m.group(0), lemma=m.group(0).lower(),
+                                     upos='NOUN' if m.group(0)[0].isalnum() else 'PUNCT',
+                                     start_char=start + m.start(), end_char=start + m.end(), parent=None)
+                     for m in re.finditer(r"\w+|[^\w\s]", text[start:end])]
+            if words:
+                sentences.append(SimpleNamespace(words=words, tokens=words))
+        time.sleep(sum(len(sentence.words) for sentence in sentences) * self.ms_per_word / 1000)
+        return SimpleNamespace(sentences=sentences)
+
+    def bulk_process(self, texts):
+        return [self(text) for text in texts]
+
+
+def bench(rounds: int, stub: bool = False, ms_per_word: float = 0.5, tokenize_share: float = 0.2):
+    with open(INPUT_TEXT_PATH, "r", encoding="utf-8") as f:
+        corpus = [p for p in f.read().split("\n\n") if p.strip()]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cfg.LEMMA_MEMO_DIR = tmp_dir  # before the memo is imported, to keep the real one intact
+        cfg.LEMMA_MEMO_LEARN = True  # full lemmatizations of each round teach the memo
+        from src.text_processing.lemma_memo import lemma_memo
+        from src.text_processing import nlp
+        from src.text_processing.nlp import lemmatize
+        if stub:
+            nlp.get_pipeline = lambda lang, processors: _StubPipeline(
+                processors, ms_per_word if 'lemma' in processors else ms_per_word * tokenize_share)
+        lemmatize(corpus[0], lang='tr', fast=False)  # warm up, load the models
+        lemmatize(corpus[0], lang='tr', fast=True)
+
+        print(f"{'round':>5} {'full, s':>8} {'fast, s':>8} {'speedup':>8} {'coverage':>9} {'agreement':>10}")
+        for i in range(1, rounds + 1):
+            started = time.perf_counter()
+            full = [lemmatize(paragraph, lang='tr', fast=False) for paragraph in corpus]
+            full_time = time.perf_counter() - started
+
+            before = lemma_memo.stats()
+            started = time.perf_counter()
+            fast = [lemmatize(paragraph, lang='tr', fast=True) for paragraph in corpus]
+            fast_time = time.perf_counter() - started
+            after = lemma_memo.stats()
+
+            resolved = after['resolved_words'] - before['resolved_words']
+            neural = after['neural_words'] - before['neural_words']
+            full_lemmas = {(lm.lemma, lm.pos) for lsi in full for lm in lsi.lemmas}
+            fast_lemmas = {(lm.lemma, lm.pos) for lsi in fast for lm in lsi.lemmas}
+            agreement = len(full_lemmas & fast_lemmas) / len(full_lemmas | fast_lemmas)
+            print(f"{i:>5} {full_time:>8.3f} {fast_time:>8.3f} {full_time / fast_time:>7.2f}x "
+                  f"{resolved / (resolved + neural):>9.1%} {agreement:>10.1%}")
+        lemma_memo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--stub", action="store_true", help="replace Stanza by a stub, see the module docstring")
+    parser.add_argument("--ms-per-word", type=float, default=0.5)
+    parser.add_argument("--tokenize-share", type=float, default=0.2)
+    args = parser.parse_args()
+    bench(args.rounds, args.stub, args.ms_per_word, args.tokenize_share)
@@ -0,0 +1,72 @@
+"""
+Benchmark of LLM output formats on the test text, needs GOOGLE_API_KEY and makes real (billed) calls.
+    python -m src.benchmarks.bench_llm_output_format [--rounds 3] [--target-language Russian]
+Each round translates the text once in structured (JSON) mode and once in compact mode (see compact_format),
+with the same model and temperature, and reports output tokens, wall time, time to the first paragraph
+(compact mode only, structured output is parsed at the end) and the number of paragraphs and syntagmas.
+Calls bypass the translation cache, the upstream governor and usage tracking.
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_core.messages import AIMessageChunk, SystemMessage, HumanMessage
+
+from src.data_classes.bilingual_text import BilingualText
+from src.prompts.prompt_reader import read_prompt, PromptName
+from src.text_processing.compact_format import CompactParser
+from src.text_processing.llm_communicator import llm
+
+INPUT_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+
+
+def _messages(prompt_name: PromptName, text: str, target_language: str):
+    system_prompt = read_prompt(prompt_name, target_language=target_language)
+    return [SystemMessage(content=system_prompt), HumanMessage(content=text)]
+
+
+async def structured(text: str, target_language: str):
+    started = time.perf_counter()
+    ret = await llm.with_structured_output(BilingualText, include_raw=True).ainvoke(
+        _messages(PromptName.MAKE_BILINGUAL, text, target_language))
+    return ret['parsed'], ret['raw'].usage_metadata, time.perf_counter() - started, None
+
+
+async def compact(text: str, target_language: str):
+    started = time.perf_counter()
+    first_paragraph = None
+    parser = CompactParser()
+    raw = AIMessageChunk(content='')
+    async for chunk in llm.astream(_messages(PromptName.MAKE_BILINGUAL_COMPACT, text, target_language)):
+        raw = raw + chunk
+        if parser.feed(chunk.content) and first_paragraph is None:
+            first_paragraph = time.perf_counter() - started
+    return parser.close(), raw.usage_metadata, time.perf_counter() - started, first_paragraph
+
+
+async def bench(rounds: int, target_language: str):
+    with open(INPUT_TEXT_PATH, "r", encoding="utf-8") as f:
+        text = f.read()
+    print(f"{'round':>5} {'mode':>10} {'in tokens':>10} {'out tokens':>11} {'wall, s':>8} {'first, s':>9} "
+          f"{'paragraphs':>11} {'syntagmas':>10}")
+    totals = {}
+    for i in range(1, rounds + 1):
+        for mode, fn in (("structured", structured), ("compact", compact)):
+            bt, usage, wall, first = await fn(text, target_language)
+            syntagmas = sum(len(p.Sintagmas) for p in bt.paragraphs) if bt else 0
+            first = f"{first:>9.2f}" if first is not None else f"{'-':>9}"
+            print(f"{i:>5} {mode:>10} {usage['input_tokens']:>10} {usage['output_tokens']:>11} {wall:>8.2f} {first} "
+                  f"{len(bt.paragraphs) if bt else 0:>11} {syntagmas:>10}")
+            output_tokens, seconds = totals.get(mode, (0, 0.0))
+            totals[mode] = output_tokens + usage['output_tokens'], seconds + wall
+    (structured_tokens, structured_time), (compact_tokens, compact_time) = totals["structured"], totals["compact"]
+    print(f"compact / structured: output tokens {compact_tokens / structured_tokens:.1%}, "
+          f"wall time {compact_time / structured_time:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--target-language", default="Russian")
+    args = parser.parse_args()
+    asyncio.run(bench(args.rounds, args.target_language))
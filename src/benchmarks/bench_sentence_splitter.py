@@ -0,0 +1,45 @@
+"""
+Benchmark of sentence splitting used by split_to_paragraphs for long paragraphs.
+    python -m src.benchmarks.bench_sentence_splitter            # rule-based splitter only
+    python -m src.benchmarks.bench_sentence_splitter --stanza   # compare with Stanza, needs Turkish Stanza model
+"""
+import argparse
+import time
+
+from src.text_processing.sentence_splitter import split_sentences, boundaries_agreement
+
+INPUT_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+REPEAT = 20
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main(with_stanza: bool):
+    with open(INPUT_TEXT_PATH, "r", encoding="utf-8") as f:
+        text = f.read()
+    book = "\n\n".join([text] * REPEAT)
+
+    rules, rules_time = _timed(split_sentences, book, 'tr')
+    print(f"rules:  {len(rules)} sentences of {len(book)} chars in {rules_time * 1000:.1f} ms")
+    if not with_stanza:
+        return
+
+    from src.text_processing.nlp import split_sentences_with_stanza
+    from src.text_processing.pipeline_pool import pipeline_pool
+    _, cold_time = _timed(split_sentences_with_stanza, text, 'tr')
+    print(f"stanza: model load and first call {cold_time:.2f} s")
+    stanza, stanza_time = _timed(split_sentences_with_stanza, book, 'tr')
+    print(f"stanza: {len(stanza)} sentences in {stanza_time * 1000:.1f} ms (warm, "
+          f"{stanza_time / rules_time:.0f}x slower than rules)")
+    print(f"agreement on sentence boundaries: {boundaries_agreement(rules, stanza):.2%}")
+    print(pipeline_pool.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stanza", action="store_true", help="compare with Stanza tokenizer")
+    main(parser.parse_args().stanza)
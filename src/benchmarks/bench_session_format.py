@@ -0,0 +1,80 @@
+"""
+Benchmark of saving a bilingual text to the session store and making the response of /api/make_bilingual.
+    python -m src.benchmarks.bench_session_format [--rounds 200] [--paragraphs 40]
+"indented" is the way it was done before: indented JSON dumped for the hash, for data_hash and for the file,
+then model_dump and JSON of the response. The other rows dump the canonical (compact) JSON once and write it
+with each compression. Reports CPU time per request of saving plus the response, of reading, and the file size.
+The text is made of the paragraphs of the test text repeated, so compression ratios are better than of real texts.
+"""
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+import zlib
+
+from src import config as cfg
+from src.api.session_backends import COMPRESSION_SUFFIXES, read_session_file, write_session_file
+from src.data_classes.bilingual_text import BilingualText
+
+
+def _text(paragraphs: int) -> BilingualText:
+    bt = BilingualText.from_json_file(cfg.TEST_DATA_PATH)
+    return bt.model_copy(update={"paragraphs": (bt.paragraphs * paragraphs)[:paragraphs]})
+
+
+def indented(bt: BilingualText, path: str) -> int:
+    bt_hash = zlib.crc32(bt.to_json().encode('utf-8')) & 0xFFFFFFFF
+    zlib.crc32(bt.to_json().encode('utf-8'))  # data_hash of the response
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(bt.to_json())
+    content = bt.model_dump()
+    content["data_hash"] = bt_hash
+    json.dumps(content, ensure_ascii=False).encode('utf-8')
+    return os.path.getsize(path)
+
+
+def canonical(bt: BilingualText, path: str) -> int:
+    bt = bt.model_copy()  # a new text for every request, as in the server
+    bt_hash = hash(bt)
+    written = write_session_file(path, bt.canonical_json())
+    bt.canonical_json()[:-1] + b',' + json.dumps({"data_hash": bt_hash})[1:].encode('utf-8')
+    return os.path.getsize(written)
+
+
+def _measure(fn, rounds: int) -> float:
+    started = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - started) / rounds * 1000
+
+
+def bench(rounds: int, paragraphs: int):
+    bt = _text(paragraphs)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'format':>10} {'save + response, ms':>20} {'read, ms':>9} {'file, bytes':>12}")
+        path = os.path.join(tmp_dir, "indented", "bilingual_text.json")
+        os.makedirs(os.path.dirname(path))
+        size = indented(bt, path)
+        save = _measure(lambda: indented(bt, path), rounds)
+        read = _measure(lambda: BilingualText.from_json_file(path), rounds)
+        print(f"{'indented':>10} {save:>20.3f} {read:>9.3f} {size:>12}")
+        for compression in COMPRESSION_SUFFIXES:
+            cfg.SESSION_STORE_COMPRESSION = compression
+            path = os.path.join(tmp_dir, compression, "bilingual_text.json")
+            os.makedirs(os.path.dirname(path))
+            size = canonical(bt, path)
+            save = _measure(lambda: canonical(bt, path), rounds)
+            read = _measure(lambda: BilingualText.model_validate_json(read_session_file(path)), rounds)
+            print(f"{compression:>10} {save:>20.3f} {read:>9.3f} {size:>12}")
+    print(f"{len(bt.paragraphs)} paragraphs, gzip of indented JSON would be "
+          f"{len(gzip.compress(bt.to_json().encode('utf-8'), mtime=0))} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    args = parser.parse_args()
+    bench(args.rounds, args.paragraphs)
@@ -0,0 +1,106 @@
+"""
+Load benchmark of the translation path with the fake LLM backend, no network or API key needed.
+    python -m src.benchmarks.bench_translation_load [--requests 100] [--concurrency 20] [--distinct 10]
+        [--latency 0.5] [--error-rate 0.02] [--throttle-rate 0.05] [--output-format structured|compact]
+Texts are made of the paragraphs of the test text in different orders, so requests share paragraphs (cache hits)
+and whole texts (coalescing). Usage stats and caches go to a temporary directory.
+Reports latency percentiles of whole texts and of the first paragraph, LLM calls and tokens,
+cache hits, coalesced calls and the state of the upstream governor.
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from src import config as cfg
+
+INPUT_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+
+
+def _texts(distinct: int):
+    with open(INPUT_TEXT_PATH, "r", encoding="utf-8") as f:
+        paragraphs = [p for p in f.read().split("\n\n") if p.strip()]
+    texts = []
+    for i in range(distinct):
+        shuffled = paragraphs[:]
+        random.Random(i).shuffle(shuffled)
+        texts.append("\n\n".join(shuffled[:max(1, len(shuffled) * 2 // 3)]))
+    return texts
+
+
+def _percentiles(values):
+    if not values:
+        return "-"
+    values = sorted(values)
+    p50, p95 = (values[min(len(values) - 1, int(q * len(values)))] for q in (0.5, 0.95))
+    return f"p50 {p50:.2f}s  p95 {p95:.2f}s  max {values[-1]:.2f}s"
+
+
+async def bench(args):
+    # before the modules creating singletons from the config are imported
+    tmp_dir = tempfile.mkdtemp()
+    cfg.LLM_BACKEND = 'fake'
+    cfg.FAKE_LLM_LATENCY_SECONDS = args.latency
+    cfg.FAKE_LLM_ERROR_RATE = args.error_rate
+    cfg.FAKE_LLM_THROTTLE_RATE = args.throttle_rate
+    cfg.LLM_OUTPUT_FORMAT = args.output_format
+    cfg.USAGE_DATA_PATH = f"{tmp_dir}/usage_stats.json"
+    cfg.TRANSLATION_CACHE_DIR = f"{tmp_dir}/translations"
+    cfg.NLP_WORKERS = 0
+    cfg.OVERALL_TOTAL_TEXT_LENGTH_QUOTA = 10 ** 12
+    from src.text_processing import llm_communicator
+    from src.text_processing.upstream_governor import upstream_stats
+    from src.auth.usage_tracker import usage_tracker
+
+    texts = _texts(args.distinct)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    totals, firsts, failures = [], [], []
+
+    async def request(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            first = None
+            try:
+                async for item in llm_communicator.stream_bilingual_text(texts[i % len(texts)], "Russian",
+                                                                         number_of_questions=2, user_name="bench"):
+                    first = first or time.perf_counter() - started
+            except Exception as e:
+                failures.append(e)
+                return
+            totals.append(time.perf_counter() - started)
+            firsts.append(first)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[request(i) for i in range(args.requests)])
+    wall = time.perf_counter() - started
+
+    stats = usage_tracker.get_overall_usage_stats()
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {len(texts)} distinct texts "
+          f"in {wall:.2f}s: {args.requests / wall:.1f} requests/s, {len(failures)} failed")
+    print(f"whole text:      {_percentiles(totals)}")
+    print(f"first paragraph: {_percentiles(firsts)}")
+    print(f"LLM calls: {stats.invocations_count}, tokens: {stats.total_input_tokens} in, "
+          f"{stats.total_output_tokens} out, mean output per call: "
+          f"{stats.total_output_tokens / max(stats.invocations_count, 1):.0f}")
+    print(f"paragraph cache: {stats.cache_hits} hits, {stats.cache_misses} misses; "
+          f"coalesced: {llm_communicator.translation_flights.stats()}")
+    for name, governor in upstream_stats().items():
+        print(f"governor {name}: {governor}")
+    if failures:
+        print(f"errors: {statistics.mode(type(e).__name__ for e in failures)} is the most common, e.g. {failures[0]}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--distinct", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--throttle-rate", type=float, default=0.05)
+    parser.add_argument("--output-format", choices=["structured", "compact"], default="structured")
+    asyncio.run(bench(parser.parse_args()))
@@ -9,7 +9,94 @@ LOGS_DIR = 'logs'
 # Usage tracking
 USAGE_DATA_PATH = 'data/audit/usage_stats.json'
 LLM_MODEL = "gemini-2.0-flash"
+# 'gemini', or 'fake' - local deterministic stand-in for load and regression testing without network (llm_backends)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini').lower()
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv('FAKE_LLM_LATENCY_SECONDS', '0.5'))  # per call, before the output
+FAKE_LLM_SECONDS_PER_OUTPUT_TOKEN = float(os.getenv('FAKE_LLM_SECONDS_PER_OUTPUT_TOKEN', '0.004'))
+FAKE_LLM_CHARS_PER_TOKEN = 4
+FAKE_LLM_ERROR_RATE = float(os.getenv('FAKE_LLM_ERROR_RATE', '0'))  # share of calls failing with 500
+FAKE_LLM_THROTTLE_RATE = float(os.getenv('FAKE_LLM_THROTTLE_RATE', '0'))  # share of calls failing with 429
+FAKE_LLM_SEED = 0
 MAX_PARAGRAPH_LENGTH = 1000
+# Longer texts are translated by batches of paragraphs in parallel, batches are planned by estimated tokens
+LLM_MAX_CONCURRENCY = 4  # max number of LLM calls in parallel for one text
+LLM_MAX_INPUT_TOKENS_PER_REQUEST = 30000
+LLM_MAX_OUTPUT_TOKENS_PER_REQUEST = 6000  # with headroom, the model stops at 8192 output tokens
+LLM_MIN_BATCH_OUTPUT_TOKENS = 1500  # smaller calls are dominated by the prompt overhead
+LLM_TOKENS_PER_MINUTE = 1000000  # input + output tokens per minute, per server process
+# Token estimates before calibration on usage history: tokens = overhead + per_char * characters of the source text
+TOKEN_ESTIMATE_INPUT_OVERHEAD = 1500  # the system prompt
+TOKEN_ESTIMATE_INPUT_PER_CHAR = 0.3
+TOKEN_ESTIMATE_OUTPUT_OVERHEAD = 100
+TOKEN_ESTIMATE_OUTPUT_PER_CHAR = 1.2  # bilingual JSON output is several times the input
+TOKEN_ESTIMATE_MIN_SAMPLES = 5  # language pairs with fewer recorded calls use the model fitted on all calls
+TOKEN_ESTIMATE_RECALIBRATE_SECONDS = 3600
+LLM_BATCH_RETRIES = 2  # failed batch is retried that many times
+# 'structured' - JSON output parsed by langchain, 'compact' - line-oriented output, fewer output tokens (compact_format)
+LLM_OUTPUT_FORMAT = os.getenv('LLM_OUTPUT_FORMAT', 'structured').lower()
+# Governor of upstream calls (LLM, TTS), per provider and server process: adaptive concurrency, token buckets, retries
+UPSTREAM_LLM_MAX_CONCURRENCY = 16  # concurrency limit starts here, is halved when the provider throttles
+UPSTREAM_LLM_CALL_TIMEOUT_SECONDS = 180
+UPSTREAM_TTS_MAX_CONCURRENCY = 4
+UPSTREAM_TTS_REQUESTS_PER_MINUTE = 200
+UPSTREAM_QUEUE_TIMEOUT_SECONDS = 60  # calls waiting longer for a slot are rejected as busy
+UPSTREAM_RETRIES = 2
+UPSTREAM_BACKOFF_BASE_SECONDS = 1.0
+UPSTREAM_BACKOFF_MAX_SECONDS = 30.0
+# Session store of bilingual texts and lemmas: files (under SESSION_DATA_FILE_PATH) or sqlite,
+# audio and PDF files are under SESSION_DATA_FILE_PATH with both
+SESSION_STORE_BACKEND = os.getenv('SESSION_STORE_BACKEND', 'files')
+SESSION_STORE_SQLITE_PATH = os.getenv('SESSION_STORE_SQLITE_PATH', 'data/session_store.sqlite3')
+SESSION_STORE_SQLITE_BUSY_TIMEOUT_SECONDS = 30  # writers of other workers are waited for that long
+# Session store garbage collection: texts not accessed for the TTL are removed, above the quota
+# audio and PDF of least recently accessed texts are removed first, then the texts
+SESSION_STORE_TTL_SECONDS = int(os.getenv('SESSION_STORE_TTL_SECONDS', 30 * 24 * 3600))
+SESSION_STORE_MAX_BYTES = int(os.getenv('SESSION_STORE_MAX_BYTES', 5 * 1024 ** 3))
+SESSION_STORE_GC_INTERVAL_SECONDS = 3600
+# compression of JSON files of the session store: none, gzip or zstd (needs zstandard package, gzip without it)
+SESSION_STORE_COMPRESSION = os.getenv('SESSION_STORE_COMPRESSION', 'gzip')
+SESSION_STORE_COMPRESSION_LEVEL = 6
+# Cache of bilingual texts read from the session store, in memory of each server process
+SESSION_CACHE_MAX_ITEMS = 256
+SESSION_CACHE_MAX_BYTES = 64 * 1024 ** 2  # of their JSON
+SESSION_CACHE_TTL_SECONDS = 30 * 60
+# Cache of translated paragraphs
+TRANSLATION_CACHE_DIR = 'data/cache/translations'
+TRANSLATION_CACHE_MAX_MEMORY_BYTES = 50 * 1024 ** 2
+TRANSLATION_CACHE_MAX_DISK_BYTES = 1024 ** 3
+# identical batches in flight are translated once; with cross worker lock also across server processes
+SINGLE_FLIGHT_CROSS_WORKER = os.getenv('SINGLE_FLIGHT_CROSS_WORKER', 'false').lower() == 'true'
+SINGLE_FLIGHT_LOCK_DIR = 'data/locks'  # not under SESSION_DATA_FILE_PATH, which is served as static files
+# Language detection
+LANG_DETECT_SAMPLE_LENGTH = 2000  # detection looks only at that many characters of the text
+LANG_DETECT_CACHE_SIZE = 1024
+SENTENCE_SPLIT_WITH_STANZA = False  # split long paragraphs by Stanza (more accurate, slower) instead of rules
+# Stanza pipelines pool
+STANZA_POOL_MAX_MODELS = 4  # max number of pipelines kept loaded at the same time
+STANZA_POOL_MAX_BYTES = 2 * 1024 ** 3  # estimated memory cap for loaded pipelines
+# comma separated list of languages to load at app startup, like 'tr,ru,en'
+STANZA_PRELOAD_LANGUAGES = [lng.strip() for lng in os.getenv('STANZA_PRELOAD_LANGUAGES', '').split(',') if lng.strip()]
+# NLP worker processes
+NLP_WORKERS = int(os.getenv('NLP_WORKERS', 2))  # 0 - run NLP tasks in threads of the web server process
+NLP_WORKER_TORCH_THREADS = 2  # torch threads per worker, NLP_WORKERS * NLP_WORKER_TORCH_THREADS <= number of cores
+NLP_MAX_QUEUE = 16  # max number of queued and running NLP tasks, requests above that get 503
+NLP_TASK_TIMEOUT = 300  # seconds
+# Cache of lemmatization results
+LEMMA_CACHE_DIR = 'data/cache/lemmas'
+LEMMA_CACHE_MAX_MEMORY_BYTES = 200 * 1024 ** 2
+LEMMA_CACHE_MAX_DISK_BYTES = 2 * 1024 ** 3
+# Memo of word form -> lemma learned from Stanza outputs
+LEMMA_MEMO_DIR = 'data/cache/lemma_memo'
+LEMMA_MEMO_MIN_COUNT = 3  # form is resolved from the memo after it was seen that many times
+LEMMA_MEMO_MIN_SHARE = 0.95  # ... and one analysis makes at least that share of them, otherwise it is ambiguous
+LEMMA_MEMO_MAX_ROWS = 1_000_000  # per language, then only analyses already in the memo are counted
+# fast mode: only tokenize, resolve known forms from the memo, run POS and lemma only on the rest of sentences
+LEMMATIZE_FAST = os.getenv('LEMMATIZE_FAST', 'false').lower() == 'true'
+# full lemmatizations teach the memo too, only worth the writes if fast mode is used
+LEMMA_MEMO_LEARN = os.getenv('LEMMA_MEMO_LEARN', str(LEMMATIZE_FAST)).lower() == 'true'
+# Streaming lemmatization
+LEMMATIZE_STREAM_CHUNK_LENGTH = 5000  # text is lemmatized by chunks of paragraphs of about this length
+LEMMATIZE_STREAM_TABLE_EVERY = 10  # partial frequency table is sent after every N chunks
 #  Azure TTL
 SPEECH_REGION = 'westeurope'
 SPEECH_KEY = os.getenv('SPEECH_KEY')
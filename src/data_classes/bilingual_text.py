@@ -1,5 +1,5 @@
 import zlib
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Optional
 import yaml
 
@@ -31,6 +31,12 @@ class Questions(BaseModel):
     question: str = Field(..., description="The question text")
     answer: Optional[str] = Field(..., description="The answer text")
 
+class QuestionSet(BaseModel):
+    """
+    Questions related to a text, generated apart from its translation.
+    """
+    questions: List[Questions] = Field(..., description="A list of questions related to the text, with answers")
+
 class BilingualText(BaseModel):
     paragraphs: List[BilingualParagraph] = Field(
         ...,
@@ -49,6 +55,33 @@ class BilingualText(BaseModel):
         None,
         description="A list of questions related to the bilingual text, if available"
     )
+    _canonical_json: Optional[bytes] = PrivateAttr(None)
+
+    def canonical_json(self) -> bytes:
+        """
+        Compact JSON of the text in UTF-8, the hash, the session store file and API responses are made of it.
+        Computed once: assigning fields resets it, changing paragraphs or questions in place does not,
+        replace them or use model_copy instead.
+        """
+        if self._canonical_json is None:
+            self._canonical_json = self.model_dump_json().encode('utf-8')
+        return self._canonical_json
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._canonical_json = None
+
+    def model_copy(self, *, update=None, deep: bool = False) -> "BilingualText":
+        copy = super().model_copy(update=update, deep=deep)
+        copy._canonical_json = None
+        return copy
+
+    def __eq__(self, other):
+        # the cached JSON is a private attribute, which pydantic compares too
+        if not isinstance(other, BilingualText):
+            return NotImplemented
+        return self.__dict__ == other.__dict__
 
     def to_json(self):
         """Convert the BilingualText instance to a JSON string."""
@@ -63,7 +96,7 @@ class BilingualText(BaseModel):
     
     def __hash__(self):
         # Compute the CRC32 hash
-        return zlib.crc32(self.to_json().encode('utf-8')) & 0xFFFFFFFF  # Mask to 32 bits
+        return zlib.crc32(self.canonical_json()) & 0xFFFFFFFF  # Mask to 32 bits
 
     @classmethod
     def from_json_file(cls, file_path: str) -> "BilingualText":
@@ -1,5 +1,6 @@
+from array import array
 from pydantic import BaseModel, Field
-from typing import List, Set
+from typing import Dict, List, Set, Tuple
 import yaml
 
 
@@ -51,7 +52,8 @@ class LemmasIndex(BaseModel):
         description="List of unique lemmas with their part of speech and occurrences in the text"
     )
     def add_lemma(self, lemma: str, pos: str, word: str, position_in_text: int):
-        """Add a lemma to the index, ensuring uniqueness and updating occurrences."""
+        """Add a lemma to the index, ensuring uniqueness and updating occurrences.
+        Lookups here are linear, for indexing of the whole text use LemmasIndexBuilder."""
         # Find existing lemma entry
         existing_lemma = next((l for l in self.lemmas if l.lemma == lemma and l.pos == pos), None)
         if not existing_lemma:
@@ -74,3 +76,62 @@ class LemmasIndex(BaseModel):
             existing_lemma.word_occurrences_in_text.append(
                 WordOccurrencesInText(word=word, positions_in_text=[position_in_text])
             )
+
+
+class LemmasIndexBuilder:
+    """
+    Accumulates lemmas of a text with O(1) lookups by (lemma, pos) and by word form,
+    keeping positions in compact integer arrays. Pydantic models are created only in build().
+    """
+
+    def __init__(self, text: str = ""):
+        self.text = text
+        self._lemmas: Dict[Tuple[str, str], Dict[str, array]] = {}
+
+    def add_lemma(self, lemma: str, pos: str, word: str, position_in_text: int):
+        words = self._lemmas.get((lemma, pos))
+        if words is None:
+            words = self._lemmas[(lemma, pos)] = {}
+        positions = words.get(word)
+        if positions is None:
+            positions = words[word] = array('q')
+        positions.append(position_in_text)
+
+    def merge(self, lsi: LemmasIndex, offset: int = 0):
+        """Add lemmas of an index built for a fragment of the text starting at offset."""
+        for lemma in lsi.lemmas:
+            for occurrence in lemma.word_occurrences_in_text:
+                for position in occurrence.positions_in_text:
+                    self.add_lemma(lemma.lemma, lemma.pos, occurrence.word, position + offset)
+
+    def __len__(self) -> int:
+        """Number of unique lemmas collected so far."""
+        return len(self._lemmas)
+
+    def frequency_list(self) -> List[dict]:
+        """Lemmas with number of words and occurrences, the most frequent first."""
+        rows = [
+            {
+                "lemma": lemma,
+                "number_of_words": len(words),
+                "number_of_occurrences": sum(len(positions) for positions in words.values())
+            }
+            for (lemma, _), words in self._lemmas.items()
+        ]
+        rows.sort(key=lambda row: row["number_of_occurrences"], reverse=True)
+        return rows
+
+    def build(self) -> LemmasIndex:
+        """Convert collected data to LemmasIndex."""
+        lemmas = {
+            LemmaInTheText(
+                lemma=lemma,
+                pos=pos,
+                word_occurrences_in_text=[
+                    WordOccurrencesInText(word=word, positions_in_text=positions.tolist())
+                    for word, positions in words.items()
+                ]
+            )
+            for (lemma, pos), words in self._lemmas.items()
+        }
+        return LemmasIndex(text=self.text, lemmas=lemmas)
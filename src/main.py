@@ -1,22 +1,41 @@
+import asyncio
+import json
 import os
 import traceback
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from src.text_processing.nlp import lemmatize
+from src.text_processing.pipeline_pool import pipeline_pool
+from src.text_processing.nlp_pool import nlp_pool, NLPPoolBusyError
+from src.text_processing.result_cache import lemma_cache
+from src.text_processing.lemma_memo import lemma_memo
+from src.text_processing.upstream_governor import UpstreamBusyError, upstream_stats
+from src.api.session_cache import bilingual_text_cache
+from src.api.session_store import session_store_manager
+from src.api.session_backends import session_store
 from src.data_classes.lemma_index import LemmasIndex
-from src.data_classes.bilingual_text import BilingualText
 from src.tts.tts_generator import TTS_GEN, AudioOutputFormat
 from src.pdf_gen.pdf_generator import generate_bilingual_pdf
-from src.api.data_classes import TranslationRequest, LemmatizeRequest
+from src.api.data_classes import TranslationRequest, LemmatizeRequest, LemmatizeBatchRequest, QuestionsRequest
 
 from src.api.utils import (
     save_to_session_store,
     read_from_session_store,
-    get_bilingual_text
+    save_lemmas_to_session_store,
+    read_pdf_from_session_store,
+    bilingual_text_json,
+    read_lemmas_from_session_store,
+    get_bilingual_text,
+    get_bilingual_text_and_lemmas,
+    add_questions,
+    stream_bilingual_text_ndjson,
+    frequency_list_for_fe,
+    get_lemmas_index_async,
+    get_lemmas_indexes_async,
+    stream_lemmatization
 )
 import src.config as cfg
 from src.auth.authentication import get_current_user, UserRole
@@ -25,6 +44,7 @@ from src.logging_config import setup_logging
 
 logger = setup_logging(logger_name=__name__, log_dir=cfg.LOGS_DIR,)
 TEST_MODE = False  # if True, we are using test instance of BilingualText from file instead of LLM-generated data
+# (for translations of any input without network, run with LLM_BACKEND=fake instead)
 app = FastAPI()
 # Allow CORS for local dev
 app.add_middleware(
@@ -37,6 +57,28 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
 
 
+@app.on_event("startup")
+def start_nlp_pool():
+    # workers load pipelines of STANZA_PRELOAD_LANGUAGES in background, requests for the same model will wait for it
+    logger.info(f"Starting NLP pool: {nlp_pool.workers} workers, preloading: {cfg.STANZA_PRELOAD_LANGUAGES}")
+    nlp_pool.start()
+
+
+@app.on_event("startup")
+def start_session_store_gc():
+    session_store_manager.start()
+
+
+@app.on_event("shutdown")
+def stop_nlp_pool():
+    nlp_pool.shutdown()
+
+
+@app.on_event("shutdown")
+def stop_session_store_gc():
+    session_store_manager.shutdown()
+
+
 @app.get("/")
 def index():
     try:
@@ -48,30 +90,80 @@ def index():
 
 
 @app.post("/api/make_bilingual")
-def make_bilingual(req: TranslationRequest, user=Depends(get_current_user)):
+async def make_bilingual(req: TranslationRequest, user=Depends(get_current_user)):
+    """If req.lemmatization, lemmas of the source text are computed along with the translation,
+    returned in "lemmas" and stored in the session, see /api/lemmas.
+    If req.stream, paragraphs are streamed as NDJSON as soon as they are translated."""
     try:
-        bt: BilingualText = get_bilingual_text(req, is_test_mode=TEST_MODE, user=user)
-        bt_hash = save_to_session_store(bt)
+        if req.stream:
+            return StreamingResponse(
+                _ndjson_with_errors(stream_bilingual_text_ndjson(req, is_test_mode=TEST_MODE, user=user),
+                                    endpoint="make_bilingual", user=user),
+                media_type="application/x-ndjson")
+        bt, lsi = await get_bilingual_text_and_lemmas(req, is_test_mode=TEST_MODE, user=user)
+        bt_hash = await asyncio.to_thread(save_to_session_store, bt, user_name=user.username)
         logger.info(f"Bilingual text save in session with hash: {bt_hash} | User: {user.username}")
+        if lsi is not None:
+            await asyncio.to_thread(save_lemmas_to_session_store, bt_hash, lsi)
         if req.output_format in ('web', 'json'):
-            content = bt.model_dump()
-            content["data_hash"] = hash(bt)
+            extra = {"data_hash": bt_hash}
+            if lsi is not None:
+                extra["lemmas"] = frequency_list_for_fe(lsi)
             # Removed test exception
-            return JSONResponse(content=content)
+            return Response(content=bilingual_text_json(bt, **extra), media_type="application/json")
         else:
             return JSONResponse(content={"error": f"not valid output_format: {req.output_format}"}, status_code=400)
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:  # todo - sort out error handling
         logger.error(f"Error in make_bilingual: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/make_questions")
+async def make_questions(req: QuestionsRequest, user=Depends(get_current_user)):
+    """Questions to a translation made with defer_questions. The text with questions gets its own data_hash."""
+    try:
+        bt = await add_questions(req, user=user)
+        bt_hash = await asyncio.to_thread(save_to_session_store, bt, user_name=user.username)
+        return JSONResponse(content={"data_hash": bt_hash,
+                                     "questions": [q.model_dump() for q in bt.questions] if bt.questions else None})
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except Exception as e:
+        logger.error(f"Error in make_questions: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/download_pdf", response_class=Response)
+async def download_pdf(bilingual_text_hash: int, user=Depends(get_current_user)):
+    """
+    PDF of a bilingual text from the session store, by its hash, as an attachment.
+    No LLM calls, the PDF is generated once and stored along with the text.
+    """
+    try:
+        pdf = await asyncio.to_thread(read_pdf_from_session_store, bilingual_text_hash)
+        file_name = f"bilingual_text_{bilingual_text_hash}.pdf"
+        return Response(content=pdf, media_type="application/pdf",
+                        headers={"Content-Disposition": f"attachment; filename={file_name}"})
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in download_pdf: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/make-pdf", response_class=Response)
-def make_pdf(req: TranslationRequest, user=Depends(get_current_user)):
-    """Endpoint to generate PDF from bilingual text data"""
+async def make_pdf(req: TranslationRequest, user=Depends(get_current_user)):
+    """Endpoint to generate PDF from bilingual text data, translates the text, see /api/download_pdf for stored texts"""
     try:
-        bilingual_text_instance = get_bilingual_text(req, is_test_mode=TEST_MODE, user=user)
-        pdf_buffer = generate_bilingual_pdf(bilingual_text_instance)
+        bilingual_text_instance = await get_bilingual_text(req, is_test_mode=TEST_MODE, user=user)
+        pdf_buffer = await asyncio.to_thread(generate_bilingual_pdf, bilingual_text_instance)
         return Response(content=pdf_buffer, media_type="application/pdf")
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
         logger.error(f"Error in make_pdf: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -88,8 +180,7 @@ def make_audio(bilingual_text_hash: int, output_format: AudioOutputFormat,
     If ssml_only is True, returns the generated SSML without creating audio files.
     """
     try:
-        output_dir = os.path.join(cfg.SESSION_DATA_FILE_PATH, str(bilingual_text_hash))
-        bilingual_text_instance = read_from_session_store(bilingual_text_hash, output_dir)
+        bilingual_text_instance = read_from_session_store(bilingual_text_hash)
         tts = TTS_GEN()
         
         # If SSML only is requested, generate and return the SSML without creating audio
@@ -105,7 +196,7 @@ def make_audio(bilingual_text_hash: int, output_format: AudioOutputFormat,
         
         # Otherwise, generate the audio file as before
         audio_file_name = f"audio_{bilingual_text_hash}_{output_format}"
-        output_audio_file_path = os.path.join(output_dir, audio_file_name)
+        output_audio_file_path = os.path.join(session_store.artifacts_dir(bilingual_text_hash), audio_file_name)
         logger.info(f"Generating audio for bilingual text with hash {bilingual_text_hash} to {output_audio_file_path} | User: {user.username}")
         
         tts.binlingual_to_audio(
@@ -114,10 +205,13 @@ def make_audio(bilingual_text_hash: int, output_format: AudioOutputFormat,
             output_file_name=output_audio_file_path,
             aof=output_format
         )
+        session_store.add_artifact(bilingual_text_hash, f"{audio_file_name}.mp3")
         
         # Generate the URL relative to the static mount
         audio_url = f"/static/data/{bilingual_text_hash}/{audio_file_name}.mp3"
         return JSONResponse(content={"audio_url": audio_url})
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
         logger.error(f"Error in make_audio: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -132,8 +226,7 @@ def download_ssml(bilingual_text_hash: int, output_format: AudioOutputFormat,
     Returns the SSML content directly with XML content type.
     """
     try:
-        output_dir = os.path.join(cfg.SESSION_DATA_FILE_PATH, str(bilingual_text_hash))
-        bilingual_text_instance = read_from_session_store(bilingual_text_hash, output_dir)
+        bilingual_text_instance = read_from_session_store(bilingual_text_hash)
         logger.info(f"Generating SSML for download with hash {bilingual_text_hash} | User: {user.username}")
         
         tts = TTS_GEN()
@@ -157,31 +250,65 @@ def download_ssml(bilingual_text_hash: int, output_format: AudioOutputFormat,
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _ndjson_with_errors(lines, endpoint: str, user):
+    """Once streaming has started, status code can not be changed, so errors are reported as the last line."""
+    try:
+        async for line in lines:
+            yield line
+    except Exception as e:
+        logger.error(f"Error in {endpoint}: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
 @app.post("/api/lemmatize")
-def lemmatize_endpoint(req: LemmatizeRequest, user=Depends(get_current_user)):
+async def lemmatize_endpoint(req: LemmatizeRequest, user=Depends(get_current_user)):
     try:
-        result: LemmasIndex = lemmatize(
+        if req.stream:
+            return StreamingResponse(
+                _ndjson_with_errors(stream_lemmatization(req.text, req.language, req.filter_out_stop_words),
+                                    endpoint="lemmatize_endpoint", user=user),
+                media_type="application/x-ndjson")
+        result: LemmasIndex = await get_lemmas_index_async(
             text=req.text,
             lang=req.language,
             filter_out_stop_words=req.filter_out_stop_words
         )
-        frequency_list = sorted(result.lemmas, key=lambda lemma: lemma.number_of_occurrences, reverse=True)
-
-        # Only include lemma, number_of_words, and number_of_occurencs in the response
-        for_fe = [
-            {
-                "lemma": lemma.lemma,
-                "number_of_words": lemma.number_of_words,
-                "number_of_occurrences": lemma.number_of_occurrences
-            }
-            for lemma in frequency_list
-        ]
-        return JSONResponse(content={"lemmas": for_fe})
+        return JSONResponse(content={"lemmas": frequency_list_for_fe(result)})
+    except NLPPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error in lemmatize_endpoint: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/lemmas")
+def get_lemmas(bilingual_text_hash: int, user=Depends(get_current_user)):
+    """Frequency list of lemmas of the source text, stored by make_bilingual with lemmatization."""
+    try:
+        lsi = read_lemmas_from_session_store(bilingual_text_hash)
+        return JSONResponse(content={"lemmas": frequency_list_for_fe(lsi)})
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in get_lemmas: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/lemmatize_batch")
+async def lemmatize_batch_endpoint(req: LemmatizeBatchRequest, user=Depends(get_current_user)):
+    """Lemmatizes several texts at once, texts of the same language are processed by Stanza in one bulk call.
+    Results are returned in the order of the request items."""
+    try:
+        logger.info(f"Lemmatizing batch of {len(req.items)} texts | User: {user.username}")
+        results = await get_lemmas_indexes_async(req.items)
+        return JSONResponse(content={"results": [{"lemmas": frequency_list_for_fe(lsi)} for lsi in results]})
+    except NLPPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in lemmatize_batch_endpoint: {str(e)} | User: {user.username}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/current_user")
 def get_user_info(user=Depends(get_current_user)):
     try:
@@ -208,6 +335,47 @@ def get_usage_stats(user_name: str = None, user=Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/nlp_stats")
+def get_nlp_stats(user=Depends(get_current_user)):
+    """Stats of NLP worker pool, Stanza pipelines pool, lemmatization cache and lemma memo. Admins only."""
+    if user.role not in (UserRole.Admin, UserRole.SupeAdmin):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    # in processes mode pipelines are loaded by workers, so pipeline_pool of this process stays empty
+    return JSONResponse(content={"nlp_pool": nlp_pool.stats(), "pipeline_pool": pipeline_pool.stats(),
+                                 "lemma_cache": lemma_cache.stats(), "lemma_memo": lemma_memo.stats()})
+
+
+@app.get("/api/upstream_stats")
+def get_upstream_stats(user=Depends(get_current_user)):
+    """Concurrency limit, calls in flight, queue depth and failures of calls to LLM and TTS providers. Admins only."""
+    if user.role not in (UserRole.Admin, UserRole.SupeAdmin):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return JSONResponse(content=upstream_stats())
+
+
+@app.get("/api/session_cache_stats")
+def get_session_cache_stats(user=Depends(get_current_user)):
+    """Hits, misses and size of the in-memory cache of bilingual texts of the session store. Admins only."""
+    if user.role not in (UserRole.Admin, UserRole.SupeAdmin):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return JSONResponse(content=bilingual_text_cache.stats())
+
+
+@app.get("/api/session_store_stats")
+def get_session_store_stats(user=Depends(get_current_user)):
+    """Number and size of texts in the session store, and what its garbage collection removed. Admins only."""
+    if user.role not in (UserRole.Admin, UserRole.SupeAdmin):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return JSONResponse(content=session_store_manager.stats())
+
+
+@app.get("/api/session_texts")
+def get_session_texts(limit: int = 100, user=Depends(get_current_user)):
+    """Hashes, languages, times and sizes of texts of the current user, the latest first."""
+    infos = session_store.texts_of_user(user.username, limit)
+    return JSONResponse(content=[info.model_dump() for info in infos])
+
+
 @app.post("/api/logout")
 def logout():
     return Response(headers={"WWW-Authenticate": "Basic", "Clear-Site-Data": "*"})
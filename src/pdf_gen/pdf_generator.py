@@ -216,6 +216,9 @@ def generate_bilingual_pdf(bilingual_text: BilingualText) -> bytes:
 
 
 def get_fonts():
+    font_name = "NotoSans"
+    if font_name in pdfmetrics.getRegisteredFontNames():  # parsing of the font takes longer than a short PDF
+        return font_name
     # Create fonts directory if it doesn't exist
     fonts_dir = os.path.join(os.path.dirname(__file__), "fonts")
     if not os.path.exists(fonts_dir):
@@ -237,7 +240,6 @@ def get_fonts():
                 f.write(response.content)
     
     # Register the font with ReportLab
-    font_name = "NotoSans"
     try:
         pdfmetrics.registerFont(TTFont(font_name, font_path))
     except Exception:
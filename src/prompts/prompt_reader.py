@@ -1,4 +1,6 @@
+import hashlib
 from enum import StrEnum
+from functools import lru_cache
 from pathlib import Path
 
 class PromptName(StrEnum):
@@ -6,6 +8,8 @@ class PromptName(StrEnum):
     Enum for prompt names used in text processing.
     """
     MAKE_BILINGUAL = "src/prompts/make_text_bilingual.md"
+    MAKE_BILINGUAL_COMPACT = "src/prompts/make_text_bilingual_compact.md"
+    MAKE_QUESTIONS = "src/prompts/make_questions.md"
 
 def read_prompt(prompt_name: PromptName, **kwargs) -> str:
     """
@@ -26,4 +30,10 @@ def read_prompt(prompt_name: PromptName, **kwargs) -> str:
     except FileNotFoundError:
         raise FileNotFoundError(f"Prompt file '{prompt_name.value}' not found.")
     except Exception as e:
-        raise Exception(f"An error occurred while reading the prompt: {e}")
\ No newline at end of file
+        raise Exception(f"An error occurred while reading the prompt: {e}")
+
+
+@lru_cache(maxsize=None)
+def prompt_version(prompt_name: PromptName) -> str:
+    """Hash of the prompt file content, results cached for one version of a prompt are not valid for another."""
+    return hashlib.sha256(Path(prompt_name.value).read_bytes()).hexdigest()[:16]
@@ -68,7 +68,9 @@ document.getElementById('translate-form').addEventListener('submit', async funct
     const targetLanguage = document.getElementById('target_language').value;
     const outputFormat = document.getElementById('output_format').value;
     const layout = document.getElementById('layout').value;
-    const numberOfQuestions = parseInt(document.getElementById('number_of_questions').value) || 2;
+    const questionsValue = parseInt(document.getElementById('number_of_questions').value);
+    const numberOfQuestions = isNaN(questionsValue) ? 2 : questionsValue;  // 0 - no questions
+    const deferQuestions = document.getElementById('defer_questions').checked;
     const lemmatization = document.getElementById('lemmatization').checked;
     const filterOutStopWords = document.getElementById('filter_out_stop_words')?.checked || false;
 
@@ -78,6 +80,8 @@ document.getElementById('translate-form').addEventListener('submit', async funct
         output_format: outputFormat,
         layout: layout,
         number_of_questions: numberOfQuestions,
+        // questions are requested separately once the translation is shown, on the web page only
+        defer_questions: deferQuestions && outputFormat === 'web',
         lemmatization: lemmatization,
         filter_out_stop_words: filterOutStopWords
     };
@@ -150,7 +154,10 @@ document.getElementById('translate-form').addEventListener('submit', async funct
 
         if (response.ok) {
             const result = await response.json();
-            if (lemmatization) {
+            if (lemmatization && result.lemmas) {
+                // lemmas were computed along with the translation
+                newWindow.document.body.innerHTML = '<pre>' + JSON.stringify({ lemmas: result.lemmas }, null, 2) + '</pre>';
+            } else if (lemmatization) {
                 // If lemmatization is checked, fetch lemmas and show as raw JSON
                 const lemmaResponse = await fetch('/api/lemmatize', {
                     method: 'POST',
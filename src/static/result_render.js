@@ -89,8 +89,12 @@ function renderContinuous(bilingual) {
 }
 
 function renderSideBySide(bilingual) {
-    let html = '<table><tr><th>Source</th><th>Translation</th></tr>';
-    for (const para of bilingual.paragraphs) {
+    return '<table><tr><th>Source</th><th>Translation</th></tr>' + renderSideBySideRows(bilingual.paragraphs) + '</table>';
+}
+
+function renderSideBySideRows(paragraphs) {
+    let html = '';
+    for (const para of paragraphs) {
         let isFirstSyntagma = true;
         let previousEndsWithSentenceEnd = false;
         
@@ -108,7 +112,6 @@ function renderSideBySide(bilingual) {
             isFirstSyntagma = false;
         }
     }
-    html += '</table>';
     return html;
 }
 
@@ -133,43 +136,115 @@ function renderLemmasTable(lemmas) {
     return html;
 }
 
+// Container for streamed paragraphs, each one is appended to it as it comes, without rebuilding the ones shown
+function startStreamedBilingual(contentElement, layout) {
+    if (layout === 'side-by-side') {
+        contentElement.innerHTML = renderSideBySide({ paragraphs: [] }) + '<p>Translating..</p>';
+        const rows = contentElement.querySelector('tbody');
+        return (para) => rows.insertAdjacentHTML('beforeend', renderSideBySideRows([para]));
+    }
+    contentElement.innerHTML = '<div></div><p>Translating..</p>';
+    const container = contentElement.firstElementChild;
+    return (para) => container.insertAdjacentHTML('beforeend', renderContinuous({ paragraphs: [para] }));
+}
+
 // Only run this if on the bilingual result page
 async function loadBilingualResult() {
     // Get params from window.name or localStorage or another method if needed
     // For now, expect window.bilingualRequestData to be set by opener
     if (!window.bilingualRequestData) return;
     const requestData  = window.bilingualRequestData;
+    const contentElement = document.getElementById('bilingual-content');
     const response = await fetch('/api/make_bilingual', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(requestData)
+        body: JSON.stringify({ ...requestData, stream: true })
     });
-    if (response.ok) {
-        const end_point_data = await response.json();
-        window.data_hash = end_point_data.data_hash;
-        console.log(`data_hash = ${end_point_data.data_hash}`)
-        let rnd = renderBilingual(end_point_data, requestData.layout);
-        
-        // Add questions if they exist
-        if (end_point_data.questions && end_point_data.questions.length > 0) {
-            rnd += renderQuestions(end_point_data.questions);
-        }
-        
-        document.getElementById('bilingual-content').innerHTML = rnd;
-        
-        // Set up question toggle functionality after content is inserted
-        if (end_point_data.questions && end_point_data.questions.length > 0) {
-            // Use setTimeout to ensure DOM is fully rendered before setting up toggles
-            setTimeout(() => {
-                setupQuestionToggles();
-            }, 100);
-        }
-        
-        // If lemmatization is requested, fetch lemmas and append as table
-        if (requestData.lemmatization) await request_lemmanization(requestData, end_point_data); 
-    } else {
+    if (!response.ok) {
         document.body.innerHTML = '<p>Error loading data</p>';
+        return;
     }
+    // Response is NDJSON: translated paragraphs as soon as they are ready, then the rest of the data
+    const end_point_data = { paragraphs: [] };
+    const appendParagraph = startStreamedBilingual(contentElement, requestData.layout);
+    await readNdjson(response, (line) => {
+        if (line.error) {
+            contentElement.insertAdjacentHTML('beforeend', '<p>Error loading data</p>');
+        } else if (line.paragraph) {
+            end_point_data.paragraphs.push(line.paragraph);
+            appendParagraph(line.paragraph);
+        } else if (line.done) {
+            Object.assign(end_point_data, line);
+        }
+    });
+    if (!end_point_data.done) return;
+    window.data_hash = end_point_data.data_hash;
+    console.log(`data_hash = ${end_point_data.data_hash}`)
+    let rnd = renderBilingual(end_point_data, requestData.layout);
+
+    // Add questions if they exist
+    if (end_point_data.questions && end_point_data.questions.length > 0) {
+        rnd += renderQuestions(end_point_data.questions);
+    }
+
+    contentElement.innerHTML = rnd;
+
+    // Set up question toggle functionality after content is inserted
+    if (end_point_data.questions && end_point_data.questions.length > 0) {
+        // Use setTimeout to ensure DOM is fully rendered before setting up toggles
+        setTimeout(() => {
+            setupQuestionToggles();
+        }, 100);
+    }
+
+    // If lemmatization is requested, lemmas come along with the translation, otherwise fetch them and append as table
+    const pending = [];
+    if (end_point_data.lemmas) {
+        document.getElementById('lemmas-content').innerHTML = renderLemmasTable(end_point_data.lemmas);
+    } else if (requestData.lemmatization) {
+        pending.push(request_lemmanization(requestData, end_point_data));
+    }
+    if (requestData.defer_questions && requestData.number_of_questions > 0) {
+        pending.push(requestDeferredQuestions(requestData, end_point_data));
+    }
+    await Promise.all(pending);
+}
+
+// PDF of the text shown, made from the stored text by its hash, without translating it again
+function downloadPdf() {
+    if (!window.data_hash) {
+        alert('The translation is not ready yet');
+        return;
+    }
+    const link = document.createElement('a');
+    link.href = `/api/download_pdf?bilingual_text_hash=${window.data_hash}`;
+    link.download = `bilingual_text_${window.data_hash}.pdf`;
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
+// Questions to a translation made with defer_questions, appended below the text
+async function requestDeferredQuestions(requestData, end_point_data) {
+    const contentElement = document.getElementById('bilingual-content');
+    const response = await fetch('/api/make_questions', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            bilingual_text_hash: end_point_data.data_hash,
+            number_of_questions: requestData.number_of_questions
+        })
+    });
+    if (!response.ok) {
+        console.error('Error generating questions', response.status);
+        return;
+    }
+    const result = await response.json();
+    if (!result.questions || !result.questions.length) return;
+    // the text with questions is stored under its own hash, audio and downloads should use it
+    window.data_hash = result.data_hash;
+    contentElement.insertAdjacentHTML('beforeend', renderQuestions(result.questions));
+    setupQuestionToggles();
 }
 // console.log("window.bilingualRequestData:", window.bilingualRequestData);
 if (window.location.pathname.endsWith('bilingual_result.html')) {
@@ -266,16 +341,45 @@ async function request_lemmanization(requestData, end_point_data) {
             body: JSON.stringify({
                 text: requestData.source_text,
                 language: end_point_data.source_language,
-                filter_out_stop_words: requestData.filter_out_stop_words
+                filter_out_stop_words: requestData.filter_out_stop_words,
+                stream: true
             })
         });
-        if (lemmaResponse.ok) {
-            const lemmaData = await lemmaResponse.json();
-            lemma_page_element.innerHTML = renderLemmasTable(lemmaData.lemmas);
-        } else {
+        if (!lemmaResponse.ok) {
             lemma_page_element.innerHTML = '<p>Error loading lemma data</p>';
+            return;
+        }
+        // Response is NDJSON: progress lines, partial frequency tables and the final table
+        await readNdjson(lemmaResponse, (line) => {
+            if (line.error) {
+                lemma_page_element.innerHTML = '<p>Error loading lemma data</p>';
+            } else if (line.lemmas) {
+                let progress = line.done ? '' : `<p>Processed ${Math.round(100 * line.processed_chars / line.total_chars)}%..</p>`;
+                lemma_page_element.innerHTML = progress + renderLemmasTable(line.lemmas);
+            } else if (!lemma_page_element.querySelector('table')) {
+                lemma_page_element.innerHTML = `Working on preparation of frequency list.. ${Math.round(100 * line.processed_chars / line.total_chars)}%`;
+            }
+        });
+    }
+}
+
+// Reads NDJSON response line by line, calling onLine for each parsed line as soon as it arrives
+async function readNdjson(response, onLine) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let newLineIndex;
+        while ((newLineIndex = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newLineIndex).trim();
+            buffer = buffer.slice(newLineIndex + 1);
+            if (line) onLine(JSON.parse(line));
         }
     }
+    if (buffer.trim()) onLine(JSON.parse(buffer));
 }
 
 function renderQuestions(questions) {
@@ -0,0 +1,22 @@
+from unittest import TestCase
+
+from src.data_classes.bilingual_text import BilingualText, Questions
+from src import config as cfg
+
+
+class TestBilingualText(TestCase):
+
+    def setUp(self):
+        self.bt = BilingualText.from_json_file(cfg.TEST_DATA_PATH)
+        self.bt.questions = [Questions(question="Otobüs dolu muydu?", answer="Hayır."),
+                             Questions(question="Kenan Bey nereye oturdu?", answer="Arkaya.")]
+
+    def test_canonical_json_is_reset_by_changes(self):
+        canonical = self.bt.canonical_json()
+        self.assertEqual(BilingualText.model_validate_json(canonical), self.bt)
+        self.assertIs(self.bt.canonical_json(), canonical)
+        copy = self.bt.model_copy(update={"questions": None})
+        self.assertNotEqual(hash(copy), hash(self.bt))
+        self.bt.questions = None
+        self.assertEqual(hash(copy), hash(self.bt))
+        self.assertEqual(copy, self.bt)
@@ -0,0 +1,48 @@
+from unittest import TestCase
+
+from src.data_classes.bilingual_text import BilingualText
+from src.text_processing.compact_format import CompactParser, CompactFormatError, parse_compact, to_compact
+
+OUTPUT = """## tr-TR || ru-RU
+Otobüs boştu. || Автобус был пуст.
+
+Kenan Bey arkaya || Кенан-бей назад
+oturdu. || сел.
+
+## Q Otobüs nasıldı? || Boştu.
+"""
+
+
+class TestCompactParser(TestCase):
+
+    def test_paragraphs_are_completed_while_streaming(self):
+        parser = CompactParser()
+        completed = []
+        for i in range(0, len(OUTPUT), 7):  # chunks split lines in the middle
+            completed.append(len(parser.feed(OUTPUT[i:i + 7])))
+        bt = parser.close()
+        self.assertEqual(sum(completed), 2)
+        self.assertEqual((bt.source_language, bt.target_language), ("tr-TR", "ru-RU"))
+        self.assertEqual([len(p.Sintagmas) for p in bt.paragraphs], [1, 2])
+        self.assertEqual(bt.paragraphs[1].Sintagmas[0].target_text, "Кенан-бей назад")
+        self.assertEqual(bt.questions[0].answer, "Boştu.")
+
+    def test_round_trip(self):
+        bt = BilingualText.from_json_file("src/tests/test_data/outputs/billing_text.json")
+        parsed = parse_compact(to_compact(bt))
+
+        def texts(text):
+            return [(s.source_text.strip(), s.target_text.strip()) for p in text.paragraphs for s in p.Sintagmas]
+
+        self.assertEqual(texts(parsed), texts(bt))
+        self.assertEqual(len(parsed.paragraphs), len(bt.paragraphs))
+        self.assertEqual(parsed.questions, bt.questions)
+
+    def test_code_fence_and_missing_translation(self):
+        bt = parse_compact("```\n## tr-TR || en-US\nMerhaba ||\n```")
+        self.assertEqual(bt.paragraphs[0].Sintagmas[0].source_text, "Merhaba")
+        self.assertEqual(bt.paragraphs[0].Sintagmas[0].target_text, "")
+
+    def test_no_header(self):
+        with self.assertRaises(CompactFormatError):
+            parse_compact("Merhaba || Hello")
@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from src.text_processing.language_detection import (detect_language, detect_language_or_none, language_sample,
+                                                    _detect_sample)
+
+TURKISH_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+
+
+class TestLanguageDetection(TestCase):
+
+    def setUp(self):
+        with open(TURKISH_TEXT_PATH, "r", encoding="utf-8") as f:
+            self.text = f.read()
+
+    def test_detects_primary_language(self):
+        self.assertEqual(detect_language(self.text), 'tr')
+        self.assertEqual(detect_language("The bus was empty, so Mr. Kenan sat in the back."), 'en')
+
+    def test_deterministic(self):
+        short_text = "Otobüs boştu."
+        _detect_sample.cache_clear()
+        results = set()
+        for _ in range(5):
+            results.add(detect_language(short_text))
+            _detect_sample.cache_clear()
+        self.assertEqual(len(results), 1)
+
+    def test_sample_is_bounded(self):
+        book = "\n\n".join([self.text] * 50)
+        sample = language_sample(book, sample_length=2000)
+        self.assertLessEqual(len(sample), 2000)
+        self.assertGreater(len(sample), 1000)
+        self.assertEqual(language_sample("short text", sample_length=2000), "short text")
+
+    def test_memoized(self):
+        _detect_sample.cache_clear()
+        detect_language(self.text)
+        detect_language(self.text)
+        self.assertEqual(_detect_sample.cache_info().hits, 1)
+
+    def test_no_language_in_text(self):
+        self.assertEqual(detect_language_or_none(self.text), 'tr')
+        for text in ("12345 2024-10-17", "!!! ...", "\U0001F600\U0001F44D", ""):
+            self.assertIsNone(detect_language_or_none(text))
@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from src.data_classes.lemma_index import LemmasIndex, LemmasIndexBuilder
+
+
+class TestLemmasIndexBuilder(TestCase):
+
+    WORDS = [  # lemma, pos, word, position
+        ('otobüs', 'NOUN', 'Otobüs', 0),
+        ('gel', 'VERB', 'geldi', 7),
+        ('otobüs', 'NOUN', 'otobüs', 14),
+        ('otobüs', 'NOUN', 'Otobüs', 22),
+        ('gel', 'NOUN', 'gel', 30),
+    ]
+
+    def test_build_matches_add_lemma(self):
+        builder = LemmasIndexBuilder(text='some text')
+        legacy = LemmasIndex(text='some text', lemmas=set())
+        for lemma, pos, word, position in self.WORDS:
+            builder.add_lemma(lemma, pos, word, position)
+            legacy.add_lemma(lemma=lemma, pos=pos, word=word, position_in_text=position)
+        built = builder.build()
+        self.assertEqual(len(builder), 3)
+        self.assertEqual(built.text, 'some text')
+        by_key = {(lm.lemma, lm.pos): lm for lm in built.lemmas}
+        for expected in legacy.lemmas:
+            actual = by_key[(expected.lemma, expected.pos)]
+            self.assertEqual(actual.model_dump(), expected.model_dump())
+
+    def test_positions_are_plain_ints(self):
+        builder = LemmasIndexBuilder()
+        builder.add_lemma('otobüs', 'NOUN', 'Otobüs', 0)
+        builder.add_lemma('otobüs', 'NOUN', 'Otobüs', 22)
+        lemma = next(iter(builder.build().lemmas))
+        self.assertEqual(lemma.word_occurrences_in_text[0].positions_in_text, [0, 22])
+        self.assertEqual(lemma.number_of_occurrences, 2)
+        self.assertEqual(lemma.number_of_words, 1)
+
+    def test_merge_shifts_positions(self):
+        first = LemmasIndexBuilder(text='Otobüs geldi.')
+        first.add_lemma('otobüs', 'NOUN', 'Otobüs', 0)
+        first.add_lemma('gel', 'VERB', 'geldi', 7)
+        second = LemmasIndexBuilder(text='Otobüs boştu.')
+        second.add_lemma('otobüs', 'NOUN', 'Otobüs', 0)
+        merged = LemmasIndexBuilder(text='Otobüs geldi.\n\nOtobüs boştu.')
+        merged.merge(first.build(), offset=0)
+        merged.merge(second.build(), offset=15)
+        by_lemma = {lm.lemma: lm for lm in merged.build().lemmas}
+        self.assertEqual(by_lemma['otobüs'].word_occurrences_in_text[0].positions_in_text, [0, 15])
+        self.assertEqual(merged.frequency_list()[0],
+                         {"lemma": "otobüs", "number_of_words": 1, "number_of_occurrences": 2})
@@ -0,0 +1,80 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.text_processing.lemma_memo import LemmaMemo
+
+TURKISH_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+
+
+class TestLemmaMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.memo = LemmaMemo(self.tmp_dir.name, min_count=2, min_share=0.9)
+
+    def tearDown(self):
+        self.memo.close()
+        self.tmp_dir.cleanup()
+
+    def test_known_after_min_count(self):
+        self.memo.observe('tr', [('geldi', 'gel', 'VERB')])
+        self.assertEqual(self.memo.lookup('tr', ['geldi']), {})
+        self.memo.observe('tr', [('geldi', 'gel', 'VERB')])
+        self.assertEqual(self.memo.lookup('tr', ['geldi', 'otobüs']), {'geldi': ('gel', 'VERB')})
+        self.assertEqual(self.memo.lookup('en', ['geldi']), {})  # memos are per language
+
+    def test_ambiguous_forms_are_not_resolved(self):
+        self.memo.observe('tr', [('yüz', 'yüz', 'NUM')] * 5 + [('yüz', 'yüz', 'NOUN')] * 5)
+        self.assertEqual(self.memo.lookup('tr', ['yüz']), {})
+        self.memo.observe('tr', [('yüz', 'yüz', 'NUM')] * 100)
+        self.assertEqual(self.memo.lookup('tr', ['yüz']), {'yüz': ('yüz', 'NUM')})
+
+    def test_persisted(self):
+        self.memo.observe('tr', [('geldi', 'gel', 'VERB')] * 2)
+        restarted = LemmaMemo(self.tmp_dir.name, min_count=2, min_share=0.9)
+        self.assertEqual(restarted.lookup('tr', ['geldi']), {'geldi': ('gel', 'VERB')})
+        restarted.close()
+
+    def test_coverage_of_all_processes(self):
+        self.memo.count('tr', resolved_words=3, neural_words=1)
+        other = LemmaMemo(self.tmp_dir.name)  # like another worker process
+        other.count('en', resolved_words=3, neural_words=1)
+        other.close()
+        stats = self.memo.stats()
+        self.assertEqual((stats['resolved_words'], stats['neural_words'], stats['coverage']), (6, 2, 0.75))
+        self.assertEqual(set(stats['languages']), {'tr', 'en'})
+
+    def test_learning_stops_at_max_rows(self):
+        self.memo.max_rows = 2
+        self.memo.observe('tr', [('geldi', 'gel', 'VERB'), ('gitti', 'git', 'VERB')])
+        self.memo.observe('tr', [('geldi', 'gel', 'VERB'), ('otobüs', 'otobüs', 'NOUN')])
+        self.assertEqual(self.memo.lookup('tr', ['geldi', 'gitti', 'otobüs']), {'geldi': ('gel', 'VERB')})
+        self.assertEqual(self.memo.stats()['languages']['tr']['rows'], 2)
+
+    def test_broken_memo_knows_nothing(self):
+        os.makedirs(self.tmp_dir.name, exist_ok=True)
+        with open(self.memo._path('tr'), 'wb') as f:
+            f.write(b'not a database' * 100)
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(self.memo.lookup('tr', ['geldi']), {})
+
+    @unittest.skipUnless(importlib.util.find_spec("stanza"), "stanza is not installed")
+    @mock.patch('src.config.LEMMA_MEMO_LEARN', True)
+    def test_fast_lemmatize_matches_full(self):
+        from src.text_processing.nlp import lemmatize
+        with open(TURKISH_TEXT_PATH, "r", encoding="utf-8") as f:
+            text = f.read()
+        full = lemmatize(text, lang='tr', fast=False)
+        for _ in range(3):  # learn the forms of the text
+            lemmatize(text, lang='tr', fast=False)
+        fast = lemmatize(text, lang='tr', fast=True)
+        full_lemmas = {(lm.lemma, lm.pos) for lm in full.lemmas}
+        fast_lemmas = {(lm.lemma, lm.pos) for lm in fast.lemmas}
+        self.assertGreaterEqual(len(full_lemmas & fast_lemmas) / len(full_lemmas | fast_lemmas), 0.95)
+
+
+if __name__ == "__main__":
+    unittest.main()
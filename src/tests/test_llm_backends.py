@@ -0,0 +1,93 @@
+import asyncio
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from src.auth.usage_tracker import UsageTracker
+from src.data_classes.bilingual_text import BilingualText, QuestionSet
+from src.prompts.prompt_reader import read_prompt, PromptName
+from src.text_processing.compact_format import parse_compact
+from src.text_processing.llm_backends import FakeLLM, FakeLLMError, create_llm
+from src.text_processing.nlp_pool import NLPWorkerPool
+from src.text_processing.result_cache import ResultCache
+
+TEXT = "Otobüs boştu, Kenan Bey arkaya oturdu.\n\nŞoför radyoyu açtı."
+
+
+def _messages(prompt_name=PromptName.MAKE_BILINGUAL, **kwargs):
+    return [SystemMessage(content=read_prompt(prompt_name, **kwargs)), HumanMessage(content=TEXT)]
+
+
+class TestFakeLLM(TestCase):
+
+    def test_structured_output_is_valid_and_deterministic(self):
+        llm = FakeLLM(latency=0, seconds_per_output_token=0)
+        structured = llm.with_structured_output(BilingualText, include_raw=True)
+        first = asyncio.run(structured.ainvoke(_messages(target_language="Russian")))
+        second = asyncio.run(structured.ainvoke(_messages(target_language="Russian")))
+        bt = first["parsed"]
+        self.assertEqual(bt, second["parsed"])
+        self.assertEqual(bt.target_language, "Russian")
+        self.assertEqual([len(p.Sintagmas) for p in bt.paragraphs], [2, 1])
+        self.assertEqual(bt.paragraphs[1].Sintagmas[0].target_text, "röfoŞ uyoydar .ıtça")
+        usage = first["raw"].usage_metadata
+        self.assertEqual(usage["output_tokens"], -(-len(first["raw"].content) // 4))
+
+    def test_questions(self):
+        llm = FakeLLM(latency=0, seconds_per_output_token=0)
+        ret = asyncio.run(llm.with_structured_output(QuestionSet).ainvoke(
+            _messages(PromptName.MAKE_QUESTIONS, number_of_questions=3)))
+        self.assertEqual(len(ret.questions), 3)
+
+    def test_compact_stream(self):
+        llm = FakeLLM(latency=0, seconds_per_output_token=0, chars_per_token=1)
+
+        async def collect():
+            return [chunk async for chunk in llm.astream(_messages(PromptName.MAKE_BILINGUAL_COMPACT,
+                                                                   target_language="Russian"))]
+
+        chunks = asyncio.run(collect())
+        self.assertGreater(len(chunks), 2)
+        bt = parse_compact("".join(chunk.content for chunk in chunks))
+        self.assertEqual(len(bt.paragraphs), 2)
+        self.assertGreater(chunks[-1].usage_metadata["output_tokens"], 0)
+
+    def test_error_rates(self):
+        llm = FakeLLM(latency=0, seconds_per_output_token=0, error_rate=0.2, throttle_rate=0.3, seed=1)
+        structured = llm.with_structured_output(BilingualText)
+        errors = []
+        for _ in range(200):
+            try:
+                asyncio.run(structured.ainvoke(_messages(target_language="Russian")))
+            except FakeLLMError as e:
+                errors.append(str(e)[:3])
+        self.assertAlmostEqual(errors.count("429") / 200, 0.3, delta=0.1)
+        self.assertAlmostEqual(errors.count("500") / 200, 0.2, delta=0.1)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_llm("unknown")
+
+
+class TestTranslationWithFakeBackend(TestCase):
+
+    def test_create_bilingual_text(self):
+        with mock.patch("src.config.LLM_BACKEND", "fake"):  # no API key needed on import
+            from src.text_processing import llm_communicator
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with mock.patch("src.config.USAGE_DATA_PATH", os.path.join(tmp_dir, "usage.json")):
+                tracker = UsageTracker()
+            # every third call is throttled, the governor retries them
+            with mock.patch.object(llm_communicator, "llm", FakeLLM(latency=0.01, seconds_per_output_token=0,
+                                                                    throttle_rate=0.3)), \
+                    mock.patch.object(llm_communicator, "usage_tracker", tracker), \
+                    mock.patch.object(llm_communicator, "nlp_pool", NLPWorkerPool(workers=0)), \
+                    mock.patch.object(llm_communicator, "translation_cache",
+                                      ResultCache("test", tmp_dir, max_memory_bytes=10 ** 5, max_disk_bytes=10 ** 6)), \
+                    mock.patch.object(llm_communicator.gemini_governor, "backoff_base", 0.01):
+                bt = llm_communicator.create_bilingual_text(TEXT, "Russian", number_of_questions=2,
+                                                            source_language="tr")
+        self.assertEqual(len(bt.paragraphs), 2)
+        self.assertEqual(len(bt.questions), 2)
@@ -1,5 +1,5 @@
 from unittest import TestCase
-from src.text_processing.nlp import lemmatize
+from src.text_processing.nlp import lemmatize, lemmatize_many
 from src.data_classes.lemma_index import LemmasIndex   
 
 class TestNLP(TestCase):
@@ -9,7 +9,7 @@ class TestNLP(TestCase):
             result: LemmasIndex = lemmatize(text)
             assert isinstance(result, LemmasIndex), "Lemmatization result should be a LemmasIndex instance"
             assert len(result.lemmas) > 0, "Lemmatization should return at least one lemma"
-            sorted_lemmas = sorted(result.lemmas, key=lambda l: l.number_of_occurrences, reverse=True)
+            sorted_lemmas = sorted(result.lemmas, key=lambda lemma: lemma.number_of_occurrences, reverse=True)
             print(f'Count of lemmas: {len(sorted_lemmas)}')
             for lemma in list(sorted_lemmas)[:20]:
                 assert lemma.number_of_words > 0, "Each lemma should have at least one word associated with it"
@@ -18,7 +18,14 @@ class TestNLP(TestCase):
                 print(f'count of occurrences in lemma: {lemma.number_of_occurrences}')
                 print(lemma.to_yaml())
 
-
-
-
-        
\ No newline at end of file
+    def test_lemmatize_many(self):
+        with open("src/tests/test_data/inputs/turkish_text.txt", "r") as file:
+            paragraphs = [p for p in file.read().split("\n\n") if p.strip()][:3]
+        texts = paragraphs + ["The bus was empty. Mr. Kenan sat down."]
+        results = lemmatize_many(texts, langs=['tr'] * len(paragraphs) + ['en'])
+        assert len(results) == len(texts), "There should be one LemmasIndex per input text"
+        for text, result in zip(texts, results):
+            assert result.text == text, "Results should be returned in the order of input texts"
+            single = lemmatize(text, lang='tr' if text in paragraphs else 'en')
+            assert {(lemma.lemma, lemma.pos) for lemma in result.lemmas} == \
+                {(lemma.lemma, lemma.pos) for lemma in single.lemmas}
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import time
+from unittest import TestCase
+
+from src.text_processing.nlp_pool import NLPWorkerPool, NLPPoolBusyError
+
+
+class TestNLPWorkerPool(TestCase):
+
+    def test_run_in_threads(self):
+        pool = NLPWorkerPool(workers=0, max_queue=2, preload_languages=[])
+        self.assertEqual(pool.run(pow, 2, 10), 1024)
+        self.assertEqual(asyncio.run(pool.run_async(pow, 3, 2)), 9)
+        self.assertEqual(pool.stats()['completed'], 2)
+        pool.shutdown()
+
+    def test_run_in_worker_process(self):
+        pool = NLPWorkerPool(workers=1, max_queue=2, preload_languages=[])
+        try:
+            self.assertNotEqual(pool.run(os.getpid), os.getpid())
+        finally:
+            pool.shutdown()
+
+    def test_bounded_queue(self):
+        pool = NLPWorkerPool(workers=0, max_queue=2, preload_languages=[])
+        futures = [pool.submit(time.sleep, 0.2) for _ in range(2)]
+        with self.assertRaises(NLPPoolBusyError):
+            pool.submit(time.sleep, 0.2)
+        for f in futures:
+            f.result()
+        pool.run(time.sleep, 0)  # slots are released when tasks end
+        self.assertEqual(pool.stats()['rejected'], 1)
+        pool.shutdown()
+
+    def test_timeout(self):
+        pool = NLPWorkerPool(workers=0, max_queue=2, preload_languages=[])
+        with self.assertRaises(TimeoutError):
+            pool.run(time.sleep, 0.5, timeout=0.05)
+        with self.assertRaises(TimeoutError):
+            asyncio.run(pool.run_async(time.sleep, 0.5, timeout=0.05))
+        self.assertEqual(pool.stats()['timeouts'], 2)
+        pool.shutdown()
+
+    def test_timed_out_worker_is_recycled(self):
+        pool = NLPWorkerPool(workers=1, max_queue=1, preload_languages=[])
+        try:
+            pid = pool.run(os.getpid)
+            with self.assertRaises(TimeoutError):
+                pool.run(time.sleep, 60, timeout=0.5)
+            # the slot is free and the stuck worker is replaced
+            self.assertNotEqual(pool.run(os.getpid), pid)
+            stats = pool.stats()
+            self.assertEqual((stats['timeouts'], stats['recycled'], stats['pending']), (1, 1, 0))
+        finally:
+            pool.shutdown()
@@ -0,0 +1,59 @@
+import threading
+import time
+from unittest import TestCase
+
+from src.text_processing.pipeline_pool import PipelinePool
+
+
+class TestPipelinePool(TestCase):
+
+    def setUp(self):
+        self.loaded = []
+
+        def loader(lang, processors, **options):
+            time.sleep(0.01)
+            self.loaded.append((lang, processors, options))
+            return object()
+
+        self.loader = loader
+
+    def test_reuses_loaded_pipeline(self):
+        pool = PipelinePool(max_models=2, max_bytes=100, loader=self.loader, size_estimator=lambda p: 1)
+        first = pool.get('tr')
+        second = pool.get('tr')
+        self.assertIs(first, second)
+        self.assertEqual(len(self.loaded), 1)
+        stats = pool.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_options_are_part_of_key(self):
+        pool = PipelinePool(max_models=4, max_bytes=100, loader=self.loader, size_estimator=lambda p: 1)
+        self.assertIsNot(pool.get('tr', 'tokenize'), pool.get('tr', 'tokenize', tokenize_no_ssplit=True))
+        self.assertEqual(len(self.loaded), 2)
+
+    def test_lru_eviction_by_count_and_size(self):
+        pool = PipelinePool(max_models=2, max_bytes=100, loader=self.loader, size_estimator=lambda p: 40)
+        pool.get('tr')
+        pool.get('en')
+        pool.get('tr')  # 'en' is now least recently used
+        pool.get('ru')
+        resident = [m['lang'] for m in pool.stats()['resident_models']]
+        self.assertEqual(resident, ['tr', 'ru'])
+
+        pool = PipelinePool(max_models=10, max_bytes=100, loader=self.loader, size_estimator=lambda p: 60)
+        pool.get('tr')
+        pool.get('en')
+        self.assertEqual([m['lang'] for m in pool.stats()['resident_models']], ['en'])
+        self.assertEqual(pool.stats()['evictions'], 1)
+
+    def test_concurrent_misses_load_once(self):
+        pool = PipelinePool(max_models=2, max_bytes=100, loader=self.loader, size_estimator=lambda p: 1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.get('tr'))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.loaded), 1)
+        self.assertTrue(all(r is results[0] for r in results))
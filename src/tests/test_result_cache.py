@@ -0,0 +1,81 @@
+import asyncio
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from src.data_classes.lemma_index import LemmasIndex, LemmasIndexBuilder
+from src.text_processing.result_cache import ResultCache
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache('test', self.tmp_dir.name, max_memory_bytes=100, max_disk_bytes=1000)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_all_parts(self):
+        key = ResultCache.make_key('text', 'tr', False, '1.10.1')
+        self.assertEqual(key, ResultCache.make_key('text', 'tr', False, '1.10.1'))
+        self.assertNotEqual(key, ResultCache.make_key('text', 'tr', True, '1.10.1'))
+        self.assertNotEqual(key, ResultCache.make_key('text', 'tr', False, '1.10.2'))
+
+    def test_memory_and_disk_hits(self):
+        key = ResultCache.make_key('text')
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, 'value')
+        self.assertEqual(self.cache.get(key), 'value')
+        # a new instance (e.g. after restart) finds the value on disk
+        restarted = ResultCache('test', self.tmp_dir.name, max_memory_bytes=100, max_disk_bytes=1000)
+        self.assertEqual(restarted.get(key), 'value')
+        self.assertEqual(self.cache.stats()['memory_hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(restarted.stats()['disk_hits'], 1)
+
+    def test_size_bounded_eviction(self):
+        keys = [ResultCache.make_key(i) for i in range(10)]
+        for key in keys:
+            self.cache.put(key, 'x' * 200)
+        stats = self.cache.stats()
+        self.assertEqual(stats['memory_items'], 1)
+        self.assertLessEqual(stats['disk_bytes'], 1000)
+        self.assertGreater(stats['disk_evictions'], 0)
+        self.assertEqual(self.cache.get(keys[-1]), 'x' * 200)  # the most recent entry survives
+        files = [f for _, _, fs in os.walk(self.tmp_dir.name) for f in fs]
+        self.assertLess(len(files), len(keys))
+
+    def test_disk_is_walked_once(self):
+        keys = [ResultCache.make_key(i) for i in range(10)]
+        self.cache.put(keys[0], 'x' * 200)
+        with mock.patch('os.walk', side_effect=AssertionError("the disk is walked again")):
+            for key in keys[1:]:
+                self.cache.put(key, 'x' * 200)
+        self.assertLessEqual(self.cache.stats()['disk_bytes'], 1000)
+        on_disk = sum(os.path.getsize(os.path.join(root, f)) for root, _, fs in os.walk(self.tmp_dir.name) for f in fs)
+        self.assertEqual(self.cache.stats()['disk_bytes'], on_disk)
+
+    def test_async_access(self):
+        keys = [ResultCache.make_key(i) for i in range(3)]
+
+        async def main():
+            await self.cache.put_async(keys[0], 'zero')
+            await self.cache.put_many_async([(keys[1], 'one')])
+            restarted = ResultCache('test', self.tmp_dir.name, max_memory_bytes=100, max_disk_bytes=1000)
+            return await restarted.get_many_async(keys), await restarted.get_async(keys[0]), restarted.stats()
+
+        values, again, stats = asyncio.run(main())
+        self.assertEqual(values, ['zero', 'one', None])
+        self.assertEqual(again, 'zero')
+        self.assertEqual((stats['disk_hits'], stats['memory_hits'], stats['misses']), (2, 1, 1))
+
+    def test_lemmas_index_round_trip(self):
+        builder = LemmasIndexBuilder(text='Otobüs boştu.')
+        builder.add_lemma('otobüs', 'NOUN', 'Otobüs', 0)
+        builder.add_lemma('boş', 'ADJ', 'boştu', 7)
+        lsi = builder.build()
+        cache = ResultCache('test', self.tmp_dir.name, max_memory_bytes=10_000, max_disk_bytes=10_000)
+        key = ResultCache.make_key(lsi.text, 'tr', False, 'unknown')
+        cache.put(key, lsi.model_dump_json())
+        self.assertEqual(LemmasIndex.model_validate_json(cache.get(key)), lsi)
@@ -0,0 +1,42 @@
+import importlib.util
+import unittest
+
+from src.text_processing.sentence_splitter import split_sentences, sentence_spans, boundaries_agreement
+
+TURKISH_TEXT_PATH = "src/tests/test_data/inputs/turkish_text.txt"
+
+
+class TestSentenceSplitter(unittest.TestCase):
+
+    def test_abbreviations_and_initials(self):
+        text = "Mr. Smith met J. R. R. Tolkien in the U.S. in Jan. 1950. They talked."
+        self.assertEqual(split_sentences(text, 'en'),
+                         ["Mr. Smith met J. R. R. Tolkien in the U.S. in Jan. 1950.", "They talked."])
+
+    def test_turkish_abbreviations(self):
+        text = "Prof. Dr. Ahmet Bey geldi. Örn. bu bir örnek. Otobüs boştu."
+        self.assertEqual(split_sentences(text, 'tr'),
+                         ["Prof. Dr. Ahmet Bey geldi.", "Örn. bu bir örnek.", "Otobüs boştu."])
+
+    def test_quotes_dialogs_and_lowercase(self):
+        text = 'He said "Stop!" Then he left... and came back. — Are you ok? — Yes.'
+        self.assertEqual(split_sentences(text, 'en'),
+                         ['He said "Stop!"', 'Then he left... and came back.', '— Are you ok?', '— Yes.'])
+
+    def test_spans_point_to_text(self):
+        text = "  Первое предложение.  Второе,\nна двух строках!   "
+        spans = sentence_spans(text, 'ru')
+        self.assertEqual([text[s:e] for s, e in spans], ["Первое предложение.", "Второе,\nна двух строках!"])
+
+    @unittest.skipUnless(importlib.util.find_spec("stanza"), "stanza is not installed")
+    def test_agreement_with_stanza(self):
+        from src.text_processing.nlp import split_sentences_with_stanza
+        with open(TURKISH_TEXT_PATH, "r", encoding="utf-8") as f:
+            text = f.read()
+        agreement = boundaries_agreement(split_sentences(text, 'tr'), split_sentences_with_stanza(text, 'tr'))
+        print(f"Agreement with Stanza on sentence boundaries: {agreement:.2%}")
+        self.assertGreaterEqual(agreement, 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
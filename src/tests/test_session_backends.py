@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from src import config as cfg
+from src.api.session_backends import (COMPRESSION_SUFFIXES, FileSessionStore, SQLiteSessionStore,
+                                      write_session_file, read_session_file)
+from src.api.session_store import SessionStoreManager
+from src.data_classes.bilingual_text import BilingualText
+
+
+class TestSessionFiles(TestCase):
+
+    def test_files_are_read_with_any_compression(self):
+        data = '{"paragraphs": [], "source_language": "tr-TR"}'.encode('utf-8') * 20
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for compression in COMPRESSION_SUFFIXES:
+                path = os.path.join(tmp_dir, compression, "bilingual_text.json")
+                os.makedirs(os.path.dirname(path))
+                with mock.patch('src.config.SESSION_STORE_COMPRESSION', compression):
+                    written = write_session_file(path, data)
+                # the configured compression does not matter for reading
+                self.assertEqual(read_session_file(path), data)
+                if compression != 'none':
+                    self.assertLess(os.path.getsize(written), len(data))
+            with self.assertRaises(FileNotFoundError):
+                read_session_file(os.path.join(tmp_dir, "lemmas_index.json"))
+
+    def test_files_are_replaced_whole(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bilingual_text.json")
+            write_session_file(path, b'{"old": true}')
+            with mock.patch('os.replace', side_effect=OSError("disk full")), self.assertRaises(OSError):
+                write_session_file(path, b'{"new": true}')
+            self.assertEqual(read_session_file(path), b'{"old": true}')  # not truncated by the failed write
+            write_session_file(path, b'{"new": true}')
+            self.assertEqual(read_session_file(path), b'{"new": true}')
+
+
+class _SessionStoreTests:
+    """The same behaviour of every backend"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = self.make_store(self.tmp_dir.name)
+        self.bt = BilingualText.from_json_file(cfg.TEST_DATA_PATH)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_texts_and_lemmas(self):
+        bt_hash = self.store.save_text(self.bt, user_name="test")
+        self.assertEqual(bt_hash, hash(self.bt))
+        self.assertEqual(BilingualText.model_validate_json(self.store.read_text(bt_hash)), self.bt)
+        with self.assertRaises(FileNotFoundError):
+            self.store.read_lemmas(bt_hash)
+        self.store.save_lemmas(bt_hash, b'{"lemmas": []}')
+        self.assertEqual(self.store.read_lemmas(bt_hash), b'{"lemmas": []}')
+        with self.assertRaises(FileNotFoundError):
+            self.store.read_text(bt_hash + 1)
+
+    def test_artifacts_are_removed_with_the_text(self):
+        bt_hash = self.store.save_text(self.bt)
+        with open(os.path.join(self.store.artifacts_dir(bt_hash), "audio.mp3"), "wb") as f:
+            f.write(b"x" * 10)
+        self.store.add_artifact(bt_hash, "audio.mp3")
+        info = self.store.info(bt_hash)
+        self.assertEqual(info.artifacts, ["audio.mp3"])
+        self.assertIn(bt_hash, self.store.usage())
+        self.assertEqual(self.store.remove_artifacts(bt_hash), 10)
+        self.assertEqual(self.store.info(bt_hash).artifacts, [])
+        self.assertTrue(self.store.touch(bt_hash))
+        self.store.remove(bt_hash)
+        self.assertFalse(self.store.touch(bt_hash))
+        self.assertNotIn(bt_hash, self.store.usage())
+        with self.assertRaises(FileNotFoundError):
+            self.store.read_text(bt_hash)
+
+    def test_metadata_by_user(self):
+        first = self.store.save_text(self.bt, user_name="test")
+        second = self.store.save_text(self.bt.model_copy(update={"target_language": "ru-RU"}), user_name="test")
+        self.store.save_text(self.bt.model_copy(update={"target_language": "de-DE"}), user_name="other")
+        self.store.save_text(self.bt, user_name="other")  # saved again by another user, the owner stays
+        infos = self.store.texts_of_user("test")
+        self.assertEqual([info.bilingual_text_hash for info in infos], [second, first])
+        self.assertEqual((infos[0].user_name, infos[0].source_language, infos[0].target_language),
+                         ("test", self.bt.source_language, "ru-RU"))
+        self.assertGreater(infos[0].bytes, 0)
+        self.assertEqual(self.store.info(first).user_name, "test")
+        self.assertEqual(self.store.texts_of_user("nobody"), [])
+
+    def test_manager_collects_expired_texts(self):
+        bt_hash = self.store.save_text(self.bt)
+        manager = SessionStoreManager(self.store, ttl_seconds=3600, max_bytes=10 ** 6, interval_seconds=60)
+        self.assertEqual(manager.collect()["texts"], 0)
+        manager.ttl_seconds = -1
+        self.assertEqual(manager.collect()["texts"], 1)
+        self.assertFalse(self.store.touch(bt_hash))
+
+
+class TestFileSessionStore(_SessionStoreTests, TestCase):
+
+    def make_store(self, directory):
+        return FileSessionStore(directory)
+
+class TestSQLiteSessionStore(_SessionStoreTests, TestCase):
+
+    def make_store(self, directory):
+        return SQLiteSessionStore(os.path.join(directory, "session_store.sqlite3"), directory)
+
+    def test_lemmas_of_missing_text(self):
+        first = self.store.save_text(self.bt, user_name="test")
+        second = self.store.save_text(self.bt.model_copy(update={"target_language": "ru-RU"}), user_name="test")
+        with self.assertRaises(FileNotFoundError):
+            self.store.save_lemmas(first + second, b'{}')
+
+    def test_concurrent_connections(self):
+        path = os.path.join(self.tmp_dir.name, "session_store.sqlite3")
+        texts = [self.bt.model_copy(update={"target_language": f"l{i}"}) for i in range(20)]
+        errors = []
+
+        def save(bt):
+            try:  # a store per thread, like a worker process
+                store = SQLiteSessionStore(path, self.tmp_dir.name)
+                store.read_text(store.save_text(bt, user_name="test"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save, args=(bt,)) for bt in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.store.texts_of_user("test")), 20)
+        with sqlite3.connect(path) as connection:
+            self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
@@ -0,0 +1,49 @@
+from unittest import TestCase, mock
+
+from src.api.session_cache import SessionObjectCache
+
+
+class TestSessionObjectCache(TestCase):
+
+    def setUp(self):
+        self.cache = SessionObjectCache('test', max_items=2, max_bytes=100, ttl_seconds=60)
+
+    def test_hits_and_misses(self):
+        self.assertIsNone(self.cache.get(1))
+        value = object()
+        self.cache.put(1, value, 10)
+        self.assertIs(self.cache.get(1), value)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+
+    def test_least_recently_used_are_evicted(self):
+        self.cache.put(1, 'one', 10)
+        self.cache.put(2, 'two', 10)
+        self.cache.get(1)
+        self.cache.put(3, 'three', 10)
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual(self.cache.get(1), 'one')
+        self.assertEqual(self.cache.get(3), 'three')
+        # by size as well
+        self.cache.put(4, 'four', 95)
+        self.assertEqual((self.cache.stats()["items"], self.cache.stats()["bytes"]), (1, 95))
+        self.cache.put(5, 'too large', 101)
+        self.assertIsNone(self.cache.get(5))
+        self.assertEqual(self.cache.get(4), 'four')
+
+    def test_entries_expire(self):
+        with mock.patch('src.api.session_cache.time.monotonic', return_value=1000.0):
+            self.cache.put(1, 'one', 10)
+        with mock.patch('src.api.session_cache.time.monotonic', return_value=1059.0):
+            self.assertEqual(self.cache.get(1), 'one')
+        with mock.patch('src.api.session_cache.time.monotonic', return_value=1060.0):
+            self.assertIsNone(self.cache.get(1))
+        stats = self.cache.stats()
+        self.assertEqual((stats["expirations"], stats["items"], stats["bytes"]), (1, 0, 0))
+
+    def test_discard(self):
+        self.cache.put(1, 'one', 10)
+        self.cache.discard(1)
+        self.cache.discard(2)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.stats()["bytes"], 0)
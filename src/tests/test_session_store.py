@@ -0,0 +1,69 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from src.api.session_backends import FileSessionStore
+from src.api.session_store import SessionStoreManager
+
+
+class TestSessionStoreManager(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manager = SessionStoreManager(FileSessionStore(self.tmp_dir.name), ttl_seconds=3600, max_bytes=1000,
+                                           interval_seconds=60)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _store(self, bt_hash: int, seconds_ago: float, text_bytes: int = 100, audio_bytes: int = 0) -> str:
+        path = os.path.join(self.tmp_dir.name, str(bt_hash))
+        os.makedirs(path)
+        with open(os.path.join(path, "bilingual_text.json"), "wb") as f:
+            f.write(b"x" * text_bytes)
+        if audio_bytes:
+            with open(os.path.join(path, f"audio_{bt_hash}_mp3.mp3"), "wb") as f:
+                f.write(b"x" * audio_bytes)
+        accessed = time.time() - seconds_ago
+        os.utime(path, (accessed, accessed))
+        return path
+
+    def test_expired_texts_are_removed(self):
+        expired = self._store(1, seconds_ago=7200)
+        recent = self._store(2, seconds_ago=60)
+        os.makedirs(os.path.join(self.tmp_dir.name, ".locks"))
+        self.assertEqual(self.manager.collect(), {"texts": 1, "files": 0, "bytes": 100})
+        self.assertFalse(os.path.exists(expired))
+        self.assertTrue(os.path.exists(recent))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, ".locks")))
+
+    def test_touch_renews_last_access(self):
+        path = self._store(1, seconds_ago=7200)
+        self.assertTrue(self.manager.store.touch(1))
+        self.assertFalse(self.manager.store.touch(2))
+        self.manager.collect()
+        self.assertTrue(os.path.exists(path))
+
+    def test_quota_removes_audio_before_texts(self):
+        oldest = self._store(1, seconds_ago=300, audio_bytes=400)
+        newest = self._store(2, seconds_ago=60, audio_bytes=400)
+        # 1000 bytes, just at the quota
+        self.assertEqual(self.manager.collect()["bytes"], 0)
+        self._store(3, seconds_ago=120)
+        removed = self.manager.collect()
+        # audio of the least recently accessed text is enough to get to 90% of the quota
+        self.assertEqual(removed, {"texts": 0, "files": 1, "bytes": 400})
+        self.assertEqual(os.listdir(oldest), ["bilingual_text.json"])
+        self.assertEqual(len(os.listdir(newest)), 2)
+        # removing the audio did not renew the access of the text
+        self.assertEqual(self.manager._scan()[0].hash, 1)
+
+    def test_quota_removes_least_recently_accessed_texts(self):
+        self.manager.max_bytes = 200
+        for bt_hash, seconds_ago in ((1, 300), (2, 60), (3, 120)):
+            self._store(bt_hash, seconds_ago=seconds_ago)
+        self.assertEqual(self.manager.collect(), {"texts": 2, "files": 0, "bytes": 200})
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["2"])
+        stats = self.manager.stats()
+        self.assertEqual((stats["texts"], stats["bytes"], stats["removed_texts"]), (1, 100, 2))
@@ -0,0 +1,96 @@
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import TestCase, skipIf
+
+from src.text_processing.single_flight import SingleFlight, fcntl
+
+
+class TestSingleFlight(TestCase):
+
+    def test_concurrent_calls_are_coalesced(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return value
+
+        async def main():
+            return await asyncio.gather(flights.do('a', lambda: work(1)), flights.do('a', lambda: work(2)),
+                                        flights.do('b', lambda: work(3)))
+
+        self.assertEqual(asyncio.run(main()), [1, 1, 3])
+        self.assertEqual(calls, [1, 3])
+        self.assertEqual(flights.stats(), {"calls": 2, "shared": 1, "in_flight": 0})
+
+    def test_errors_are_shared_and_not_cached(self):
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("quota exceeded")
+
+        async def main():
+            results = await asyncio.gather(flights.do('a', fail), flights.do('a', fail), return_exceptions=True)
+            again = await flights.do('a', lambda: asyncio.sleep(0, result='ok'))
+            return results, again
+
+        results, again = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(again, 'ok')
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        flights = SingleFlight()
+
+        async def main():
+            first = asyncio.ensure_future(flights.do('a', lambda: asyncio.sleep(0.05, result='done')))
+            second = asyncio.ensure_future(flights.do('a', lambda: asyncio.sleep(0.05, result='other')))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(main()), 'done')
+
+    def test_file_lock(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            flights = SingleFlight(lock_dir=lock_dir)
+            self.assertEqual(asyncio.run(flights.do('a', lambda: asyncio.sleep(0, result=1))), 1)
+
+    @skipIf(fcntl is None, "no file locks")
+    def test_file_lock_held_by_another_process(self):
+        holder_code = ("import fcntl, sys, time\n"
+                       "f = open(sys.argv[1], 'w')\n"
+                       "fcntl.flock(f.fileno(), fcntl.LOCK_EX)\n"
+                       "print('locked', flush=True)\n"
+                       "time.sleep(0.5)\n")
+        with tempfile.TemporaryDirectory() as lock_dir:
+            flights = SingleFlight(lock_dir=lock_dir)
+            holder = subprocess.Popen([sys.executable, "-c", holder_code, flights._lock_path('a')],
+                                      stdout=subprocess.PIPE, text=True)
+            try:
+                self.assertEqual(holder.stdout.readline().strip(), 'locked')
+                ticks = []
+
+                async def tick():
+                    while True:
+                        ticks.append(time.monotonic())
+                        await asyncio.sleep(0.01)
+
+                async def main():
+                    ticker = asyncio.ensure_future(tick())
+                    started = time.monotonic()
+                    result = await flights.do('a', lambda: asyncio.sleep(0, result=1))
+                    ticker.cancel()
+                    return result, time.monotonic() - started
+
+                result, waited = asyncio.run(main())
+            finally:
+                holder.wait(timeout=10)
+                holder.stdout.close()
+        self.assertEqual(result, 1)
+        self.assertGreater(waited, 0.2)  # until the other process released the lock
+        self.assertGreater(len(ticks), 10)  # the event loop was not blocked meanwhile
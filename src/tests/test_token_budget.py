@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from src.auth.usage_tracker import UsageEntry
+from src.text_processing.token_budget import TokenEstimator, TokenModel, plan_batches
+
+
+class TestTokenEstimator(TestCase):
+
+    def test_calibrated_per_language_pair(self):
+        entries = [UsageEntry(text_length=n, input_tokens=1000 + n // 4, output_tokens=50 + 2 * n,
+                              source_language='tr', target_language='Russian') for n in range(1000, 6000, 1000)]
+        entries.append(UsageEntry(text_length=1000, input_tokens=1300, output_tokens=900,
+                                  source_language='en', target_language='Russian'))
+        estimator = TokenEstimator(min_samples=5)
+        estimator.calibrate(entries)
+        model = estimator.model('tr', 'Russian')
+        self.assertEqual(model.samples, 5)
+        self.assertAlmostEqual(model.input_overhead, 1000, delta=1)
+        self.assertAlmostEqual(model.output_per_char, 2, places=3)
+        self.assertEqual(model.output_tokens(3000), 6050)
+        # not enough samples for the pair, the model fitted on all calls is used
+        self.assertEqual(estimator.model('en', 'Russian').samples, 6)
+
+    def test_defaults_without_history(self):
+        estimator = TokenEstimator()
+        estimator.calibrate([])
+        self.assertEqual(estimator.model('tr', 'Russian'), TokenModel())
+
+
+class TestPlanBatches(TestCase):
+
+    def test_batches_fit_budgets(self):
+        model = TokenModel(input_overhead=1000, input_per_char=0.3, output_overhead=100, output_per_char=1.2)
+        paragraphs = [f"{i:02d}" + "x" * 998 for i in range(30)]
+        batches = plan_batches(paragraphs, model, max_input_tokens=30000, max_output_tokens=6000,
+                               concurrency=2, min_batch_output_tokens=1500)
+        self.assertEqual([p for batch in batches for p in batch], paragraphs)
+        for batch in batches:
+            self.assertLessEqual(model.output_tokens(len("\n\n".join(batch))), 6000)
+        self.assertEqual(len(batches), 8)  # 4 paragraphs of 1000 characters fit into 5900 output tokens
+
+    def test_short_text_uses_concurrency_but_not_tiny_calls(self):
+        model = TokenModel(input_overhead=1000, input_per_char=0.3, output_overhead=100, output_per_char=1.2)
+        paragraphs = ["x" * 1000] * 4  # 4800 output tokens
+        self.assertGreaterEqual(len(plan_batches(paragraphs, model, concurrency=4, min_batch_output_tokens=1500)), 3)
+        self.assertEqual(len(plan_batches(paragraphs, model, concurrency=4, min_batch_output_tokens=5000)), 1)
@@ -0,0 +1,220 @@
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+from langchain_core.messages import AIMessageChunk
+
+from src import config as cfg
+from src.auth.usage_tracker import UsageTracker
+from src.data_classes.bilingual_text import (BilingualText, BilingualParagraph, BiLingualSyntagma, Questions,
+                                             QuestionSet)
+from src.text_processing.compact_format import to_compact
+from src.text_processing.nlp_pool import NLPWorkerPool
+from src.text_processing.result_cache import ResultCache
+
+with mock.patch("src.config.LLM_BACKEND", "fake"):  # no API key needed on import, the model is replaced in the tests
+    from src.text_processing import llm_communicator
+
+
+class FakeStructuredLLM:
+    """Translates each paragraph of the message into upper case, remembers what was sent."""
+
+    def __init__(self):
+        self.calls = []
+        self.question_calls = []
+        self.events = []
+        self.delay = 0
+
+    def with_structured_output(self, schema, **kwargs):
+        return self if schema is BilingualText else SimpleNamespace(ainvoke=self.ask_questions)
+
+    async def ask_questions(self, messages):
+        """A question per paragraph, more than asked for."""
+        text = messages[-1].content
+        self.question_calls.append(text)
+        self.events.append("questions")
+        questions = [Questions(question=f"{p}?", answer=p) for p in text.split("\n\n")] * 3
+        return {"raw": SimpleNamespace(usage_metadata={"input_tokens": 5, "output_tokens": 5}),
+                "parsed": QuestionSet(questions=questions)}
+
+    async def ainvoke(self, messages):
+        text = messages[-1].content
+        self.calls.append(text)
+        self.events.append("translation started")
+        await asyncio.sleep(self.delay)
+        self.events.append("translation done")
+        paragraphs = [BilingualParagraph(Sintagmas=[BiLingualSyntagma(source_text=p, target_text=p.upper())])
+                      for p in text.split("\n\n")]
+        bt = BilingualText(paragraphs=paragraphs, source_language="tr-TR", target_language="en-US")
+        return {"raw": SimpleNamespace(usage_metadata={"input_tokens": 10 * len(paragraphs),
+                                                       "output_tokens": 20 * len(paragraphs)}),
+                "parsed": bt}
+
+    async def astream(self, messages):
+        """The same translation in compact format, in chunks cutting lines, usage comes with the last chunk."""
+        ret = await self.ainvoke(messages)
+        output = to_compact(ret["parsed"])
+        for i in range(0, len(output), 10):
+            yield AIMessageChunk(content=output[i:i + 10])
+        yield AIMessageChunk(content="", usage_metadata={**ret["raw"].usage_metadata, "total_tokens": 0})
+
+
+class TestTranslationCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        usage_path = os.path.join(self.tmp_dir.name, "usage.json")
+        with mock.patch("src.config.USAGE_DATA_PATH", usage_path):
+            self.tracker = UsageTracker()
+        self.llm = FakeStructuredLLM()
+        self.patchers = [
+            mock.patch.object(llm_communicator, "llm", self.llm),
+            mock.patch.object(llm_communicator, "usage_tracker", self.tracker),
+            mock.patch.object(llm_communicator, "nlp_pool", NLPWorkerPool(workers=0)),
+            mock.patch.object(llm_communicator, "translation_cache",
+                              ResultCache("test", self.tmp_dir.name, max_memory_bytes=10_000, max_disk_bytes=100_000)),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def translate(self, text):
+        return llm_communicator.create_bilingual_text(text, "English", number_of_questions=0,
+                                                      user_name="user", source_language="tr")
+
+    def test_only_misses_are_sent(self):
+        first = self.translate("Otobüs boştu.\n\nKenan Bey arkaya oturdu.")
+        self.assertEqual(len(self.llm.calls), 1)
+        # the same text with different whitespace and one new paragraph
+        second = self.translate("Otobüs  boştu.\n\nYeni paragraf.\n\nKenan Bey\narkaya oturdu.")
+        self.assertEqual(self.llm.calls[-1], "Yeni paragraf.")
+        self.assertEqual([p.Sintagmas[0].target_text for p in second.paragraphs],
+                         ["OTOBÜS BOŞTU.", "YENI PARAGRAF.", "KENAN BEY ARKAYA OTURDU."])
+        self.assertEqual(second.source_language, first.source_language)
+
+        stats = self.tracker.get_usage_stats("user")
+        self.assertEqual(stats["cache_hits"], 2)
+        self.assertEqual(stats["cache_misses"], 3)
+        self.assertEqual(stats["saved_input_tokens"], 20)
+        self.assertEqual(stats["saved_output_tokens"], 40)
+
+    def test_full_hit_makes_no_call(self):
+        text = "Otobüs boştu.\n\nKenan Bey arkaya oturdu."
+        first = self.translate(text)
+        self.assertEqual(self.translate(text), first)
+        self.assertEqual(len(self.llm.calls), 1)
+
+    def test_text_without_language_is_translated(self):
+        text = "12345 !!! 2024-10-17\n\n😀 😀"
+        bt = llm_communicator.create_bilingual_text(text, "English", number_of_questions=0)  # language not given
+        self.assertEqual([p.Sintagmas[0].target_text for p in bt.paragraphs], ["12345 !!! 2024-10-17", "😀 😀"])
+        # cached under the same (neutral) key
+        self.assertEqual(llm_communicator.create_bilingual_text(text, "English", number_of_questions=0), bt)
+        self.assertEqual(len(self.llm.calls), 1)
+
+    def test_key_depends_on_target_language(self):
+        self.translate("Otobüs boştu.")
+        llm_communicator.create_bilingual_text("Otobüs boştu.", "Russian", number_of_questions=0, source_language="tr")
+        self.assertEqual(len(self.llm.calls), 2)
+
+    def test_compact_output_format(self):
+        text = "Otobüs boştu.\n\nKenan Bey arkaya oturdu."
+        structured = self.translate(text)
+        with mock.patch.object(cfg, "LLM_OUTPUT_FORMAT", "compact"):
+            compact = self.translate(text)
+        # prompt of the other format, translations are cached separately
+        self.assertEqual(len(self.llm.calls), 2)
+        self.assertEqual(compact, structured)
+        self.assertEqual(self.tracker.get_usage_stats("user")["total_output_tokens"], 80)
+
+    def test_questions_are_generated_by_own_concurrent_call(self):
+        self.llm.delay = 0.05
+        text = "Otobüs boştu.\n\nKenan Bey arkaya oturdu."
+        bt = llm_communicator.create_bilingual_text(text, "English", number_of_questions=2,
+                                                    user_name="user", source_language="tr")
+        self.assertEqual(self.llm.question_calls, [text])
+        self.assertEqual([q.question for q in bt.questions], ["Otobüs boştu.?", "Kenan Bey arkaya oturdu.?"])
+        self.assertLess(self.llm.events.index("questions"), self.llm.events.index("translation done"))
+        # token estimates of translations are not fitted on questions
+        self.assertEqual(sorted(entry.kind for entry in self.tracker.get_history()), ["questions", "translation"])
+
+        # cached, as well as the translation
+        self.assertEqual(llm_communicator.create_bilingual_text(text, "English", number_of_questions=2,
+                                                                user_name="user", source_language="tr"), bt)
+        self.assertEqual(len(self.llm.question_calls), 1)
+        self.assertEqual(len(self.llm.calls), 1)
+
+    def test_no_questions(self):
+        bt = self.translate("Otobüs boştu.")
+        self.assertIsNone(bt.questions)
+        self.assertEqual(self.llm.question_calls, [])
+
+    def test_batches_are_translated_concurrently(self):
+        paragraphs = [f"Paragraf {i}." + " kelime" * 300 for i in range(8)]
+        in_flight, max_in_flight = 0, 0
+        ainvoke = self.llm.ainvoke
+
+        async def slow_ainvoke(messages):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return await ainvoke(messages)
+
+        self.llm.ainvoke = slow_ainvoke
+        bt = self.translate("\n\n".join(paragraphs))
+        self.assertEqual([p.Sintagmas[0].source_text for p in bt.paragraphs], paragraphs)
+        self.assertGreater(len(self.llm.calls), 1)
+        self.assertGreater(max_in_flight, 1)
+        self.assertLessEqual(max_in_flight, cfg.LLM_MAX_CONCURRENCY)
+
+    def test_stream_yields_first_paragraphs_before_last_batch(self):
+        paragraphs = [f"Paragraf {i}." + " kelime" * 300 for i in range(8)]
+        ainvoke = self.llm.ainvoke
+        done = []
+
+        async def ainvoke_slow_last(messages):
+            await asyncio.sleep(0.2 if paragraphs[-1] in messages[-1].content else 0)
+            done.append(messages[-1].content)
+            return await ainvoke(messages)
+
+        self.llm.ainvoke = ainvoke_slow_last
+
+        async def consume():
+            items = []
+            async for item in llm_communicator.stream_bilingual_text("\n\n".join(paragraphs), "English",
+                                                                     number_of_questions=0, source_language="tr"):
+                items.append((item, len(done)))
+            return items
+
+        items = asyncio.run(consume())
+        first, done_before_first = items[0]
+        self.assertIsInstance(first, BilingualParagraph)
+        self.assertLess(done_before_first, len(self.llm.calls))
+        bt = items[-1][0]
+        self.assertIsInstance(bt, BilingualText)
+        self.assertEqual([item for item, _ in items[:-1]], bt.paragraphs)
+
+    def test_identical_requests_in_flight_are_coalesced(self):
+        ainvoke = self.llm.ainvoke
+
+        async def slow_ainvoke(messages):
+            await asyncio.sleep(0.05)
+            return await ainvoke(messages)
+
+        self.llm.ainvoke = slow_ainvoke
+
+        async def main():
+            return await asyncio.gather(*(llm_communicator.create_bilingual_text_async(
+                "Otobüs boştu.", "English", number_of_questions=0, source_language="tr") for _ in range(2)))
+
+        first, second = asyncio.run(main())
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.llm.calls), 1)
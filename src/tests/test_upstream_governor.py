@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from src.text_processing.upstream_governor import (TokenRateLimiter, UpstreamBusyError, UpstreamGovernor,
+                                                   UpstreamThrottledError, is_throttled)
+
+
+class TestTokenRateLimiter(TestCase):
+
+    def test_waits_for_tokens(self):
+        limiter = TokenRateLimiter(tokens_per_minute=6000)  # 100 tokens per second
+
+        async def main():
+            await limiter.acquire(6000)
+            started = time.monotonic()
+            await limiter.acquire(10)
+            return time.monotonic() - started
+
+        self.assertGreaterEqual(asyncio.run(main()), 0.09)
+
+    def test_settle_returns_overestimate(self):
+        limiter = TokenRateLimiter(tokens_per_minute=6000)
+
+        async def main():
+            await limiter.acquire(6000)
+            limiter.settle(estimated=6000, actual=1000)
+            started = time.monotonic()
+            await limiter.acquire(5000)
+            return time.monotonic() - started
+
+        self.assertLess(asyncio.run(main()), 0.05)
+
+    def test_reserve_beyond_max_wait_takes_nothing(self):
+        limiter = TokenRateLimiter(tokens_per_minute=6000)
+        limiter.reserve(6000)
+        self.assertIsNone(limiter.reserve(3000, max_wait=1))
+        self.assertLess(limiter.reserve(10, max_wait=1), 0.2)
+
+
+class TestUpstreamGovernor(TestCase):
+
+    @staticmethod
+    def governor(**kwargs) -> UpstreamGovernor:
+        params = dict(name="test", max_concurrency=4, tokens_per_minute=10 ** 6, queue_timeout=1,
+                      retries=2, backoff_base=0.01, backoff_max=0.02)
+        params.update(kwargs)
+        return UpstreamGovernor(**params)
+
+    def test_limits_concurrency(self):
+        governor = self.governor(max_concurrency=2)
+        running, peak = 0, 0
+
+        async def call():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            return running
+
+        async def main():
+            return await asyncio.gather(*[governor.call(call) for _ in range(6)])
+
+        self.assertEqual(len(asyncio.run(main())), 6)
+        self.assertEqual(peak, 2)
+        self.assertEqual(governor.stats()["in_flight"], 0)
+
+    def test_throttling_halves_limit_and_success_grows_it(self):
+        governor = self.governor(max_concurrency=8)
+        attempts = 0
+
+        async def throttled_once():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise UpstreamThrottledError("429 Too Many Requests")
+            return "ok"
+
+        self.assertEqual(asyncio.run(governor.call(throttled_once)), "ok")
+        self.assertEqual(attempts, 2)  # retried
+        stats = governor.stats()
+        self.assertEqual(stats["throttled"], 1)
+        self.assertEqual(stats["concurrency_limit"], 4)
+
+        async def ok():
+            return None
+
+        async def main():
+            for _ in range(20):
+                await governor.call(ok)
+
+        asyncio.run(main())
+        self.assertGreater(governor.stats()["concurrency_limit"], 4)
+
+    def test_raises_last_error_after_retries(self):
+        governor = self.governor(retries=1)
+        attempts = 0
+
+        async def failing():
+            nonlocal attempts
+            attempts += 1
+            raise ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(governor.call(failing))
+        self.assertEqual(attempts, 2)
+        # not a throttling signal, the limit stays
+        self.assertEqual(governor.stats()["concurrency_limit"], 4)
+
+    def test_queue_deadline(self):
+        governor = self.governor(max_concurrency=1, queue_timeout=0.05)
+
+        async def slow():
+            await asyncio.sleep(0.3)
+
+        async def main():
+            return await asyncio.gather(governor.call(slow), governor.call(slow), return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], UpstreamBusyError)
+        self.assertEqual(governor.stats()["queue_depth"], 0)
+        self.assertEqual(governor.stats()["rejected"], 1)
+
+    def test_sync_calls_from_threads(self):
+        governor = self.governor(max_concurrency=2)
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def call():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+        threads = [threading.Thread(target=governor.call_sync, args=(call,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak, 2)
+        self.assertEqual(governor.stats()["calls"], 6)
+
+    def test_is_throttled(self):
+        self.assertTrue(is_throttled(asyncio.TimeoutError()))
+        self.assertTrue(is_throttled(RuntimeError("429 Resource has been exhausted (e.g. check quota).")))
+        self.assertFalse(is_throttled(ValueError("Invalid argument")))
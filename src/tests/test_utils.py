@@ -1,6 +1,6 @@
 
 import unittest
-from src.text_processing.nlp import split_to_paragraphs
+from src.text_processing.nlp import split_to_paragraphs, paragraph_spans, group_paragraphs
 
 
 class TestSplitToParagraphs(unittest.TestCase):
@@ -104,6 +104,32 @@ class TestSplitToParagraphs(unittest.TestCase):
         result = split_to_paragraphs(text, max_length=10)
         self.assertEqual(result, ["This is a sentence without punctuation", "Another one"])
 
+    def test_paragraph_spans(self):
+        text = "  Para1.   \n\n\n   Para2 line one.\nline two.  "
+        spans = paragraph_spans(text)
+        self.assertEqual([text[start:end] for start, end in spans], ["Para1.", "Para2 line one.\nline two."])
+
+
+class TestGroupParagraphs(unittest.TestCase):
+
+    def test_short_text_is_one_batch(self):
+        self.assertEqual(group_paragraphs(["a" * 10, "b" * 10], max_length=100), [["a" * 10, "b" * 10]])
+        self.assertEqual(group_paragraphs([], max_length=100), [])
+
+    def test_batches_are_balanced_and_ordered(self):
+        paragraphs = [f"{i:02d}" + "x" * 98 for i in range(20)]
+        batches = group_paragraphs(paragraphs, max_length=450)
+        self.assertEqual([p for batch in batches for p in batch], paragraphs)
+        self.assertEqual(len(batches), 5)
+        for batch in batches:
+            self.assertLessEqual(len("\n\n".join(batch)), 450)
+            self.assertEqual(len(batch), 4)
+
+    def test_long_paragraph_is_own_batch(self):
+        batches = group_paragraphs(["a" * 10, "b" * 500, "c" * 10], max_length=100)
+        self.assertEqual(batches, [["a" * 10], ["b" * 500], ["c" * 10]])
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,95 @@
+"""
+Compact line-oriented format of LLM output, an alternative to structured (JSON) output.
+JSON repeats "Sintagmas", "source_text" and "target_text" for every syntagma, which makes a large share
+of output tokens, and output tokens dominate latency and cost of a call. In compact format:
+
+    ## tr-TR || ru-RU
+    source of syntagma || its translation
+    ...
+    (empty line between paragraphs)
+    ## Q question || answer
+
+CompactParser is fed by chunks as the model streams them and builds BilingualText,
+paragraphs are available as soon as the empty line after them arrives.
+"""
+from typing import List, Optional
+
+from src.data_classes.bilingual_text import BilingualText, BilingualParagraph, BiLingualSyntagma, Questions
+
+SEPARATOR = ' || '
+META_PREFIX = '## '
+QUESTION_PREFIX = '## Q '
+
+
+class CompactFormatError(ValueError):
+    """Raised when the output has no syntagmas or no languages header."""
+
+
+class CompactParser:
+
+    def __init__(self):
+        self._buffer = ''
+        self._syntagmas: List[BiLingualSyntagma] = []
+        self.paragraphs: List[BilingualParagraph] = []
+        self.questions: List[Questions] = []
+        self.source_language: Optional[str] = None
+        self.target_language: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[BilingualParagraph]:
+        """Consumes a chunk of output, returns paragraphs completed by it."""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        completed = len(self.paragraphs)
+        for line in lines:
+            self._line(line)
+        return self.paragraphs[completed:]
+
+    def close(self) -> BilingualText:
+        """Consumes the rest of the output and returns the whole text."""
+        self._line(self._buffer)
+        self._buffer = ''
+        self._end_paragraph()
+        if not self.paragraphs or self.source_language is None:
+            raise CompactFormatError(f"Output has {len(self.paragraphs)} paragraphs, "
+                                     f"languages: {self.source_language}, {self.target_language}")
+        return BilingualText(paragraphs=self.paragraphs, source_language=self.source_language,
+                             target_language=self.target_language, questions=self.questions or None)
+
+    def _line(self, line: str):
+        line = line.strip()
+        if not line:
+            self._end_paragraph()
+        elif line.startswith('```'):  # the model may wrap the output in a code block anyway
+            return
+        elif line.startswith(QUESTION_PREFIX):
+            self._end_paragraph()
+            question, _, answer = line[len(QUESTION_PREFIX):].partition(SEPARATOR.strip())
+            self.questions.append(Questions(question=question.strip(), answer=answer.strip() or None))
+        elif line.startswith(META_PREFIX) and self.source_language is None:
+            source_language, _, target_language = line[len(META_PREFIX):].partition(SEPARATOR.strip())
+            self.source_language, self.target_language = source_language.strip(), target_language.strip()
+        else:
+            source_text, _, target_text = line.partition(SEPARATOR.strip())
+            self._syntagmas.append(BiLingualSyntagma(source_text=source_text.strip(),
+                                                     target_text=target_text.strip()))
+
+    def _end_paragraph(self):
+        if self._syntagmas:
+            self.paragraphs.append(BilingualParagraph(Sintagmas=self._syntagmas))
+            self._syntagmas = []
+
+
+def parse_compact(text: str) -> BilingualText:
+    parser = CompactParser()
+    parser.feed(text)
+    return parser.close()
+
+
+def to_compact(bt: BilingualText) -> str:
+    """BilingualText in compact format, parse_compact reads it back, up to whitespace around syntagmas."""
+    lines = [f"{META_PREFIX}{bt.source_language}{SEPARATOR}{bt.target_language}"]
+    for paragraph in bt.paragraphs:
+        lines.extend(f"{s.source_text}{SEPARATOR}{s.target_text or ''}".rstrip() for s in paragraph.Sintagmas)
+        lines.append('')
+    lines.extend(f"{QUESTION_PREFIX}{q.question}{SEPARATOR}{q.answer or ''}".rstrip() for q in bt.questions or [])
+    return '\n'.join(lines)
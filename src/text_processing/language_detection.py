@@ -0,0 +1,52 @@
+"""
+Language detection, done once per request and passed down to text processing functions.
+langdetect is probabilistic, so it is seeded to return the same result for the same text,
+and looks only at a bounded sample of the text.
+"""
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from langdetect import DetectorFactory, LangDetectException, detect
+
+from src import config as cfg
+
+DetectorFactory.seed = 0
+_lock = threading.Lock()  # langdetect loads its profiles on the first call, not thread-safe
+
+
+def language_sample(text: str, sample_length: int = cfg.LANG_DETECT_SAMPLE_LENGTH, windows: int = 4) -> str:
+    """Up to sample_length characters of text, taken from evenly spaced windows cut at whitespace."""
+    text = text.strip()
+    if len(text) <= sample_length:
+        return text
+    window = sample_length // windows
+    step = (len(text) - window) // (windows - 1)
+    parts = []
+    for i in range(windows):
+        start = i * step
+        if start:
+            space = text.find(' ', start, start + window)
+            start = space + 1 if space >= 0 else start
+        end = text.rfind(' ', start, start + window)
+        parts.append(text[start:end if end > start else start + window])
+    return ' '.join(parts)
+
+
+@lru_cache(maxsize=cfg.LANG_DETECT_CACHE_SIZE)
+def _detect_sample(sample: str) -> str:
+    with _lock:
+        return detect(sample)
+
+
+def detect_language(text: str) -> str:
+    """Primary language code (like 'tr', 'en', 'ru') of the text."""
+    return _detect_sample(language_sample(text)).split('-')[0]
+
+
+def detect_language_or_none(text: str) -> Optional[str]:
+    """detect_language, or None for text with nothing to tell the language by, like digits, punctuation or emoji."""
+    try:
+        return detect_language(text)
+    except LangDetectException:
+        return None
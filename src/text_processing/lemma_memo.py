@@ -0,0 +1,167 @@
+"""
+Persistent per-language memo of word form -> (lemma, UPOS), learned from Stanza outputs.
+The same word forms come up again and again across texts, so in fast mode lemmatize() tokenizes the text,
+resolves known forms from the memo and sends to the neural POS and lemma processors only sentences
+with unknown or ambiguous forms.
+A form is known when it was seen at least min_count times and one analysis makes at least min_share of them.
+Memo files are per stanza version, as models (and their outputs) change with it.
+A memo stops learning new analyses at max_rows, known ones still get counted. Words resolved from the memo
+and analysed by Stanza in fast mode are counted in the memo files too, so stats() covers all worker processes.
+"""
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Tuple
+
+from src import config as cfg
+from src.text_processing.result_cache import stanza_version
+
+Analysis = Tuple[str, str]  # lemma, upos
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    form TEXT NOT NULL,
+    lemma TEXT NOT NULL,
+    upos TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (form, lemma, upos)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    resolved_words INTEGER NOT NULL,
+    neural_words INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO coverage (id, resolved_words, neural_words) VALUES (0, 0, 0);
+"""
+_QUERY_CHUNK = 500  # sqlite limits the number of bound parameters
+
+
+class LemmaMemo:
+
+    def __init__(self, directory: str = cfg.LEMMA_MEMO_DIR,
+                 min_count: int = cfg.LEMMA_MEMO_MIN_COUNT,
+                 min_share: float = cfg.LEMMA_MEMO_MIN_SHARE,
+                 max_rows: int = cfg.LEMMA_MEMO_MAX_ROWS):
+        self.directory = directory
+        self.min_count = min_count
+        self.min_share = min_share
+        self.max_rows = max_rows
+        self._local = threading.local()  # sqlite connections are not shared between threads
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}  # estimated number of rows by language, exact when it gets to max_rows
+
+    def _path(self, lang: str) -> str:
+        return os.path.join(self.directory, f"{lang}-{stanza_version()}.sqlite")
+
+    def _connection(self, lang: str) -> sqlite3.Connection:
+        connections = self._local.__dict__.setdefault('connections', {})
+        connection = connections.get(lang)
+        if connection is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # several NLP worker processes share the same files
+            connection = sqlite3.connect(self._path(lang), timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            connections[lang] = connection
+        return connection
+
+    def lookup(self, lang: str, forms: Iterable[str]) -> Dict[str, Analysis]:
+        """
+        Analyses of known forms, forms not in the result are unknown or ambiguous.
+        If the memo cannot be read, all forms are unknown: the memo is an optimization, lemmatization does not
+        depend on it.
+        """
+        forms = list(set(forms))
+        counts: Dict[str, Dict[Analysis, int]] = {}
+        try:
+            connection = self._connection(lang)
+            for i in range(0, len(forms), _QUERY_CHUNK):
+                chunk = forms[i:i + _QUERY_CHUNK]
+                rows = connection.execute(
+                    f"SELECT form, lemma, upos, count FROM analyses WHERE form IN ({','.join('?' * len(chunk))})",
+                    chunk)
+                for form, lemma, upos, count in rows:
+                    counts.setdefault(form, {})[(lemma, upos)] = count
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to read lemma memo for '{lang}': {e}")
+            return {}
+        known = {}
+        for form, analyses in counts.items():
+            total = sum(analyses.values())
+            analysis, count = max(analyses.items(), key=lambda item: item[1])
+            if total >= self.min_count and count >= self.min_share * total:
+                known[form] = analysis
+        return known
+
+    def _full(self, lang: str, connection: sqlite3.Connection, new_rows: int) -> bool:
+        """Whether the memo of the language has max_rows, counting new_rows which may be added now."""
+        with self._lock:
+            rows = self._rows.get(lang)
+        if rows is None or rows + new_rows > self.max_rows:  # other processes add rows too, so it is counted again
+            rows = connection.execute("SELECT count(*) FROM analyses").fetchone()[0]
+        with self._lock:
+            self._rows[lang] = rows + new_rows
+        return rows >= self.max_rows
+
+    def observe(self, lang: str, words: Iterable[Tuple[str, str, str]]):
+        """Learns from (form, lemma, upos) of words analysed by Stanza, in one transaction."""
+        counts: Dict[Tuple[str, str, str], int] = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        if not counts:
+            return
+        connection = self._connection(lang)
+        if self._full(lang, connection, len(counts)):
+            statement = "UPDATE analyses SET count = count + ? WHERE form = ? AND lemma = ? AND upos = ?"
+            rows = [(count, form, lemma, upos) for (form, lemma, upos), count in counts.items()]
+        else:
+            statement = ("INSERT INTO analyses (form, lemma, upos, count) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (form, lemma, upos) DO UPDATE SET count = count + excluded.count")
+            rows = [(form, lemma, upos, count) for (form, lemma, upos), count in counts.items()]
+        with connection:
+            connection.executemany(statement, rows)
+
+    def count(self, lang: str, resolved_words: int, neural_words: int):
+        """Counts words of a fast lemmatization resolved from the memo and analysed by Stanza."""
+        try:
+            connection = self._connection(lang)
+            with connection:
+                connection.execute("UPDATE coverage SET resolved_words = resolved_words + ?, "
+                                   "neural_words = neural_words + ?", (resolved_words, neural_words))
+        except sqlite3.Error as e:  # only stats
+            logging.warning(f"Failed to count lemma memo coverage for '{lang}': {e}")
+
+    def close(self):
+        for connection in self._local.__dict__.get('connections', {}).values():
+            connection.close()
+        self._local.__dict__['connections'] = {}
+
+    def stats(self) -> dict:
+        """Coverage of fast lemmatizations by all processes sharing the directory, and memo sizes by language."""
+        resolved_words, neural_words, languages = 0, 0, {}
+        for path in sorted(glob.glob(os.path.join(self.directory, f"*-{stanza_version()}.sqlite"))):
+            lang = os.path.basename(path).split('-')[0]
+            try:
+                connection = self._connection(lang)
+                rows = connection.execute("SELECT count(*) FROM analyses").fetchone()[0]
+                resolved, neural = connection.execute("SELECT resolved_words, neural_words FROM coverage").fetchone()
+            except sqlite3.Error as e:
+                logging.warning(f"Failed to read lemma memo for '{lang}': {e}")
+                continue
+            resolved_words += resolved
+            neural_words += neural
+            languages[lang] = {"rows": rows, "resolved_words": resolved, "neural_words": neural}
+        total = resolved_words + neural_words
+        return {
+            "resolved_words": resolved_words,
+            "neural_words": neural_words,
+            "coverage": resolved_words / total if total else 0.0,
+            "max_rows": self.max_rows,
+            "languages": languages,
+        }
+
+
+lemma_memo = LemmaMemo()
@@ -0,0 +1,146 @@
+"""
+LLM backends: the chat model llm_communicator talks to, chosen by LLM_BACKEND.
+    gemini - Google Gemini (needs GOOGLE_API_KEY)
+    fake   - local deterministic stand-in, for load and regression testing without network
+FakeLLM implements the part of the langchain chat model interface llm_communicator uses
+(with_structured_output(...).ainvoke, ainvoke, astream). It "translates" by reversing words, so the output has
+the size of a real translation, and takes time and tokens proportional to it. Errors are injected at
+configured rates: throttling (429) and internal errors (500).
+"""
+import asyncio
+import json
+import math
+import random
+import re
+from typing import AsyncIterator, Type
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from pydantic import BaseModel
+
+from src import config as cfg
+from src.data_classes.bilingual_text import BilingualText, BilingualParagraph, BiLingualSyntagma, Questions, QuestionSet
+from src.text_processing.compact_format import to_compact
+from src.text_processing.language_detection import detect_language_or_none
+
+_TARGET_LANGUAGE = re.compile(r"translate to (.+?) \(target language\)")
+_NUMBER_OF_QUESTIONS = re.compile(r"write (\d+) questions")
+_SYNTAGMA_END = re.compile(r"(?<=[,;:.!?…])\s+")
+
+
+class FakeLLMError(RuntimeError):
+    """Injected error, its message looks like the one of the real client."""
+
+
+def create_llm(backend: str = None):
+    backend = backend or cfg.LLM_BACKEND
+    if backend == 'fake':
+        return FakeLLM()
+    if backend == 'gemini':
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=cfg.LLM_MODEL, temperature=0)
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+class FakeLLM:
+
+    def __init__(self,
+                 latency: float = cfg.FAKE_LLM_LATENCY_SECONDS,
+                 seconds_per_output_token: float = cfg.FAKE_LLM_SECONDS_PER_OUTPUT_TOKEN,
+                 chars_per_token: float = cfg.FAKE_LLM_CHARS_PER_TOKEN,
+                 error_rate: float = cfg.FAKE_LLM_ERROR_RATE,
+                 throttle_rate: float = cfg.FAKE_LLM_THROTTLE_RATE,
+                 seed: int = cfg.FAKE_LLM_SEED):
+        self.latency = latency
+        self.seconds_per_output_token = seconds_per_output_token
+        self.chars_per_token = chars_per_token
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)  # errors and jitter are the same for the same sequence of calls
+        self.calls = 0
+
+    def with_structured_output(self, schema: Type[BaseModel], include_raw: bool = False) -> "_FakeStructuredLLM":
+        return _FakeStructuredLLM(self, schema, include_raw)
+
+    async def ainvoke(self, messages) -> AIMessage:
+        """Plain text output, the translation in compact format."""
+        content = to_compact(self.respond(BilingualText, messages))
+        await self._wait(messages, content)
+        return AIMessage(content=content, usage_metadata=self._usage(messages, content))
+
+    async def astream(self, messages) -> AsyncIterator[AIMessageChunk]:
+        """The output of ainvoke in chunks of about 20 tokens, arriving at the generation speed."""
+        content = to_compact(self.respond(BilingualText, messages))
+        self._fail_or_throttle()
+        await asyncio.sleep(self._jitter(self.latency))
+        chunk_length = max(1, int(20 * self.chars_per_token))
+        for i in range(0, len(content), chunk_length):
+            chunk = content[i:i + chunk_length]
+            await asyncio.sleep(self._tokens(chunk) * self.seconds_per_output_token)
+            yield AIMessageChunk(content=chunk)
+        yield AIMessageChunk(content='', usage_metadata=self._usage(messages, content))
+
+    def respond(self, schema: Type[BaseModel], messages) -> BaseModel:
+        """Deterministic, structurally valid answer to the messages, of BilingualText or QuestionSet schema."""
+        system_prompt, text = messages[0].content, messages[-1].content
+        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+        if schema is QuestionSet:
+            match = _NUMBER_OF_QUESTIONS.search(system_prompt)
+            n = int(match.group(1)) if match else 2
+            sentences = [s for p in paragraphs for s in _SYNTAGMA_END.split(p)] or [text]
+            return QuestionSet(questions=[
+                Questions(question=f"{_reverse_words(sentences[i % len(sentences)])}?",
+                          answer=sentences[i % len(sentences)]) for i in range(n)])
+        if schema is BilingualText:
+            match = _TARGET_LANGUAGE.search(system_prompt)
+            return BilingualText(
+                paragraphs=[BilingualParagraph(Sintagmas=[
+                    BiLingualSyntagma(source_text=s, target_text=_reverse_words(s)) for s in _SYNTAGMA_END.split(p)])
+                    for p in paragraphs],
+                source_language=detect_language_or_none(text) or 'en',
+                target_language=match.group(1) if match else 'en')
+        raise ValueError(f"Fake LLM does not know how to answer with {schema.__name__}")
+
+    async def _wait(self, messages, content: str):
+        self._fail_or_throttle()
+        await asyncio.sleep(self._jitter(self.latency + self._tokens(content) * self.seconds_per_output_token))
+
+    def _fail_or_throttle(self):
+        self.calls += 1
+        r = self._random.random()
+        if r < self.throttle_rate:
+            raise FakeLLMError("429 Resource has been exhausted (e.g. check quota). [fake]")
+        if r < self.throttle_rate + self.error_rate:
+            raise FakeLLMError("500 An internal error has occurred. [fake]")
+
+    def _jitter(self, seconds: float) -> float:
+        return seconds * self._random.uniform(0.8, 1.2)
+
+    def _tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def _usage(self, messages, content: str) -> dict:
+        input_tokens = sum(self._tokens(m.content) for m in messages)
+        output_tokens = self._tokens(content)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+
+class _FakeStructuredLLM:
+
+    def __init__(self, llm: FakeLLM, schema: Type[BaseModel], include_raw: bool):
+        self.llm = llm
+        self.schema = schema
+        self.include_raw = include_raw
+
+    async def ainvoke(self, messages):
+        parsed = self.llm.respond(self.schema, messages)
+        content = json.dumps(parsed.model_dump(), ensure_ascii=False)  # the verbose output of structured mode
+        await self.llm._wait(messages, content)
+        if not self.include_raw:
+            return parsed
+        raw = AIMessage(content=content, usage_metadata=self.llm._usage(messages, content))
+        return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+
+def _reverse_words(text: str) -> str:
+    return ' '.join(word[::-1] for word in text.split())
@@ -1,52 +1,338 @@
+import asyncio
+import json
+import logging
+import time
+import unicodedata
+from functools import partial
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import AIMessageChunk, SystemMessage, HumanMessage
 
-from src.data_classes.bilingual_text import BilingualText
-from src.prompts.prompt_reader import read_prompt, PromptName
+from src.data_classes.bilingual_text import BilingualText, BilingualParagraph, Questions, QuestionSet
+from src.prompts.prompt_reader import read_prompt, prompt_version, PromptName
+from src.text_processing.compact_format import CompactParser, CompactFormatError
+from src.text_processing.llm_backends import create_llm
 from src.text_processing.nlp import split_to_paragraphs
-from src.auth.usage_tracker import usage_tracker
+from src.text_processing.nlp_pool import nlp_pool
+from src.text_processing.language_detection import detect_language_or_none
+from src.text_processing.result_cache import translation_cache
+from src.text_processing.single_flight import SingleFlight
+from src.text_processing.token_budget import TokenModel, plan_batches, token_estimator
+from src.text_processing.upstream_governor import gemini_governor
+from src.auth.usage_tracker import usage_tracker, UsageKind
 from src import config as cfg
 
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model=cfg.LLM_MODEL, temperature=0)
+llm = create_llm()
+translation_flights = SingleFlight(lock_dir=cfg.SINGLE_FLIGHT_LOCK_DIR if cfg.SINGLE_FLIGHT_CROSS_WORKER else None)
 
 
-# Invoke the model with a query asking for structured information
 def create_bilingual_text(source_text: str, target_language: str,
                           number_of_questions: int = 2,
-                          user_name: str = None) -> BilingualText:
-    structured_llm = llm.with_structured_output(BilingualText, include_raw=True)
-    system_prompt = read_prompt(PromptName.MAKE_BILINGUAL, target_language=target_language, 
-                                number_of_questions=number_of_questions)
-    
+                          user_name: str = None,
+                          source_language: str = None) -> BilingualText:
+    """Blocking version of create_bilingual_text_async, for scripts and tests running outside of an event loop."""
+    return asyncio.run(create_bilingual_text_async(source_text, target_language, number_of_questions,
+                                                   user_name=user_name, source_language=source_language))
+
+
+async def create_bilingual_text_async(source_text: str, target_language: str,
+                                      number_of_questions: int = 2,
+                                      user_name: str = None,
+                                      source_language: str = None) -> BilingualText:
+    """Whole BilingualText, see stream_bilingual_text."""
+    async for item in stream_bilingual_text(source_text, target_language, number_of_questions,
+                                            user_name=user_name, source_language=source_language):
+        pass
+    return item
+
+
+# Invoke the model with a query asking for structured information
+async def stream_bilingual_text(source_text: str, target_language: str,
+                                number_of_questions: int = 2,
+                                user_name: str = None,
+                                source_language: str = None) -> AsyncIterator[Union[BilingualParagraph, BilingualText]]:
+    """
+    Yields translated paragraphs in order as soon as they are ready, and the whole BilingualText at the end.
+    source_language is detected if not given, it is used for splitting of long paragraphs into sentences.
+    Text without a detectable language (like digits or emoji only) is translated with source_language None.
+    Translated paragraphs are cached, only paragraphs missing in the cache are sent to LLM,
+    grouped in batches planned by estimated tokens (see token_budget) that are translated concurrently.
+    Questions are generated by a call of their own (see generate_questions) running at the same time,
+    number_of_questions=0 skips them.
+    Waiting for LLM does not hold a thread, so one server process can have many translations in flight.
+    """
     # Process the source text for LLM input
-    processed_text = "\n\n".join(split_to_paragraphs(source_text, max_length=cfg.MAX_PARAGRAPH_LENGTH))
-    
+    source_language = source_language or detect_language_or_none(source_text)
+    # splitting of long paragraphs may need Stanza, so it is done in NLP pool
+    paragraphs = await nlp_pool.run_async(split_to_paragraphs, source_text, max_length=cfg.MAX_PARAGRAPH_LENGTH,
+                                          lang=source_language, use_stanza=cfg.SENTENCE_SPLIT_WITH_STANZA)
+    version = prompt_version(_bilingual_prompt())
+    model = await _token_model(source_language, target_language)
+    keys = [_cache_key(_normalize(p), source_language, target_language, version) for p in paragraphs]
+    # languages of the whole text, as LLM named them
+    header_key = _cache_key([_normalize(p) for p in paragraphs], source_language, target_language, version)
+
+    translated: List[Optional[List[BilingualParagraph]]] = [None] * len(paragraphs)
+    saved_tokens = [(0, 0)] * len(paragraphs)  # input and output tokens the cached translations took
+    for i, cached in enumerate(await translation_cache.get_many_async(keys)):
+        if cached is not None:
+            entry = json.loads(cached)
+            translated[i] = [BilingualParagraph.model_validate(entry["paragraph"])]
+            saved_tokens[i] = entry["input_tokens"], entry["output_tokens"]
+    header = await translation_cache.get_async(header_key)
+    misses = [i for i, t in enumerate(translated) if t is None]
+    hits = sorted(set(range(len(paragraphs))) - set(misses))
+    batches = _miss_batches(paragraphs, misses, model)
+
     # Log the length of text being sent (before LLM invocation)
-    text_length = len(processed_text)
-    ost = usage_tracker.get_overall_usage_stats()
+    texts = ["\n\n".join(paragraphs[i] for i in batch) for batch in batches]
+    text_length = sum(len(text) for text in texts)
+    ost = await usage_tracker.get_overall_usage_stats_async()
     if ost.total_text_length + text_length > cfg.OVERALL_TOTAL_TEXT_LENGTH_QUOTA:
         raise ValueError(f"Total text length quota exceeded: {cfg.OVERALL_TOTAL_TEXT_LENGTH_QUOTA}")
-    # TODO - make this at user level
-    print(f"Invoking LLM with text length: {text_length}, and system prompt length: {len(system_prompt)} characters")
-    messages = [SystemMessage(content=system_prompt), HumanMessage(content=processed_text)]
-    ret = structured_llm.invoke(messages)
-    # Extract usage metadata
-    usage_metadata = ret['raw'].usage_metadata
-    input_tokens = usage_metadata.get('input_tokens', 0)
-    output_tokens = usage_metadata.get('output_tokens', 0)
-    
-    # Log usage metrics
-    usage_tracker.log_usage(
-        text_length=text_length,
-        input_tokens=input_tokens,
-        output_tokens=output_tokens,
-        user_name=user_name
+    logging.info(f"Translation cache: {len(hits)} hits, {len(misses)} misses, "
+                 f"invoking LLM for {len(batches)} batches, total text length: {text_length}")
+    await usage_tracker.log_cache_usage_async(hits=len(hits), misses=len(misses),
+                                              saved_input_tokens=sum(saved_tokens[i][0] for i in hits),
+                                              saved_output_tokens=sum(saved_tokens[i][1] for i in hits),
+                                              user_name=user_name)
+
+    # questions do not wait for the translation, nor the translation for them
+    questions_task = asyncio.ensure_future(generate_questions(source_text, number_of_questions, source_language,
+                                                              user_name)) if number_of_questions > 0 else None
+    semaphore = asyncio.Semaphore(cfg.LLM_MAX_CONCURRENCY)
+    tasks = [asyncio.ensure_future(_translate_batch_once(text, source_language, target_language, version,
+                                                         model, user_name, semaphore))
+             for text in texts]
+    batch_of = {batch[0]: (batch, task) for batch, task in zip(batches, tasks)}
+    parts = []
+    try:
+        for i in range(len(paragraphs)):
+            if i in batch_of:  # the first paragraph of a batch, the batch is awaited in order
+                batch, task = batch_of[i]
+                bt, input_tokens, output_tokens = await task
+                parts.append(bt)
+                await _store_batch(bt, batch, paragraphs, keys, translated, input_tokens, output_tokens)
+            for paragraph in translated[i]:
+                yield paragraph
+
+        if parts:
+            header = json.dumps({"source_language": parts[0].source_language,
+                                 "target_language": parts[0].target_language}, ensure_ascii=False)
+            await translation_cache.put_async(header_key, header)
+        if header is not None:
+            header = json.loads(header)
+        else:  # all paragraphs are cached from other texts
+            header = {"source_language": source_language, "target_language": target_language}
+        questions = []
+        if questions_task is not None:
+            try:
+                questions = await questions_task
+            except Exception as e:  # the translation is still useful without them
+                logging.warning(f"Questions generation failed: {e}")
+    finally:  # the consumer stopped early or a batch failed
+        for task in tasks + [questions_task]:
+            if task is not None:
+                task.cancel()
+    yield BilingualText(
+        paragraphs=[p for t in translated for p in t],
+        source_language=header["source_language"],
+        target_language=header["target_language"],
+        questions=questions or None
     )
-    
-    print(f"LLM usage: {usage_metadata}")
-    return ret['parsed']
 
+
+async def generate_questions(source_text: str, number_of_questions: int = 2, source_language: str = None,
+                             user_name: str = None) -> List[Questions]:
+    """
+    Comprehension questions with answers, in the language of the text, by a call of its own.
+    Results are cached by the text, identical calls in flight are made once.
+    """
+    if number_of_questions <= 0:
+        return []
+    source_language = source_language or detect_language_or_none(source_text)
+    key = _cache_key(_normalize(source_text), source_language, None, prompt_version(PromptName.MAKE_QUESTIONS),
+                     'questions', number_of_questions)
+
+    async def generate():
+        cached = await translation_cache.get_async(key)
+        if cached is None:
+            questions = await _generate_questions(source_text, number_of_questions, source_language, user_name)
+            cached = json.dumps([q.model_dump() for q in questions], ensure_ascii=False)
+            await translation_cache.put_async(key, cached)
+        return cached
+
+    cached = await translation_cache.get_async(key)
+    if cached is None:
+        cached = await translation_flights.do(key, generate)
+    return [Questions.model_validate(q) for q in json.loads(cached)]
+
+
+async def _store_batch(bt: BilingualText, batch: List[int], paragraphs: List[str], keys: List[str],
+                       translated: List[Optional[List[BilingualParagraph]]], input_tokens: int, output_tokens: int):
+    """Puts translations of the batch to their places in translated and to the cache."""
+    if len(bt.paragraphs) != len(batch):
+        # LLM changed the paragraphs splitting, translations can not be matched to source paragraphs
+        translated[batch[0]] = bt.paragraphs
+        for i in batch[1:]:
+            translated[i] = []
+        return
+    batch_length = sum(len(paragraphs[i]) for i in batch)
+    entries = []
+    for i, paragraph in zip(batch, bt.paragraphs):
+        translated[i] = [paragraph]
+        share = len(paragraphs[i]) / batch_length
+        entries.append((keys[i], json.dumps({
+            "paragraph": paragraph.model_dump(),
+            "input_tokens": round(input_tokens * share),
+            "output_tokens": round(output_tokens * share)}, ensure_ascii=False)))
+    await translation_cache.put_many_async(entries)
+
+
+def _normalize(paragraph: str) -> str:
+    """Cache key does not depend on whitespace and unicode normalization form of the text."""
+    return unicodedata.normalize('NFC', ' '.join(paragraph.split()))
+
+
+def _cache_key(text, source_language: str, target_language: str, version: str, *parts) -> str:
+    return translation_cache.make_key(text, source_language, target_language, cfg.LLM_MODEL, version, *parts)
+
+
+async def _token_model(source_language: str, target_language: str) -> TokenModel:
+    """Token estimates for the language pair, the estimator is (re)calibrated on usage history once in a while."""
+    calibrated_at = token_estimator.calibrated_at
+    if calibrated_at is None or time.time() - calibrated_at > cfg.TOKEN_ESTIMATE_RECALIBRATE_SECONDS:
+        history = await asyncio.to_thread(usage_tracker.get_history)
+        token_estimator.calibrate(history)
+    return token_estimator.model(source_language, target_language)
+
+
+def _miss_batches(paragraphs: List[str], misses: List[int], model: TokenModel) -> List[List[int]]:
+    """Indexes of paragraphs to translate, grouped in batches of consecutive paragraphs."""
+    runs = []
+    for i in misses:
+        if runs and runs[-1][-1] == i - 1:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+    batches = []
+    for run in runs:
+        for group in plan_batches([paragraphs[i] for i in run], model):
+            batches.append(run[:len(group)])
+            run = run[len(group):]
+    return batches
+
+
+async def _translate_batch_once(processed_text: str, source_language: str, target_language: str,
+                                version: str, model: TokenModel, user_name: str = None,
+                                semaphore: asyncio.Semaphore = None) -> Tuple[BilingualText, int, int]:
+    """
+    Identical batches (double clicks, the same text submitted by a class) in flight are translated once.
+    Results are cached per batch too, so a request waiting for the cross worker lock finds it in the cache.
+    """
+    key = _cache_key(processed_text, source_language, target_language, version, 'batch')
+
+    async def translate():
+        cached = await translation_cache.get_async(key)
+        if cached is not None:
+            entry = json.loads(cached)
+            return BilingualText.model_validate(entry["bilingual_text"]), entry["input_tokens"], entry["output_tokens"]
+        bt, input_tokens, output_tokens = await _translate_batch(processed_text, source_language, target_language,
+                                                                 model, user_name, semaphore)
+        await translation_cache.put_async(key, json.dumps({"bilingual_text": bt.model_dump(),
+                                                           "input_tokens": input_tokens,
+                                                           "output_tokens": output_tokens}, ensure_ascii=False))
+        return bt, input_tokens, output_tokens
+
+    return await translation_flights.do(key, translate)
+
+
+def _bilingual_prompt() -> PromptName:
+    return PromptName.MAKE_BILINGUAL_COMPACT if cfg.LLM_OUTPUT_FORMAT == 'compact' else PromptName.MAKE_BILINGUAL
+
+
+async def _invoke_compact(messages) -> dict:
+    """Streams compact output through the parser, returns it the way structured output with include_raw does."""
+    parser = CompactParser()
+    raw = AIMessageChunk(content='')
+    async for chunk in llm.astream(messages):
+        raw = raw + chunk
+        parser.feed(chunk.content)
+    try:
+        return {"raw": raw, "parsed": parser.close(), "parsing_error": None}
+    except CompactFormatError as e:
+        return {"raw": raw, "parsed": None, "parsing_error": e}
+
+
+async def _translate_batch(processed_text: str, source_language: str, target_language: str,
+                           model: TokenModel, user_name: str = None,
+                           semaphore: asyncio.Semaphore = None) -> Tuple[BilingualText, int, int]:
+    """
+    One LLM call, made through the upstream governor, which limits concurrency of all calls of the process,
+    keeps them within the per-minute token budget and retries failed calls.
+    Unparsable output is asked for again, up to LLM_BATCH_RETRIES times.
+    semaphore limits the number of concurrent calls for one text.
+    Returns the translation and input and output tokens used for it.
+    """
+    system_prompt = read_prompt(_bilingual_prompt(), target_language=target_language)
+    messages = [SystemMessage(content=system_prompt), HumanMessage(content=processed_text)]
+    if cfg.LLM_OUTPUT_FORMAT == 'compact':
+        invoke = partial(_invoke_compact, messages)
+    else:
+        invoke = partial(llm.with_structured_output(BilingualText, include_raw=True).ainvoke, messages)
+    input_tokens = output_tokens = 0
+    estimated_tokens = model.input_tokens(len(processed_text)) + model.output_tokens(len(processed_text))
+    for attempt in range(cfg.LLM_BATCH_RETRIES + 1):
+        logging.info(f"Invoking LLM with text length: {len(processed_text)}, "
+                     f"and system prompt length: {len(system_prompt)} characters")
+        async with semaphore or asyncio.Semaphore(1):
+            ret = await gemini_governor.call(invoke, tokens=estimated_tokens)
+        # Extract usage metadata
+        usage_metadata = ret['raw'].usage_metadata or {}
+        input_tokens += usage_metadata.get('input_tokens', 0)
+        output_tokens += usage_metadata.get('output_tokens', 0)
+        gemini_governor.settle(estimated_tokens,
+                               usage_metadata.get('input_tokens', 0) + usage_metadata.get('output_tokens', 0))
+        # Log usage metrics, failed parsing consumes tokens too
+        await usage_tracker.log_usage_async(
+            text_length=len(processed_text),
+            input_tokens=usage_metadata.get('input_tokens', 0),
+            output_tokens=usage_metadata.get('output_tokens', 0),
+            user_name=user_name,
+            source_language=source_language,
+            target_language=target_language
+        )
+        print(f"LLM usage: {usage_metadata}")
+        if ret['parsed'] is not None:
+            return ret['parsed'], input_tokens, output_tokens
+        if attempt == cfg.LLM_BATCH_RETRIES:
+            raise ValueError(f"LLM output could not be parsed: {ret.get('parsing_error')}")
+        logging.warning(f"LLM output could not be parsed, attempt {attempt + 1}: {ret.get('parsing_error')}")
+
+
+async def _generate_questions(source_text: str, number_of_questions: int, source_language: str,
+                              user_name: str = None) -> List[Questions]:
+    """One LLM call through the upstream governor, its usage is logged apart from translations."""
+    structured_llm = llm.with_structured_output(QuestionSet, include_raw=True)
+    system_prompt = read_prompt(PromptName.MAKE_QUESTIONS, number_of_questions=number_of_questions)
+    messages = [SystemMessage(content=system_prompt), HumanMessage(content=source_text)]
+    estimated_tokens = token_estimator.model().input_tokens(len(source_text)) + 200 * number_of_questions
+    ret = await gemini_governor.call(partial(structured_llm.ainvoke, messages), tokens=estimated_tokens)
+    usage_metadata = ret['raw'].usage_metadata or {}
+    gemini_governor.settle(estimated_tokens,
+                           usage_metadata.get('input_tokens', 0) + usage_metadata.get('output_tokens', 0))
+    await usage_tracker.log_usage_async(
+        text_length=len(source_text),
+        input_tokens=usage_metadata.get('input_tokens', 0),
+        output_tokens=usage_metadata.get('output_tokens', 0),
+        user_name=user_name,
+        source_language=source_language,
+        kind=UsageKind.QUESTIONS
+    )
+    if ret['parsed'] is None:
+        raise ValueError(f"LLM output could not be parsed: {ret.get('parsing_error')}")
+    return ret['parsed'].questions[:number_of_questions]
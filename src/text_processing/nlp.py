@@ -1,47 +1,143 @@
+import math
 import re
 import logging
+import sqlite3
+from collections import defaultdict
+from typing import Callable, Iterator, List, Optional, Tuple, Union
 
-import stanza
-from langdetect import detect
 import stopwordsiso as sw
 
-from src.data_classes.lemma_index import  LemmasIndex
+from src import config as cfg
+from src.data_classes.lemma_index import LemmasIndex, LemmasIndexBuilder
+from src.text_processing.pipeline_pool import get_pipeline
+from src.text_processing.sentence_splitter import split_sentences
+from src.text_processing.language_detection import detect_language
+from src.text_processing.lemma_memo import lemma_memo
 
-def lemmatize(text: str, lang: str = None, filter_out_stop_words = False) ->  LemmasIndex:
+LEMMA_PROCESSORS = 'tokenize,mwt,pos,lemma'
+TOKENIZE_PROCESSORS = 'tokenize,mwt'
+
+Word = Tuple[str, Optional[str], str, int]  # form, lemma, upos, position in text
+
+
+def lemmatize(text: str, lang: str = None, filter_out_stop_words = False, fast: bool = None) ->  LemmasIndex:
     """
     Processes the input text and returns a list of LemmaIndex objects,
     each containing lemma, POS, and character positions for each word.
     Lemmas are unique; if a lemma repeats, add the word and its position to the existing entry.
+    In fast mode (cfg.LEMMATIZE_FAST by default) only sentences with forms unknown to the lemma memo
+    go through the neural POS and lemma processors. Full lemmatizations teach the memo if cfg.LEMMA_MEMO_LEARN.
     """
-    lang = lang or detect(text)
-    lang = lang.split('-')[0]  # Use the primary language code (e.g., 'en' from 'en-US'), awkward, needs to be fixed later
-    sws = []
-    if filter_out_stop_words:
-        if not sw.has_lang(lang):
-            logging.warning(f"Language '{lang}' is not supported by stopwords. Using all words.")
-        else:
-            sws = sw.stopwords(lang)
-    nlp = stanza.Pipeline(lang, processors='tokenize,mwt,pos,lemma')
-    doc = nlp(text)
-    lsi = LemmasIndex(text=text, lemmas=set())
+    lang = primary_language(text, lang)
+    fast = cfg.LEMMATIZE_FAST if fast is None else fast
+    if fast:
+        words = _analyse_with_memo(text, lang)
+    else:
+        nlp = get_pipeline(lang, processors=LEMMA_PROCESSORS)
+        words = list(_doc_words(nlp(text)))
+        if cfg.LEMMA_MEMO_LEARN:
+            _learn(lang, words)
+    return _words_to_lemmas_index(words, text, _stop_words(lang, filter_out_stop_words))
+
+
+def lemmatize_many(texts: List[str], langs: List[Optional[str]] = None,
+                   filter_out_stop_words: Union[bool, List[bool]] = False) -> List[LemmasIndex]:
+    """
+    Lemmatizes several texts, grouping them by language, so each group goes to Stanza in one bulk call.
+    langs and filter_out_stop_words may be given per text; languages not given are detected.
+    Returns one LemmasIndex per input text, in the same order.
+    """
+    langs = langs or [None] * len(texts)
+    filters = filter_out_stop_words if isinstance(filter_out_stop_words, list) else [filter_out_stop_words] * len(texts)
+    groups = defaultdict(list)  # language -> indexes of texts
+    for i, (text, lang) in enumerate(zip(texts, langs)):
+        groups[primary_language(text, lang)].append(i)
+
+    results: List[Optional[LemmasIndex]] = [None] * len(texts)
+    for lang, indexes in groups.items():
+        nlp = get_pipeline(lang, processors=LEMMA_PROCESSORS)
+        docs = nlp.bulk_process([texts[i] for i in indexes])
+        for i, doc in zip(indexes, docs):
+            words = list(_doc_words(doc))
+            if cfg.LEMMA_MEMO_LEARN:
+                _learn(lang, words)
+            results[i] = _words_to_lemmas_index(words, texts[i], _stop_words(lang, filters[i]))
+    return results
+
+
+def primary_language(text: str, lang: str = None) -> str:
+    lang = lang or detect_language(text)
+    return lang.split('-')[0]  # Use the primary language code (e.g., 'en' from 'en-US'), awkward, needs to be fixed later
+
+
+def _stop_words(lang: str, filter_out_stop_words: bool):
+    if not filter_out_stop_words:
+        return set()
+    if not sw.has_lang(lang):
+        logging.warning(f"Language '{lang}' is not supported by stopwords. Using all words.")
+        return set()
+    return sw.stopwords(lang)
+
+
+def _word_position(word) -> int:
+    # words of multi-word tokens may have no offsets of their own, use the token's one
+    return word.start_char if word.start_char is not None else word.parent.start_char
+
+
+def _doc_words(doc, offset: int = 0) -> Iterator[Word]:
     for sentence in doc.sentences:
         for word in sentence.words:
-            lemma = word.lemma or f'{word.text} (lemma not defined)'  # Use the original word if lemma is not available
-            if lemma in sws or word.upos == 'PUNCT': # Skip stop words and punctuation
-                continue
-            lsi.add_lemma(
-                lemma=lemma,
-                pos=word.upos,
-                word=word.text,
-                position_in_text=word.start_char
-            )
-    return lsi
-
-def split_to_paragraphs(text: str, max_length: int = 0) -> list[str]:
+            yield word.text, word.lemma, word.upos, _word_position(word) + offset
+
+
+def _analyse_with_memo(text: str, lang: str) -> List[Word]:
+    """
+    Tokenizes text, takes lemma and POS of known forms from the memo. Sentences with unknown forms
+    go to the full pipeline as a whole, as POS tagging needs the context.
+    """
+    doc = get_pipeline(lang, processors=TOKENIZE_PROCESSORS)(text)
+    known = lemma_memo.lookup(lang, (word.text for sentence in doc.sentences for word in sentence.words))
+    words, unknown_spans = [], []
+    for sentence in doc.sentences:
+        if all(word.text in known for word in sentence.words):
+            words.extend((word.text, *known[word.text], _word_position(word)) for word in sentence.words)
+        else:
+            unknown_spans.append((sentence.tokens[0].start_char, sentence.tokens[-1].end_char))
+    resolved = len(words)
+    if unknown_spans:
+        nlp = get_pipeline(lang, processors=LEMMA_PROCESSORS)
+        docs = nlp.bulk_process([text[start:end] for start, end in unknown_spans])
+        analysed = [word for (start, _), d in zip(unknown_spans, docs) for word in _doc_words(d, offset=start)]
+        _learn(lang, analysed)
+        words.extend(analysed)
+        words.sort(key=lambda word: word[3])
+    lemma_memo.count(lang, resolved, len(words) - resolved)
+    return words
+
+
+def _learn(lang: str, words: List[Word]):
+    try:
+        lemma_memo.observe(lang, ((form, lemma, upos) for form, lemma, upos, _ in words if lemma and upos))
+    except sqlite3.Error as e:  # the memo is an optimization, lemmatization does not depend on it
+        logging.warning(f"Failed to update lemma memo for '{lang}': {e}")
+
+
+def _words_to_lemmas_index(words: List[Word], text: str, sws) -> LemmasIndex:
+    lsi = LemmasIndexBuilder(text=text)
+    for form, lemma, upos, position in words:
+        lemma = lemma or f'{form} (lemma not defined)'  # Use the original word if lemma is not available
+        if lemma in sws or upos == 'PUNCT': # Skip stop words and punctuation
+            continue
+        lsi.add_lemma(lemma=lemma, pos=upos, word=form, position_in_text=position)
+    return lsi.build()
+
+def split_to_paragraphs(text: str, max_length: int = 0, lang: str = None, use_stanza: bool = False) -> list[str]:
     """
     Splits the input text into paragraphs, considering double new line as explicit paragraph splitter, 
       ensuring each paragraph does not exceed max_length.
       In case if len(sentence)>max_length?  it should be added as a new paragraph as is, without splitting.
+    Long paragraphs are split to sentences by rule-based splitter, or by Stanza if use_stanza
+      (more accurate, but needs the model to be loaded).
     """
     paragraphs = []
     for paragraph in re.split(r'(?:\s*\n\s*\n\s*)', text):
@@ -53,18 +149,68 @@ def split_to_paragraphs(text: str, max_length: int = 0) -> list[str]:
             paragraphs.append(paragraph)
         else:
             # If paragraph exceeds max_length, split it into chunks with some subset of lines
-            paragraphs.extend(_repartition_paragraph(paragraph, max_length))
+            paragraphs.extend(_repartition_paragraph(paragraph, max_length, lang=lang, use_stanza=use_stanza))
     return paragraphs
 
-def _repartition_paragraph(paragraph: str, max_length: int) -> list[str]:
+def group_paragraphs(paragraphs: List[str], max_length: float, length: Callable[[str], float] = len,
+                     separator_length: float = 2, min_batches: int = 1) -> List[List[str]]:
+    """
+    Groups consecutive paragraphs into batches of about the same length, not longer than max_length
+    (except a single paragraph that is longer itself), so batches processed in parallel finish at about the same time.
+    length may be any additive cost of a paragraph, like estimated tokens; by default it is number of characters,
+    and paragraphs are joined by double new line. At least min_batches batches are made, if there are enough paragraphs.
+    """
+    if not paragraphs:
+        return []
+    lengths = [length(p) for p in paragraphs]
+    total = sum(lengths) + separator_length * (len(paragraphs) - 1)
+    number_of_batches = max(math.ceil(total / max_length), min(min_batches, len(paragraphs)))
+    if number_of_batches <= 1:
+        return [paragraphs]
+    target = total / number_of_batches
+    batches, current, current_length = [], [], 0
+    for paragraph, paragraph_length in zip(paragraphs, lengths):
+        paragraph_length += separator_length if current else 0
+        if current and (current_length + paragraph_length > max_length
+                        or current_length + paragraph_length / 2 > target):
+            batches.append(current)
+            current, current_length, paragraph_length = [], 0, paragraph_length - separator_length
+        current.append(paragraph)
+        current_length += paragraph_length
+    batches.append(current)
+    return batches
+
+def paragraph_spans(text: str, max_length: int = 0, lang: str = None,
+                    use_stanza: bool = False) -> List[Tuple[int, int]]:
+    """(start, end) offsets in text of the paragraphs produced by split_to_paragraphs."""
+    spans = []
+    cursor = 0
+    for paragraph in split_to_paragraphs(text, max_length=max_length, lang=lang, use_stanza=use_stanza):
+        start = text.find(paragraph, cursor)
+        if start >= 0:
+            end = start + len(paragraph)
+        else:  # sentences of repartitioned paragraphs are joined by single space, original whitespace may differ
+            m = re.compile(r'\s+'.join(map(re.escape, paragraph.split()))).search(text, cursor)
+            if not m:
+                raise ValueError(f"Paragraph not found in the text: {paragraph[:50]}...")
+            start, end = m.span()
+        spans.append((start, end))
+        cursor = end
+    return spans
+
+def split_sentences_with_stanza(text: str, lang: str = None) -> list[str]:
+    nlp = get_pipeline(primary_language(text, lang), processors='tokenize')
+    return [sentence.text.strip() for sentence in nlp(text).sentences]
+
+def _repartition_paragraph(paragraph: str, max_length: int, lang: str = None, use_stanza: bool = False) -> list[str]:
     """
     Splits a paragraph into smaller paragraphs by sentences, ensuring each does not exceed max_length.
     If a sentence itself exceeds max_length, it is added as a separate paragraph as is.
     """
-    detected_language = detect(paragraph)  # This will return a language code like 'fr', 'en', 'ru', etc.
-    nlp = stanza.Pipeline(lang=detected_language, processors='tokenize', tokenize_no_ssplit=True)
-    doc = nlp(paragraph)
-    sentences = [sentence.text.strip() for sentence in doc.sentences]
+    if use_stanza:
+        sentences = split_sentences_with_stanza(paragraph, lang)
+    else:
+        sentences = split_sentences(paragraph, lang)
 
     result = []
     current = ""
@@ -0,0 +1,208 @@
+"""
+Pool of worker processes for CPU-bound NLP work (Stanza inference).
+PyTorch inference holds the GIL for long stretches, so running it in the web server process
+slows down all other endpoints. Each worker keeps its own warm pipelines (see pipeline_pool)
+and uses a pinned number of torch threads, so concurrent requests scale across cores.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from src import config as cfg
+
+
+class NLPPoolBusyError(RuntimeError):
+    """Raised when the queue of NLP tasks is full."""
+
+
+def _init_worker(torch_threads: int, preload_languages: List[str]):
+    # has to be set before torch is imported, which happens on the first pipeline load
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(torch_threads)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+    if preload_languages:
+        from src.text_processing.pipeline_pool import pipeline_pool
+        pipeline_pool.preload(preload_languages)
+
+
+def _warm_up():
+    return os.getpid()
+
+
+class NLPWorkerPool:
+    """
+    Executes NLP functions in worker processes, with a bounded number of queued tasks and a timeout per task.
+    A task running longer than its timeout can not be stopped alone, so the pool it runs in is recycled:
+    its workers are terminated (other tasks running there fail) and new ones serve the next tasks.
+    With workers=0 tasks run in threads of the current process, which is handy for development and tests;
+    threads can not be terminated, a timed out one runs to its end outside of the queue limit.
+    """
+
+    def __init__(self,
+                 workers: int = cfg.NLP_WORKERS,
+                 max_queue: int = cfg.NLP_MAX_QUEUE,
+                 task_timeout: float = cfg.NLP_TASK_TIMEOUT,
+                 torch_threads: int = cfg.NLP_WORKER_TORCH_THREADS,
+                 preload_languages: Optional[List[str]] = None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.task_timeout = task_timeout
+        self.torch_threads = torch_threads
+        self.preload_languages = cfg.STANZA_PRELOAD_LANGUAGES if preload_languages is None else preload_languages
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue)  # taken by every queued or running task
+        self._queued: Dict[Future, Any] = {}  # futures holding a slot -> executor running them
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.recycled = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    # spawn, as forking a process with running threads (and maybe loaded torch) is not safe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker,
+                        initargs=(self.torch_threads, self.preload_languages))
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                        thread_name_prefix='nlp')
+            return self._executor
+
+    def _reset_executor(self, executor=None):
+        """Shuts down the executor (if it is still the current one) and terminates its worker processes."""
+        with self._lock:
+            if self._executor is None or executor not in (None, self._executor):
+                return
+            executor, self._executor = self._executor, None
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        # queued tasks of terminated processes fail anyway, threads go on with them
+        executor.shutdown(wait=False, cancel_futures=bool(processes))
+        for process in processes:
+            process.terminate()
+
+    def start(self):
+        """Start workers (and load pipelines of STANZA_PRELOAD_LANGUAGES) before the first request comes."""
+        executor = self._get_executor()
+        if self.workers > 0:
+            for _ in range(self.workers):
+                executor.submit(_warm_up)
+        elif self.preload_languages:
+            from src.text_processing.pipeline_pool import pipeline_pool
+            executor.submit(pipeline_pool.preload, self.preload_languages)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Queue fn(*args, **kwargs), fn and its arguments have to be picklable.
+        Raises NLPPoolBusyError if queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise NLPPoolBusyError(f"Too many NLP tasks in progress ({self.max_queue}), try again later")
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:  # a worker died (e.g. killed by OOM), start a new pool
+                logging.error("NLP worker pool is broken, restarting it")
+                self._reset_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.pending += 1
+            self._queued[future] = executor
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _release(self, future: Future) -> bool:
+        """Frees the slot of the task, once: when it is done or when it timed out, whichever comes first."""
+        with self._lock:
+            if self._queued.pop(future, None) is None:
+                return False
+            self.pending -= 1
+        self._slots.release()
+        return True
+
+    def _on_done(self, future: Future):
+        if not self._release(future):
+            return  # timed out before, already counted
+        with self._lock:
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _on_timeout(self, future: Future):
+        with self._lock:
+            self.timeouts += 1
+            executor = self._queued.get(future)
+        if future.cancel() or executor is None:  # had not started yet, or has just ended
+            return
+        if self._release(future):
+            with self._lock:
+                self.failed += 1
+        logging.error(f"NLP task timed out, recycling {'worker processes' if self.workers > 0 else 'threads'}")
+        self._reset_executor(executor)
+        with self._lock:
+            self.recycled += 1
+
+    def run(self, fn: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        """Execute fn in the pool and wait for the result."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.task_timeout)
+        except TimeoutError:
+            self._on_timeout(future)
+            raise
+
+    async def run_async(self, fn: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        """Execute fn in the pool without blocking the event loop."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout or self.task_timeout)
+        except TimeoutError:
+            self._on_timeout(future)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": "processes" if self.workers > 0 else "threads",
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "pending": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+            }
+
+
+nlp_pool = NLPWorkerPool()
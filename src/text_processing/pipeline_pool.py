@@ -0,0 +1,136 @@
+"""
+Process-wide registry of loaded Stanza pipelines.
+Loading a pipeline takes seconds and hundreds of MB, so pipelines are shared between requests
+and kept in a bounded LRU (by number of models and by estimated memory footprint).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+from src import config as cfg
+
+PipelineKey = Tuple[str, str, Tuple[Tuple[str, Any], ...]]
+
+
+def _load_stanza_pipeline(lang: str, processors: str, **options):
+    # stanza pulls in torch on import, so it is imported only when a model really has to be loaded
+    import stanza
+    return stanza.Pipeline(lang, processors=processors, **options)
+
+
+def _estimate_pipeline_size(pipeline) -> int:
+    """Rough memory footprint of a Stanza pipeline in bytes, summed over the parameters of its models."""
+    total = 0
+    for processor in getattr(pipeline, 'processors', {}).values():
+        model = getattr(processor, '_model', None)
+        if model is None or not hasattr(model, 'parameters'):
+            continue
+        try:
+            total += sum(p.numel() * p.element_size() for p in model.parameters())
+        except Exception:  # not every processor wraps a torch module
+            continue
+    return total
+
+
+class PipelinePool:
+    """Thread-safe LRU of Stanza pipelines keyed by (language, processors, options)."""
+
+    def __init__(self,
+                 max_models: int = cfg.STANZA_POOL_MAX_MODELS,
+                 max_bytes: int = cfg.STANZA_POOL_MAX_BYTES,
+                 loader: Callable[..., Any] = _load_stanza_pipeline,
+                 size_estimator: Callable[[Any], int] = _estimate_pipeline_size):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._size_estimator = size_estimator
+        self._pipelines: "OrderedDict[PipelineKey, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time_seconds = 0.0
+
+    @staticmethod
+    def make_key(lang: str, processors: str, **options) -> PipelineKey:
+        return lang, processors, tuple(sorted(options.items()))
+
+    def get(self, lang: str, processors: str = 'tokenize,mwt,pos,lemma', **options):
+        """Return a loaded pipeline, loading it on first use. Concurrent misses for the same key load it once."""
+        key = self.make_key(lang, processors, **options)
+        with self._lock:
+            entry = self._pipelines.get(key)
+            if entry is not None:
+                self._pipelines.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+
+        with loading_lock:
+            with self._lock:  # another thread may have finished loading while we were waiting
+                entry = self._pipelines.get(key)
+                if entry is not None:
+                    self._pipelines.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+            started = time.perf_counter()
+            pipeline = self._loader(lang, processors, **options)
+            elapsed = time.perf_counter() - started
+            size = self._size_estimator(pipeline)
+            logging.info(f"Loaded Stanza pipeline {key} in {elapsed:.2f}s, ~{size / 2**20:.0f} MB")
+            with self._lock:
+                self.load_time_seconds += elapsed
+                self._pipelines[key] = (pipeline, size)
+                self._evict()
+                self._loading_locks.pop(key, None)
+            return pipeline
+
+    def _evict(self):
+        """Drop least recently used pipelines until within limits; the most recent one is always kept."""
+        while len(self._pipelines) > 1 and (
+                len(self._pipelines) > self.max_models or self.resident_bytes > self.max_bytes):
+            key, _ = self._pipelines.popitem(last=False)
+            self.evictions += 1
+            logging.info(f"Evicted Stanza pipeline {key}")
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(size for _, size in self._pipelines.values())
+
+    def preload(self, languages: Iterable[str], processors: str = 'tokenize,mwt,pos,lemma', **options):
+        for lang in languages:
+            try:
+                self.get(lang, processors, **options)
+            except Exception as e:  # a missing model should not prevent the app from starting
+                logging.error(f"Failed to preload Stanza pipeline for '{lang}': {e}")
+
+    def clear(self):
+        with self._lock:
+            self._pipelines.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else None,
+                "evictions": self.evictions,
+                "load_time_seconds": round(self.load_time_seconds, 3),
+                "resident_models": [
+                    {"lang": k[0], "processors": k[1], "options": dict(k[2]), "size_bytes": size}
+                    for k, (_, size) in self._pipelines.items()
+                ],
+                "resident_bytes": self.resident_bytes,
+            }
+
+
+def get_pipeline(lang: str, processors: str = 'tokenize,mwt,pos,lemma', **options):
+    return pipeline_pool.get(lang, processors, **options)
+
+
+pipeline_pool = PipelinePool()
@@ -0,0 +1,212 @@
+"""
+Two-level (memory + disk) cache of serialized results keyed by a strong content hash.
+Both levels are size-bounded and evict least recently used entries.
+Files on disk are indexed by the process on first use (one walk of the directory), then the index and the running
+total of bytes are kept up to date by the reads and writes of the process, so eviction does not walk the disk.
+Coroutines use the *_async methods, which read and write files in a thread, memory hits are served right away.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from importlib import metadata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src import config as cfg
+
+
+class ResultCache:
+
+    def __init__(self, name: str, directory: str, max_memory_bytes: int, max_disk_bytes: int):
+        self.name = name
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Optional["OrderedDict[str, int]"] = None  # file sizes by key, least recently used first
+        self._disk_bytes = None  # calculated on first use of the disk
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get_memory(key)
+        return value if value is not None else self._read(key)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        value = self._get_memory(key)
+        return value if value is not None else await asyncio.to_thread(self._read, key)
+
+    async def get_many_async(self, keys: List[str]) -> List[Optional[str]]:
+        """Values of the keys, None for missing ones; files of keys not in memory are read in one thread."""
+        values = [self._get_memory(key) for key in keys]
+        to_read = [i for i, value in enumerate(values) if value is None]
+        if to_read:
+            read = await asyncio.to_thread(lambda: [self._read(keys[i]) for i in to_read])
+            for i, value in zip(to_read, read):
+                values[i] = value
+        return values
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value)
+        self._write(key, value)
+
+    async def put_async(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value)
+        await asyncio.to_thread(self._write, key, value)
+
+    async def put_many_async(self, items: Iterable[Tuple[str, str]]):
+        items = list(items)
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value)
+        await asyncio.to_thread(lambda: [self._write(key, value) for key, value in items])
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return value
+
+    def _read(self, key: str) -> Optional[str]:
+        disk = self._disk_index()
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read()
+                size = os.fstat(f.fileno()).st_size
+            os.utime(path)  # mtime is used as last access time when the index is built
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._disk_bytes -= disk.pop(key, 0)  # evicted by another process
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, value)
+            self._disk_bytes += size - disk.pop(key, 0)  # may be written by another process
+            disk[key] = size
+        return value
+
+    def _write(self, key: str, value: str):
+        disk = self._disk_index()
+        data = value.encode('utf-8')
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # readers never see partially written files
+        with self._lock:
+            self._disk_bytes += len(data) - disk.pop(key, 0)
+            disk[key] = len(data)
+            evicted = self._pop_least_recently_used() if self._disk_bytes > self.max_disk_bytes else []
+        for evicted_key in evicted:
+            try:
+                os.remove(self._path(evicted_key))
+            except FileNotFoundError:
+                continue
+        if evicted:
+            logging.info(f"Cache '{self.name}': evicted {len(evicted)} files, "
+                         f"disk usage is {self._disk_bytes} bytes now")
+
+    def _remember(self, key: str, value: str):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while len(self._memory) > 1 and self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _files(self):
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                if file_name.endswith('.json'):
+                    yield os.path.join(root, file_name)
+
+    def _disk_index(self) -> "OrderedDict[str, int]":
+        """Index of files on disk, built by one walk of the directory (outside the lock) on first use."""
+        if self._disk is None:
+            entries = []
+            for path in self._files():
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, os.path.basename(path)[:-len('.json')], st.st_size))
+            entries.sort()
+            with self._lock:
+                if self._disk is None:
+                    self._disk = OrderedDict((key, size) for _, key, size in entries)
+                    self._disk_bytes = sum(self._disk.values())
+        return self._disk
+
+    def _pop_least_recently_used(self) -> List[str]:
+        """Keys to remove until 90% of the limit, so eviction does not run on every write. Called under the lock."""
+        target = self.max_disk_bytes * 0.9
+        evicted = []
+        while len(self._disk) > 1 and self._disk_bytes > target:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(key)
+        self.evictions += len(evicted)
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for path in list(self._files()):
+                os.remove(path)
+            self._disk = OrderedDict()
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            requests = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / requests if requests else None,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.evictions,
+            }
+
+
+def stanza_version() -> str:
+    """Version of installed stanza, models are downloaded for it. Does not import stanza (and torch)."""
+    try:
+        return metadata.version('stanza')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+lemma_cache = ResultCache('lemmas', cfg.LEMMA_CACHE_DIR,
+                          max_memory_bytes=cfg.LEMMA_CACHE_MAX_MEMORY_BYTES,
+                          max_disk_bytes=cfg.LEMMA_CACHE_MAX_DISK_BYTES)
+translation_cache = ResultCache('translations', cfg.TRANSLATION_CACHE_DIR,
+                                max_memory_bytes=cfg.TRANSLATION_CACHE_MAX_MEMORY_BYTES,
+                                max_disk_bytes=cfg.TRANSLATION_CACHE_MAX_DISK_BYTES)
@@ -0,0 +1,108 @@
+"""
+Fast rule-based sentence splitter: sentence ends with . ! ? or …, optionally followed by closing quotes
+or brackets, unless the period belongs to an abbreviation, an initial or an ordinal number,
+or the next word starts with a lowercase letter.
+Used by split_to_paragraphs by default, Stanza is an opt-in high-accuracy alternative.
+"""
+import re
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Tuple
+
+# lowercase, without the trailing period
+ABBREVIATIONS = {
+    'en': {'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'inc', 'ltd', 'co',
+           'corp', 'no', 'fig', 'approx', 'dept', 'est', 'gen', 'gov', 'lt', 'col', 'sgt', 'capt', 'rev',
+           'u.s', 'u.k', 'a.m', 'p.m', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct',
+           'nov', 'dec', 'mt', 'ave', 'blvd', 'vol', 'pp', 'cf', 'al'},
+    'tr': {'dr', 'prof', 'doç', 'yrd', 'av', 'sn', 'bkz', 'vb', 'vs', 'örn', 'yy', 'no', 'mah', 'cad',
+           'sok', 'apt', 'bşk', 'kur', 'alb', 'tel', 'müh', 'öğr', 'gör', 'hz', 'ş.t', 'a.ş', 'ltd', 'şti',
+           'vd', 'bn', 'krş', 's'},
+    'ru': {'г', 'гг', 'т', 'е', 'д', 'п', 'ул', 'стр', 'см', 'им', 'проф', 'тыс', 'млн', 'млрд', 'руб',
+           'коп', 'др', 'пр', 'т.е', 'т.д', 'т.п', 'т.к', 'н.э', 'в', 'вв', 'ок', 'напр', 'акад',
+           'доц', 'канд', 'кв', 'корп', 'обл', 'пер', 'пл', 'р'},
+    'uk': {'р', 'рр', 'ст', 'вул', 'див', 'ім', 'проф', 'тис', 'млн', 'млрд', 'грн', 'коп', 'т.ч', 'т.д',
+           'т.п', 'напр'},
+    'de': {'z.b', 'bzw', 'usw', 'ca', 'dr', 'prof', 'nr', 'str', 'u.a', 'd.h', 'evtl', 'ggf', 'inkl', 'vgl',
+           'bspw', 'hr', 'fr', 'jh', 'mio', 'mrd', 'st', 'u.ä', 'z.t', 'abs', 'allg', 'bzgl'},
+    'fr': {'m', 'mm', 'mme', 'mlle', 'dr', 'pr', 'etc', 'p', 'cf', 'av', 'bd', 'env', 'ex', 'apr', 'j.-c',
+           'st', 'ste', 'vol', 'n°'},
+    'es': {'sr', 'sra', 'srta', 'dr', 'dra', 'etc', 'pág', 'págs', 'ud', 'uds', 'ej', 'aprox', 'av', 'avda',
+           'núm', 'tel', 'vol', 'gral', 'lic', 'ing'},
+    'it': {'sig', 'sigg', 'sig.ra', 'dott', 'dr', 'prof', 'ecc', 'pag', 'pagg', 'es', 'ca', 'avv', 'ing',
+           'geom', 'n', 'tel', 'vol'},
+    'pt': {'sr', 'sra', 'srta', 'dr', 'dra', 'etc', 'pág', 'av', 'ex', 'n.º', 'prof', 'tel', 'vol'},
+}
+
+# terminator, closing quotes/brackets, whitespace
+_BOUNDARY_RE = re.compile(r'([.!?…]+)(["\'”’»)\]]*)(\s+)')
+_SENTENCE_START_RE = re.compile(r'["\'“‘«(\[—–-]*\s*(\S)')
+
+
+@lru_cache(maxsize=None)
+def _abbreviations(lang: Optional[str]) -> FrozenSet[str]:
+    if lang and lang in ABBREVIATIONS:
+        return frozenset(ABBREVIATIONS[lang])
+    # unknown language, use all of them
+    return frozenset(a for abbreviations in ABBREVIATIONS.values() for a in abbreviations)
+
+
+def _is_boundary(text: str, m: re.Match, abbreviations: FrozenSet[str]) -> bool:
+    next_start = _SENTENCE_START_RE.match(text, m.end())
+    if not next_start:
+        return True
+    next_char = next_start.group(1)
+    if next_char.islower():
+        return False
+    if m.group(1) != '.':  # ! ? … and multiple periods
+        return True
+    token_start = m.start()
+    while token_start > 0 and not text[token_start - 1].isspace():
+        token_start -= 1
+    token = text[token_start:m.start()].lstrip('"\'“‘«([').lower()
+    if not token:
+        return True
+    if token in abbreviations:
+        return False
+    if len(token) == 1 and token.isalpha():  # initials, like J. R. R. Tolkien
+        return False
+    if token.isdigit() and next_char.isdigit():  # dates like 12. 05. 2020
+        return False
+    return True
+
+
+def sentence_spans(text: str, lang: Optional[str] = None) -> List[Tuple[int, int]]:
+    """(start, end) offsets of sentences in text, leading and trailing whitespace excluded."""
+    lang = lang.split('-')[0].lower() if lang else None
+    abbreviations = _abbreviations(lang)
+    spans = []
+    start = 0
+    for m in _BOUNDARY_RE.finditer(text):
+        if _is_boundary(text, m, abbreviations):
+            spans.append((start, m.start(3)))
+            start = m.end()
+    spans.append((start, len(text)))
+    result = []
+    for start, end in spans:
+        sentence = text[start:end]
+        stripped = sentence.strip()
+        if stripped:
+            offset = start + len(sentence) - len(sentence.lstrip())
+            result.append((offset, offset + len(stripped)))
+    return result
+
+
+def split_sentences(text: str, lang: Optional[str] = None) -> List[str]:
+    return [text[start:end] for start, end in sentence_spans(text, lang)]
+
+
+def boundaries_agreement(sentences_a: List[str], sentences_b: List[str]) -> float:
+    """Share of sentence ends found by both splitters of the same text (Jaccard over non-space offsets)."""
+    def ends(sentences):
+        compact = [''.join(s.split()) for s in sentences]
+        result, position = set(), 0
+        for s in compact:
+            position += len(s)
+            result.add(position)
+        return result
+    a, b = ends(sentences_a), ends(sentences_b)
+    return len(a & b) / len(a | b)
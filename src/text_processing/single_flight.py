@@ -0,0 +1,76 @@
+"""
+Coalescing of identical concurrent calls: while a call for a key is in flight,
+other callers with the same key wait for its result instead of repeating it.
+Optionally the call also holds a file lock per key, so calls from other server processes sharing the directory
+wait for it too; they should re-check shared (disk) caches once the lock is acquired.
+The file lock is polled without blocking, so waiting for it takes neither the event loop nor a thread.
+"""
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows, cross-process locks are not available
+    fcntl = None
+
+
+_LOCK_POLL_SECONDS = 0.01
+_LOCK_POLL_MAX_SECONDS = 0.2
+
+
+class SingleFlight:
+
+    def __init__(self, lock_dir: Optional[str] = None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of fn(), called once for concurrent callers with the same key.
+        The call runs in its own task, so a cancelled caller does not cancel it for the others.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        async with self._file_lock(key) if self.lock_dir else nullcontext():
+            return await fn()
+
+    def _lock_path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:3]  # striped, number of lock files is bounded
+        return os.path.join(self.lock_dir, f"{name}.lock")
+
+    @asynccontextmanager
+    async def _file_lock(self, key: str):
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with open(self._lock_path(key), 'w') as lock_file:
+            delay = _LOCK_POLL_SECONDS
+            while True:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:  # held by another process, the call there takes seconds
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, _LOCK_POLL_MAX_SECONDS)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": self.in_flight()}
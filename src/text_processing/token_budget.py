@@ -0,0 +1,120 @@
+"""
+Token budget planning of LLM calls.
+Characters are a poor measure of what the model sees and emits: the bilingual JSON output is several times
+the input, and the ratio depends on the languages. TokenEstimator predicts input and output tokens of a call
+by a linear model (tokens = overhead + per_char * characters) fitted per language pair on the usage history.
+plan_batches packs paragraphs into calls within per-request token budgets,
+the per-minute token budget is kept by the token bucket of the upstream governor (see upstream_governor).
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src import config as cfg
+from src.auth.usage_tracker import UsageKind
+from src.text_processing.nlp import group_paragraphs
+
+LanguagePair = Tuple[Optional[str], Optional[str]]
+
+
+@dataclass
+class TokenModel:
+    """tokens = overhead + per_char * characters of the source text, for input and output of one call."""
+    input_overhead: float = cfg.TOKEN_ESTIMATE_INPUT_OVERHEAD
+    input_per_char: float = cfg.TOKEN_ESTIMATE_INPUT_PER_CHAR
+    output_overhead: float = cfg.TOKEN_ESTIMATE_OUTPUT_OVERHEAD
+    output_per_char: float = cfg.TOKEN_ESTIMATE_OUTPUT_PER_CHAR
+    samples: int = 0
+
+    def input_tokens(self, characters: int) -> int:
+        return math.ceil(self.input_overhead + self.input_per_char * characters)
+
+    def output_tokens(self, characters: int) -> int:
+        return math.ceil(self.output_overhead + self.output_per_char * characters)
+
+
+def _fit(points: List[Tuple[int, int]], default_overhead: float, default_per_char: float) -> Tuple[float, float]:
+    """Least squares line through (characters, tokens) points, falls back to ratio if the line makes no sense."""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x > 0:
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+        intercept = mean_y - slope * mean_x
+        if slope > 0 and intercept >= 0:
+            return intercept, slope
+    # all texts of about the same length, keep the default overhead and fit the rest
+    per_char = (sum(y for _, y in points) - n * default_overhead) / max(sum(x for x, _ in points), 1)
+    return default_overhead, per_char if per_char > 0 else default_per_char
+
+
+class TokenEstimator:
+
+    def __init__(self, min_samples: int = cfg.TOKEN_ESTIMATE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._models: Dict[LanguagePair, TokenModel] = {}
+        self._default = TokenModel()
+        self._lock = threading.Lock()
+        self.calibrated_at = None
+
+    def calibrate(self, entries: Iterable) -> None:
+        """
+        Fits the models on usage entries (text_length, input_tokens, output_tokens, source and target language)
+        of translation calls.
+        Pairs with less than min_samples entries use the model fitted on all entries.
+        """
+        by_pair: Dict[LanguagePair, List] = {}
+        for entry in entries:
+            if entry.kind == UsageKind.TRANSLATION and entry.text_length > 0 and entry.output_tokens > 0:
+                by_pair.setdefault((entry.source_language, entry.target_language), []).append(entry)
+        all_entries = [entry for pair_entries in by_pair.values() for entry in pair_entries]
+        models = {pair: self._fit_model(pair_entries) for pair, pair_entries in by_pair.items()
+                  if pair != (None, None) and len(pair_entries) >= self.min_samples}
+        default = self._fit_model(all_entries) if len(all_entries) >= self.min_samples else TokenModel()
+        with self._lock:
+            self._models, self._default = models, default
+            self.calibrated_at = time.time()
+        logging.info(f"Token estimator calibrated on {len(all_entries)} calls, {len(models)} language pairs")
+
+    @staticmethod
+    def _fit_model(entries: List) -> TokenModel:
+        input_overhead, input_per_char = _fit([(e.text_length, e.input_tokens) for e in entries],
+                                              cfg.TOKEN_ESTIMATE_INPUT_OVERHEAD, cfg.TOKEN_ESTIMATE_INPUT_PER_CHAR)
+        output_overhead, output_per_char = _fit([(e.text_length, e.output_tokens) for e in entries],
+                                                cfg.TOKEN_ESTIMATE_OUTPUT_OVERHEAD, cfg.TOKEN_ESTIMATE_OUTPUT_PER_CHAR)
+        return TokenModel(input_overhead, input_per_char, output_overhead, output_per_char, samples=len(entries))
+
+    def model(self, source_language: str = None, target_language: str = None) -> TokenModel:
+        with self._lock:
+            return self._models.get((source_language, target_language), self._default)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calibrated_at": self.calibrated_at, "default": self._default.__dict__,
+                    "pairs": {f"{s}->{t}": m.__dict__ for (s, t), m in self._models.items()}}
+
+
+def plan_batches(paragraphs: List[str], model: TokenModel,
+                 max_input_tokens: int = cfg.LLM_MAX_INPUT_TOKENS_PER_REQUEST,
+                 max_output_tokens: int = cfg.LLM_MAX_OUTPUT_TOKENS_PER_REQUEST,
+                 concurrency: int = cfg.LLM_MAX_CONCURRENCY,
+                 min_batch_output_tokens: int = cfg.LLM_MIN_BATCH_OUTPUT_TOKENS) -> List[List[str]]:
+    """
+    Packs consecutive paragraphs into calls, each within per-request input and output token budgets.
+    Latency of a call grows with its output, so the text is spread over up to `concurrency` calls running in parallel,
+    but not into calls smaller than min_batch_output_tokens, where the per-call overhead (the prompt) dominates.
+    """
+    # share of a call's budget taken by one character of the source text, the tighter of input and output
+    per_char = max(model.input_per_char / max(max_input_tokens - model.input_overhead, 1),
+                   model.output_per_char / max(max_output_tokens - model.output_overhead, 1))
+    total_output = model.output_per_char * sum(len(p) for p in paragraphs)
+    min_batches = max(1, min(concurrency, int(total_output // max(min_batch_output_tokens, 1))))
+    return group_paragraphs(paragraphs, max_length=1.0, length=lambda p: per_char * len(p),
+                            separator_length=2 * per_char, min_batches=min_batches)
+
+
+token_estimator = TokenEstimator()
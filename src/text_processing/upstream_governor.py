@@ -0,0 +1,301 @@
+"""
+Governor of calls to upstream providers (Gemini, Azure Speech), one per provider and server process.
+Calls wait for a slot in a FIFO queue, with a deadline, and for their tokens in the provider's token bucket.
+The number of slots adapts to the provider (AIMD): it grows by one per `limit` successful calls,
+and is halved when the provider throttles (429, quota, timeout). Failed calls are retried with jittered
+exponential backoff, so callers which failed together do not come back together.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from src import config as cfg
+
+
+class UpstreamBusyError(RuntimeError):
+    """Raised when a call waited for a slot or tokens longer than the queue deadline."""
+
+
+class UpstreamThrottledError(RuntimeError):
+    """Raised by callers to tell the governor that the provider throttled the call."""
+
+
+_THROTTLE_MARKERS = ('429', 'resource_exhausted', 'resourceexhausted', 'too many requests', 'rate limit', 'quota',
+                     'toomanyrequests', 'servicetimeout', 'timed out', 'timeout')
+
+
+def is_throttled(exc: BaseException) -> bool:
+    """
+    429, quota and timeout errors, as raised by Google and Azure client libraries, mean the provider is overloaded.
+    """
+    if isinstance(exc, (UpstreamThrottledError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    for attr in ('status_code', 'code'):
+        if getattr(exc, attr, None) in (429, 503):
+            return True
+    text = f"{type(exc).__name__} {exc}".lower()
+    return any(marker in text for marker in _THROTTLE_MARKERS)
+
+
+class TokenRateLimiter:
+    """
+    Token bucket of tokens_per_minute, refilled continuously. Calls wait until the bucket has their estimated tokens,
+    and settle the difference with the actual usage afterwards.
+    A call larger than the whole bucket waits for it to fill.
+    Tokens are reserved first come, first served (the bucket goes negative), so the bucket serves both
+    coroutines and threads.
+    """
+
+    def __init__(self, tokens_per_minute: int = cfg.LLM_TOKENS_PER_MINUTE):
+        self.capacity = tokens_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def reserve(self, tokens: int, max_wait: float = None) -> Optional[float]:
+        """
+        Takes the tokens and returns seconds to wait until they are refilled.
+        Returns None and takes nothing if that is longer than max_wait.
+        """
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (tokens - self._tokens) * 60 / self.capacity)
+            if max_wait is not None and wait > max(max_wait, 0.0):
+                return None
+            self._tokens -= tokens
+            self.waited_seconds += wait
+            return wait
+
+    async def acquire(self, tokens: int) -> None:
+        await asyncio.sleep(self.reserve(tokens))
+
+    def acquire_sync(self, tokens: int) -> None:
+        time.sleep(self.reserve(tokens))
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Returns overestimated tokens to the bucket, or takes underestimated ones (the bucket may go negative)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + min(estimated, self.capacity) - actual)
+
+
+class _Waiter:
+    """A call waiting for a slot, woken either by an event (threads) or by a future (coroutines)."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.granted = False
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+        else:
+            self.event.set()
+
+
+class UpstreamGovernor:
+
+    def __init__(self, name: str, max_concurrency: int, tokens_per_minute: int,
+                 min_concurrency: int = 1,
+                 queue_timeout: float = cfg.UPSTREAM_QUEUE_TIMEOUT_SECONDS,
+                 retries: int = cfg.UPSTREAM_RETRIES,
+                 backoff_base: float = cfg.UPSTREAM_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = cfg.UPSTREAM_BACKOFF_MAX_SECONDS,
+                 call_timeout: Optional[float] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.call_timeout = call_timeout  # of async calls only, blocking calls can not be interrupted
+        self.bucket = TokenRateLimiter(tokens_per_minute)
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+        self._decreased_at = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.throttled = 0
+        self.retried = 0
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], tokens: int = 1, deadline: float = None) -> Any:
+        """
+        Result of await fn(), called when a slot and the tokens are available, retried if it fails.
+        deadline (time.monotonic()) limits waiting of all attempts, by default each attempt waits up to queue_timeout.
+        Raises UpstreamBusyError if the deadline is missed and the last error of fn if all attempts fail.
+        """
+        for attempt in range(self.retries + 1):
+            attempt_deadline = deadline or time.monotonic() + self.queue_timeout
+            await self._enter_async(attempt_deadline)
+            started = time.monotonic()
+            try:
+                await self._wait_tokens_async(tokens, attempt_deadline)
+                if self.call_timeout:
+                    result = await asyncio.wait_for(fn(), self.call_timeout)
+                else:
+                    result = await fn()
+            except asyncio.CancelledError:
+                self._leave()
+                raise
+            except UpstreamBusyError:
+                self._leave()
+                raise
+            except Exception as e:
+                self.bucket.settle(tokens, 0)
+                self._leave(started, error=e)
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            self._leave(started)
+            return result
+
+    def call_sync(self, fn: Callable[[], Any], tokens: int = 1, deadline: float = None) -> Any:
+        """Blocking version of call, for code running in threads."""
+        for attempt in range(self.retries + 1):
+            attempt_deadline = deadline or time.monotonic() + self.queue_timeout
+            self._enter_sync(attempt_deadline)
+            started = time.monotonic()
+            try:
+                wait = self.bucket.reserve(tokens, max_wait=attempt_deadline - time.monotonic())
+                if wait is None:
+                    self._reject(f"{self.name}: token budget is exhausted")
+                time.sleep(wait)
+                result = fn()
+            except UpstreamBusyError:
+                self._leave()
+                raise
+            except Exception as e:
+                self.bucket.settle(tokens, 0)
+                self._leave(started, error=e)
+                if attempt == self.retries:
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                continue
+            self._leave(started)
+            return result
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Corrects the token bucket by the actual usage of a successful call."""
+        self.bucket.settle(estimated, actual)
+
+    async def _wait_tokens_async(self, tokens: int, deadline: float):
+        wait = self.bucket.reserve(tokens, max_wait=deadline - time.monotonic())
+        if wait is None:
+            self._reject(f"{self.name}: token budget is exhausted")
+        await asyncio.sleep(wait)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full jitter: uniform in [0, base * 2 ** attempt], throttled calls wait at least the base."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if is_throttled(error):
+            delay = max(delay, self.backoff_base)
+        logging.warning(f"{self.name} call failed, attempt {attempt + 1}, retrying in {delay:.1f}s: {error}")
+        self.retried += 1
+        return delay
+
+    def _reject(self, message: str):
+        with self._lock:
+            self.rejected += 1
+        raise UpstreamBusyError(f"{message}, try again later")
+
+    def _try_enter(self, waiter: _Waiter) -> bool:
+        """Takes a free slot if nobody is queued before, or queues the waiter. Called under the lock."""
+        self.calls += 1
+        if not self._waiters and self._in_flight < self.limit:
+            self._in_flight += 1
+            return True
+        self._waiters.append(waiter)
+        return False
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """Removes a waiter which missed the deadline or was cancelled, False if it was granted a slot meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            self.rejected += 1
+            return True
+
+    async def _enter_async(self, deadline: float):
+        waiter = _Waiter(asyncio.get_running_loop())
+        with self._lock:
+            if self._try_enter(waiter):
+                return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if self._give_up(waiter):
+                raise UpstreamBusyError(f"{self.name}: too many calls in progress, try again later") from None
+        except asyncio.CancelledError:
+            if not self._give_up(waiter):
+                self._leave()
+            raise
+
+    def _enter_sync(self, deadline: float):
+        waiter = _Waiter()
+        with self._lock:
+            if self._try_enter(waiter):
+                return
+        if not waiter.event.wait(max(0.0, deadline - time.monotonic())) and self._give_up(waiter):
+            raise UpstreamBusyError(f"{self.name}: too many calls in progress, try again later")
+
+    def _leave(self, started: float = None, error: Exception = None):
+        """Frees the slot, adapts the limit to the outcome of the call (if it was made) and wakes queued calls."""
+        with self._lock:
+            self._in_flight -= 1
+            if error is not None:
+                self.failures += 1
+                # calls started before the last decrease saw the old limit, they do not decrease it again
+                if is_throttled(error) and started >= self._decreased_at:
+                    self.throttled += 1
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._decreased_at = time.monotonic()
+                    logging.warning(f"{self.name} is throttling, concurrency limit is {self.limit}")
+            elif started is not None:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            while self._waiters and self._in_flight < self.limit:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self._in_flight += 1
+                waiter.wake()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"concurrency_limit": self.limit, "max_concurrency": self.max_concurrency,
+                    "in_flight": self._in_flight, "queue_depth": len(self._waiters),
+                    "calls": self.calls, "failures": self.failures, "throttled": self.throttled,
+                    "retried": self.retried, "rejected": self.rejected,
+                    "token_wait_seconds": round(self.bucket.waited_seconds, 3)}
+
+
+gemini_governor = UpstreamGovernor("gemini", max_concurrency=cfg.UPSTREAM_LLM_MAX_CONCURRENCY,
+                                   tokens_per_minute=cfg.LLM_TOKENS_PER_MINUTE, retries=cfg.LLM_BATCH_RETRIES,
+                                   call_timeout=cfg.UPSTREAM_LLM_CALL_TIMEOUT_SECONDS)
+azure_tts_governor = UpstreamGovernor("azure_tts", max_concurrency=cfg.UPSTREAM_TTS_MAX_CONCURRENCY,
+                                      tokens_per_minute=cfg.UPSTREAM_TTS_REQUESTS_PER_MINUTE)
+
+
+def upstream_stats() -> dict:
+    return {governor.name: governor.stats() for governor in (gemini_governor, azure_tts_governor)}
@@ -12,6 +12,8 @@ import azure.cognitiveservices.speech as speechsdk
 from src import config as cfg
 from src.data_classes.bilingual_text import BilingualText
 from src.tts.ssml_generator import generate_ssml, chunk_ssml
+from src.text_processing.upstream_governor import (azure_tts_governor, UpstreamBusyError,
+                                                   UpstreamThrottledError)
 
 logging.basicConfig(level=logging.INFO)
 
@@ -56,6 +58,7 @@ class TTS_GEN:
     def synthesize_audio(self, input_tts: str, is_ssml: bool, audio_config: speechsdk.audio.AudioOutputConfig):
         """
         Common method to synthesize audio using Azure TTS.
+        Calls go through the upstream governor, which limits their concurrency and rate and retries failed ones.
         
         Args:
             input_tts (str): The text or SSML input to synthesize into audio.
@@ -67,6 +70,9 @@ class TTS_GEN:
    
         """
         logging.info(f'Producing audio for text having len {len(input_tts)} chars')
+        return azure_tts_governor.call_sync(lambda: self._speak(input_tts, is_ssml, audio_config))
+
+    def _speak(self, input_tts: str, is_ssml: bool, audio_config: speechsdk.audio.AudioOutputConfig):
         speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=audio_config)
         
         # Choose the appropriate synthesis method
@@ -81,6 +87,10 @@ class TTS_GEN:
             logging.error("Speech synthesis canceled: {}".format(cancellation_details.reason))
             if cancellation_details.reason == speechsdk.CancellationReason.Error:
                 logging.error("Error details: {}".format(cancellation_details.error_details))
+                if cancellation_details.error_code in (speechsdk.CancellationErrorCode.TooManyRequests,
+                                                       speechsdk.CancellationErrorCode.ServiceTimeout,
+                                                       speechsdk.CancellationErrorCode.ServiceUnavailable):
+                    raise UpstreamThrottledError(f"Speech synthesis throttled: {cancellation_details.error_code}")
             raise RuntimeError("Speech synthesis failed.")
 
     def generate_audio_file(
@@ -201,6 +211,8 @@ class TTS_GEN:
             logging.info(f'Successfully wrote concatenated audio from {segments_count} segments '
                          f'to file {output_file_name}.')
             
+        except UpstreamBusyError:
+            raise
         except Exception as e:
             logging.error(f"Failed to generate concatenated audio file: {str(e)}")
             raise RuntimeError(f"Audio concatenation failed: {str(e)}")